@@ -0,0 +1,97 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Measures get_blueprint latency without the document cache, and with cache
+hits validated by creation time or by version alone.
+
+Requires a running Elasticsearch with the cloudify_storage index, e.g.:
+
+    python benchmarks/document_cache.py --host localhost --nodes 200
+
+The benchmark blueprint is deleted once the benchmark is done.
+"""
+
+import sys
+import time
+import uuid
+import argparse
+
+from manager_rest import es_storage_manager
+from manager_rest.es_storage_manager import ESStorageManager
+from manager_rest.models import BlueprintState
+
+
+def node_plan(i):
+    return {
+        'id': 'node_{0}'.format(i),
+        'type': 'cloudify.nodes.Compute',
+        'type_hierarchy': ['cloudify.nodes.Root', 'cloudify.nodes.Compute'],
+        'properties': {'ip': '10.0.0.{0}'.format(i % 256)},
+        'operations': dict(
+            ('cloudify.interfaces.lifecycle.{0}'.format(op),
+             {'operation': 'tasks.{0}'.format(op), 'inputs': {},
+              'executor': 'central_deployment_agent', 'max_retries': None})
+            for op in ('create', 'configure', 'start', 'stop', 'delete')),
+        'relationships': []
+    }
+
+
+def measure(sm, blueprint_id, gets):
+    sm.get_blueprint(blueprint_id)
+    start = time.time()
+    for _ in range(gets):
+        sm.get_blueprint(blueprint_id)
+    return (time.time() - start) * 1000 / gets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=9200)
+    parser.add_argument('--nodes', type=int, default=200)
+    parser.add_argument('--gets', type=int, default=500)
+    args = parser.parse_args()
+
+    blueprint_id = 'document-cache-benchmark-{0}'.format(uuid.uuid4())
+    sm = ESStorageManager(args.host, args.port)
+    sm.put_blueprint(blueprint_id, BlueprintState(
+        id=blueprint_id, created_at='2016-01-01 00:00:00.000000',
+        updated_at='2016-01-01 00:00:00.000000', description=None,
+        main_file_name='blueprint.yaml',
+        plan={'nodes': [node_plan(i) for i in range(args.nodes)],
+              'workflows': {}, 'inputs': {}, 'outputs': {}}))
+    try:
+        uncached = measure(sm, blueprint_id, args.gets)
+        cached_sm = ESStorageManager(args.host, args.port, cache_size_mb=16)
+        version_check_seconds = es_storage_manager.CACHE_VERSION_CHECK_SECONDS
+        # every hit is validated by creation time, as before version checks
+        es_storage_manager.CACHE_VERSION_CHECK_SECONDS = 0
+        by_creation_time = measure(cached_sm, blueprint_id, args.gets)
+        es_storage_manager.CACHE_VERSION_CHECK_SECONDS = \
+            version_check_seconds
+        by_version = measure(cached_sm, blueprint_id, args.gets)
+    finally:
+        sm.delete_blueprint(blueprint_id)
+
+    for name, duration in [('uncached', uncached),
+                           ('creation time validated', by_creation_time),
+                           ('version validated', by_version)]:
+        sys.stdout.write('{0:>24}: {1:8.2f} ms/get\n'.format(name,
+                                                             duration))
+
+
+if __name__ == '__main__':
+    main()
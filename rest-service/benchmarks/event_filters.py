@@ -0,0 +1,179 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Compares the search latency of query shapes for context filters on events.
+
+Runs against existing logstash indices, e.g.:
+
+    python benchmarks/event_filters.py --host localhost \\
+        --deployment-id dep1 --execution-id 0a1b...
+
+or against a temporary index filled with generated events:
+
+    python benchmarks/event_filters.py --generate 1000000
+
+The 'match' shape is a scored match query per value, wrapped in an `or`
+filter. The 'term' shape is a cacheable terms filter on the not analyzed
+`raw` subfields, as built by the events endpoint.
+"""
+
+import sys
+import time
+import uuid
+import random
+import argparse
+
+import elasticsearch
+import elasticsearch.helpers
+
+from manager_rest.manager_elasticsearch import (ManagerElasticsearch,
+                                                EVENTS_INDICES_PATTERN,
+                                                EVENTS_RAW_FIELD_SUFFIX)
+
+# mirrors the string mapping of the logstash index template
+LOGSTASH_STRINGS_TEMPLATE = {
+    'string_fields': {
+        'match': '*',
+        'match_mapping_type': 'string',
+        'mapping': {
+            'type': 'string', 'index': 'analyzed', 'omit_norms': True,
+            'fields': {
+                'raw': {'type': 'string', 'index': 'not_analyzed',
+                        'ignore_above': 256}
+            }
+        }
+    }
+}
+
+
+def match_shape(filters):
+    conditions = []
+    for key, values in filters.iteritems():
+        conditions.append({'or': {'filters': [
+            {'query': {'match': {key: {'query': value, 'operator': 'and'}}}}
+            for value in values]}})
+    return {'size': 100,
+            'query': {'filtered': {'filter': {'bool': {
+                'must': conditions}}}}}
+
+
+def term_shape(filters):
+    return ManagerElasticsearch.build_request_body(
+        filters=filters,
+        pagination={'size': 100},
+        nested_field_suffix=EVENTS_RAW_FIELD_SUFFIX)
+
+
+QUERY_SHAPES = [('match', match_shape), ('term', term_shape)]
+
+
+def generate_events(es, index, count, deployments):
+    es.indices.create(index=index, body={
+        'mappings': {'_default_': {
+            'dynamic_templates': [LOGSTASH_STRINGS_TEMPLATE]}}})
+    executions = {}
+    for deployment in range(deployments):
+        deployment_id = 'deployment-{0}'.format(deployment)
+        executions[deployment_id] = [str(uuid.uuid4()) for _ in range(5)]
+
+    def actions():
+        for i in range(count):
+            deployment_id = random.choice(executions.keys())
+            yield {
+                '_index': index,
+                '_type': 'cloudify_event',
+                '_source': {
+                    'type': 'cloudify_event',
+                    'message': {'text': 'event {0}'.format(i)},
+                    'context': {
+                        'deployment_id': deployment_id,
+                        'execution_id': random.choice(
+                            executions[deployment_id])
+                    }
+                }
+            }
+    elasticsearch.helpers.bulk(es, actions(), chunk_size=5000)
+    es.indices.refresh(index=index)
+    deployment_id = random.choice(executions.keys())
+    return deployment_id, executions[deployment_id][0]
+
+
+def search(es, index, body):
+    start = time.time()
+    result = es.search(index=index, body=body)
+    return result['hits']['total'], (time.time() - start) * 1000
+
+
+def measure(es, index, body, repeats):
+    latencies = sorted(search(es, index, body)[1] for _ in range(repeats))
+    return {'p50': latencies[len(latencies) // 2],
+            'p95': latencies[max(int(len(latencies) * 0.95) - 1, 0)]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=9200)
+    parser.add_argument('--index', default=EVENTS_INDICES_PATTERN)
+    parser.add_argument('--deployment-id')
+    parser.add_argument('--execution-id')
+    parser.add_argument('--generate', type=int, default=0,
+                        help='number of events to generate into a temporary '
+                             'index instead of using --index')
+    parser.add_argument('--deployments', type=int, default=500)
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    es = elasticsearch.Elasticsearch(hosts=[{'host': args.host,
+                                             'port': args.port}],
+                                     timeout=300)
+    index = args.index
+    if args.generate:
+        index = 'events-benchmark-{0}'.format(uuid.uuid4())
+        args.deployment_id, args.execution_id = generate_events(
+            es, index, args.generate, args.deployments)
+    try:
+        filter_sets = [
+            ('deployment', {'context.deployment_id': [args.deployment_id]}),
+            ('execution', {'context.execution_id': [args.execution_id]}),
+            ('deployment+execution',
+             {'context.deployment_id': [args.deployment_id],
+              'context.execution_id': [args.execution_id]})
+        ]
+        sys.stdout.write('{0:>22} {1:>6} {2:>8} {3:>10} {4:>10} {5:>10}\n'
+                         .format('filters', 'shape', 'hits', 'first ms',
+                                 'p50 ms', 'p95 ms'))
+        for name, filters in filter_sets:
+            filters = {k: v for k, v in filters.iteritems() if v[0]}
+            if not filters:
+                continue
+            for shape_name, shape in QUERY_SHAPES:
+                body = shape(filters)
+                # the first search runs with a cold filter cache
+                es.indices.clear_cache(index=index, filter=True)
+                hits, first = search(es, index, body)
+                stats = measure(es, index, body, args.repeats)
+                sys.stdout.write(
+                    '{0:>22} {1:>6} {2:>8} {3:>10.2f} {4:>10.2f} {5:>10.2f}\n'
+                    .format(name, shape_name, hits, first, stats['p50'],
+                            stats['p95']))
+    finally:
+        if args.generate:
+            es.indices.delete(index=index)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Measures the peak RSS of encoding a /node-instances list response in one go,
+compared to streaming it.
+
+Needs no running services, e.g.:
+
+    python benchmarks/list_streaming.py --node-instances 20000
+
+Each variant runs in a separate process. The `full` variant marshals a
+list of all the documents and encodes the whole response, as list
+responses were. The `stream` variant encodes the response from documents
+which are created a scroll batch at a time, as the storage streams them.
+"""
+
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+from manager_rest import responses_v2
+from manager_rest.es_storage_manager import SCROLL_SIZE
+from manager_rest.marshallers import encode_list_response, get_marshaller
+
+
+def node_instance_source(i, runtime_properties_count):
+    return {
+        'id': 'vm_{0:06x}'.format(i),
+        'node_id': 'vm',
+        'deployment_id': 'deployment',
+        'host_id': 'vm_{0:06x}'.format(i),
+        'state': 'started',
+        'version': None,
+        'relationships': [
+            {'target_id': 'network_{0:06x}'.format(i),
+             'target_name': 'network',
+             'type': 'cloudify.relationships.connected_to'}],
+        'runtime_properties': dict(
+            ('property_{0}'.format(p), 'value_{0}'.format(p))
+            for p in range(runtime_properties_count))
+    }
+
+
+def scroll_sources(count, runtime_properties_count):
+    for start in range(0, count, SCROLL_SIZE):
+        batch = [node_instance_source(i, runtime_properties_count)
+                 for i in range(start, min(start + SCROLL_SIZE, count))]
+        for source in batch:
+            yield source
+
+
+def full_response(count, runtime_properties_count, metadata, marshaller):
+    sources = [node_instance_source(i, runtime_properties_count)
+               for i in range(count)]
+    return [json.dumps({'items': marshaller(sources),
+                        'metadata': metadata})]
+
+
+def streamed_response(count, runtime_properties_count, metadata, marshaller):
+    return encode_list_response(
+        scroll_sources(count, runtime_properties_count), metadata,
+        marshaller)
+
+
+VARIANTS = {
+    'full': full_response,
+    'stream': streamed_response
+}
+
+
+def max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_variant(create_response, count, runtime_properties_count):
+    marshaller = get_marshaller(responses_v2.NodeInstance)
+    metadata = {'pagination': {'total': count, 'size': count, 'offset': 0}}
+    before = max_rss_kb()
+    start = time.time()
+    size = 0
+    for chunk in create_response(count, runtime_properties_count, metadata,
+                                 marshaller):
+        size += len(chunk)
+    duration = time.time() - start
+    sys.stdout.write(json.dumps({'before_kb': before,
+                                 'peak_kb': max_rss_kb(),
+                                 'duration': duration,
+                                 'size': size}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--node-instances', type=int, default=20000)
+    parser.add_argument('--runtime-properties', type=int, default=5)
+    parser.add_argument('--variant', choices=sorted(VARIANTS),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(VARIANTS[args.variant], args.node_instances,
+                    args.runtime_properties)
+        return
+
+    sys.stdout.write('{0:>8} {1:>14} {2:>14} {3:>10} {4:>12}\n'.format(
+        'variant', 'peak RSS MB', 'encoding MB', 'seconds', 'response MB'))
+    for variant in sorted(VARIANTS):
+        output = subprocess.check_output([
+            sys.executable, __file__,
+            '--variant', variant,
+            '--node-instances', str(args.node_instances),
+            '--runtime-properties', str(args.runtime_properties)])
+        result = json.loads(output)
+        sys.stdout.write(
+            '{0:>8} {1:>14.1f} {2:>14.1f} {3:>10.2f} {4:>12.1f}\n'.format(
+                variant, result['peak_kb'] / 1024.0,
+                (result['peak_kb'] - result['before_kb']) / 1024.0,
+                result['duration'], result['size'] / 1024.0 / 1024))
+
+
+if __name__ == '__main__':
+    main()
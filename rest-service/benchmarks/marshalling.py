@@ -0,0 +1,120 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Compares marshalling list responses through response objects and
+flask-restful's `marshal` with the compiled marshallers.
+
+Marshals the models of /node-instances and /executions list responses,
+and needs no running services, e.g.:
+
+    python benchmarks/marshalling.py --items 5000
+"""
+
+import sys
+import json
+import time
+import argparse
+
+from flask.ext.restful import marshal
+
+from manager_rest import models
+from manager_rest import responses_v2
+from manager_rest.marshallers import get_marshaller
+
+
+def response_objects_marshal(response_class, items, field_names):
+    """
+    Marshals the way `marshal_with` did before marshallers were compiled.
+    """
+    resource_fields = {key: response_class.resource_fields[key]
+                       for key in field_names}
+    wrapped_items = [response_class(**item.to_dict()) for item in items]
+    response = responses_v2.ListResponse(
+        items=marshal(wrapped_items, resource_fields), metadata={})
+    return marshal(response, responses_v2.ListResponse.resource_fields)
+
+
+def compiled_marshal(response_class, items, field_names):
+    return {'metadata': {},
+            'items': get_marshaller(response_class, field_names)(items)}
+
+
+MARSHALLERS = [('objects', response_objects_marshal),
+               ('compiled', compiled_marshal)]
+
+
+def node_instances(count):
+    return [models.DeploymentNodeInstance(
+        id='vm_{0:06x}'.format(i), node_id='vm', deployment_id='deployment',
+        host_id='vm_{0:06x}'.format(i), state='started', version=3,
+        relationships=[{'target_id': 'network_{0:06x}'.format(i),
+                        'target_name': 'network',
+                        'type': 'cloudify.relationships.connected_to'}],
+        runtime_properties={'ip': '10.0.0.{0}'.format(i % 256)})
+        for i in range(count)]
+
+
+def executions(count):
+    return [models.Execution(
+        id='execution_{0}'.format(i), status='terminated',
+        deployment_id='deployment', workflow_id='install',
+        blueprint_id='blueprint', created_at='2016-01-01 00:00:00.000000',
+        error='', parameters={'node_ids': []}, is_system_workflow=False)
+        for i in range(count)]
+
+
+def measure(marshal_list, response_class, items, field_names, repeats):
+    durations = []
+    for _ in range(repeats):
+        start = time.time()
+        marshal_list(response_class, items, field_names)
+        durations.append(time.time() - start)
+    return min(durations) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    node_instance_fields = responses_v2.NodeInstance.resource_fields.keys()
+    execution_fields = responses_v2.Execution.resource_fields.keys()
+    cases = [
+        ('/node-instances', responses_v2.NodeInstance,
+         node_instances(args.items), node_instance_fields),
+        ('/node-instances?_include=id,state', responses_v2.NodeInstance,
+         node_instances(args.items), ['id', 'state']),
+        ('/executions', responses_v2.Execution,
+         executions(args.items), execution_fields),
+    ]
+    sys.stdout.write('{0:>36} {1:>12} {2:>12} {3:>8}\n'.format(
+        'endpoint', 'objects ms', 'compiled ms', 'speedup'))
+    for name, response_class, items, field_names in cases:
+        outputs = [json.dumps(marshal_list(response_class, items,
+                                           field_names), sort_keys=True)
+                   for _, marshal_list in MARSHALLERS]
+        if outputs[0] != outputs[1]:
+            raise RuntimeError('Different outputs for {0}'.format(name))
+        durations = [measure(marshal_list, response_class, items,
+                             field_names, args.repeats)
+                     for _, marshal_list in MARSHALLERS]
+        sys.stdout.write('{0:>36} {1:>12.2f} {2:>12.2f} {3:>7.1f}x\n'.format(
+            name, durations[0], durations[1], durations[0] / durations[1]))
+
+
+if __name__ == '__main__':
+    main()
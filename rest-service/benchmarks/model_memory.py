@@ -0,0 +1,131 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Measures the peak RSS of listing node instances with slot based models,
+compared to equivalent models with a per instance __dict__.
+
+Needs no running services, e.g.:
+
+    python benchmarks/model_memory.py --node-instances 50000
+
+Each variant runs in a separate process, which parses a storage search
+response, deserializes the node instances from its documents, as
+`_list_docs` does, and converts them to dicts for the REST response.
+"""
+
+import os
+import sys
+import json
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from manager_rest.models import DeploymentNodeInstance
+
+
+class DictDeploymentNodeInstance(object):
+    """
+    DeploymentNodeInstance, as it was before models had slots.
+    """
+
+    fields = DeploymentNodeInstance.fields
+    __init__ = DeploymentNodeInstance.__init__.im_func
+    to_dict = DeploymentNodeInstance.to_dict.im_func
+
+
+VARIANTS = {
+    'dict': DictDeploymentNodeInstance,
+    'slots': DeploymentNodeInstance
+}
+
+
+def write_search_response(path, count, runtime_properties_count):
+    response = json.dumps({'hits': {'total': count, 'hits': [
+        {'_version': 3, '_source': {
+            'id': 'vm_{0:06x}'.format(i),
+            'node_id': 'vm',
+            'deployment_id': 'deployment',
+            'host_id': 'vm_{0:06x}'.format(i),
+            'state': 'started',
+            'relationships': [
+                {'target_id': 'network_{0:06x}'.format(i),
+                 'target_name': 'network',
+                 'type': 'cloudify.relationships.connected_to'}],
+            'runtime_properties': dict(
+                ('property_{0}'.format(p), 'value_{0}'.format(p))
+                for p in range(runtime_properties_count))}}
+        for i in range(count)]}})
+    with open(path, 'w') as f:
+        f.write(response)
+
+
+def max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_variant(model_class, response_path):
+    with open(response_path) as f:
+        response = f.read()
+    before = max_rss_kb()
+    hits = json.loads(response)['hits']['hits']
+    del response
+    models = [model_class(version=hit['_version'], **hit['_source'])
+              for hit in hits]
+    del hits
+    items = [model.to_dict() for model in models]
+    peak = max_rss_kb()
+    sys.stdout.write(json.dumps({'before_kb': before, 'peak_kb': peak,
+                                 'items': len(items)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--node-instances', type=int, default=50000)
+    parser.add_argument('--runtime-properties', type=int, default=5)
+    parser.add_argument('--variant', choices=sorted(VARIANTS),
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--response', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(VARIANTS[args.variant], args.response)
+        return
+
+    fd, response_path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        write_search_response(response_path, args.node_instances,
+                              args.runtime_properties)
+        sys.stdout.write('{0:>8} {1:>14} {2:>14} {3:>14}\n'.format(
+            'models', 'peak RSS MB', 'listing MB', 'bytes/item'))
+        for variant in sorted(VARIANTS):
+            output = subprocess.check_output([
+                sys.executable, __file__,
+                '--variant', variant,
+                '--response', response_path])
+            result = json.loads(output)
+            listing_kb = result['peak_kb'] - result['before_kb']
+            sys.stdout.write(
+                '{0:>8} {1:>14.1f} {2:>14.1f} {3:>14.0f}\n'.format(
+                    variant, result['peak_kb'] / 1024.0, listing_kb / 1024.0,
+                    listing_kb * 1024.0 / result['items']))
+    finally:
+        os.remove(response_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Compares converting models to dicts through a jsonpickle round trip with
+the field based `SerializableObject.to_dict`.
+
+Needs no running services, e.g.:
+
+    python benchmarks/model_serialization.py --node-instances 5000
+
+The outputs of both conversions are checked to be identical before timing.
+"""
+
+import sys
+import json
+import time
+import argparse
+
+import jsonpickle
+
+from manager_rest.models import (BlueprintState,
+                                 Deployment,
+                                 DeploymentNodeInstance,
+                                 Execution)
+
+
+def jsonpickle_to_dict(model):
+    return json.loads(jsonpickle.encode(model, unpicklable=False))
+
+
+def field_to_dict(model):
+    return model.to_dict()
+
+
+CONVERTERS = [('jsonpickle', jsonpickle_to_dict), ('fields', field_to_dict)]
+
+
+def node_instance(i, runtime_properties_count):
+    return DeploymentNodeInstance(
+        id='vm_{0:06x}'.format(i),
+        node_id='vm',
+        deployment_id='deployment',
+        host_id='vm_{0:06x}'.format(i),
+        state='started',
+        version=3,
+        relationships=[{'target_id': 'network_{0:06x}'.format(i),
+                        'target_name': 'network',
+                        'type': 'cloudify.relationships.connected_to'}],
+        runtime_properties=dict(
+            ('property_{0}'.format(p), {'value': 'x' * 20, 'index': p})
+            for p in range(runtime_properties_count)))
+
+
+def node_plan(i):
+    return {
+        'id': 'node_{0}'.format(i),
+        'type': 'cloudify.nodes.Compute',
+        'type_hierarchy': ['cloudify.nodes.Root', 'cloudify.nodes.Compute'],
+        'properties': {'ip': '10.0.0.{0}'.format(i % 256),
+                       'agent_config': {'install_method': 'remote',
+                                        'port': 22}},
+        'operations': dict(
+            ('cloudify.interfaces.lifecycle.{0}'.format(op),
+             {'operation': 'tasks.{0}'.format(op), 'inputs': {},
+              'executor': 'central_deployment_agent', 'max_retries': None})
+            for op in ('create', 'configure', 'start', 'stop', 'delete')),
+        'relationships': []
+    }
+
+
+def blueprint(nodes):
+    return BlueprintState(
+        id='blueprint', created_at='2016-01-01 00:00:00.000000',
+        updated_at='2016-01-01 00:00:00.000000', description=None,
+        main_file_name='blueprint.yaml',
+        plan={'nodes': [node_plan(i) for i in range(nodes)],
+              'workflows': {}, 'inputs': {}, 'outputs': {}})
+
+
+def deployment():
+    workflows = dict(
+        (name, {'operation': 'workflows.{0}'.format(name),
+                'plugin': 'default_workflows',
+                'parameters': {'node_ids': {'default': []}}})
+        for name in ('install', 'uninstall', 'scale', 'heal', 'execute'))
+    return Deployment(
+        id='deployment', created_at='2016-01-01 00:00:00.000000',
+        updated_at='2016-01-01 00:00:00.000000', blueprint_id='blueprint',
+        workflows=workflows, permalink=None, inputs={'image': 'centos'},
+        policy_types={}, policy_triggers={}, groups={}, outputs={})
+
+
+def execution(i):
+    return Execution(
+        id='execution_{0}'.format(i), status='terminated',
+        deployment_id='deployment', workflow_id='install',
+        blueprint_id='blueprint', created_at='2016-01-01 00:00:00.000000',
+        error='', parameters={'node_ids': [], 'type_names': []},
+        is_system_workflow=False)
+
+
+def measure(convert, models, repeats):
+    durations = []
+    for _ in range(repeats):
+        start = time.time()
+        for model in models:
+            convert(model)
+        durations.append(time.time() - start)
+    return min(durations) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--node-instances', type=int, default=5000)
+    parser.add_argument('--runtime-properties', type=int, default=10)
+    parser.add_argument('--blueprint-nodes', type=int, default=50)
+    parser.add_argument('--executions', type=int, default=1000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    model_sets = [
+        ('node instances', [node_instance(i, args.runtime_properties)
+                            for i in range(args.node_instances)]),
+        ('executions', [execution(i) for i in range(args.executions)]),
+        ('blueprint', [blueprint(args.blueprint_nodes)]),
+        ('deployment', [deployment()])
+    ]
+    sys.stdout.write('{0:>16} {1:>8} {2:>12} {3:>12} {4:>8}\n'.format(
+        'models', 'count', 'jsonpickle ms', 'fields ms', 'speedup'))
+    for name, models in model_sets:
+        for model in models:
+            expected = json.dumps(jsonpickle_to_dict(model), sort_keys=True)
+            if json.dumps(field_to_dict(model), sort_keys=True) != expected:
+                raise RuntimeError('Different outputs for {0} {1}'.format(
+                    name, model.id))
+        durations = [measure(convert, models, args.repeats)
+                     for _, convert in CONVERTERS]
+        sys.stdout.write(
+            '{0:>16} {1:>8} {2:>12.2f} {3:>12.2f} {4:>7.1f}x\n'.format(
+                name, len(models), durations[0], durations[1],
+                durations[0] / durations[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Compares listing storage documents as models with listing them raw.
+
+Both variants turn the documents of a storage search response into a
+marshalled /node-instances list response, as the elasticsearch storage
+manager and `marshal_with` do, and need no running services, e.g.:
+
+    python benchmarks/raw_listing.py --node-instances 5000
+"""
+
+import sys
+import copy
+import json
+import time
+import argparse
+
+from manager_rest import responses_v2
+from manager_rest.es_storage_manager import ESStorageManager
+from manager_rest.marshallers import get_marshaller
+from manager_rest.models import DeploymentNodeInstance
+
+
+def models_listing(docs, field_names):
+    items = [ESStorageManager._fill_missing_fields_and_deserialize(
+        doc, DeploymentNodeInstance) for doc in docs]
+    return get_marshaller(responses_v2.NodeInstance, field_names)(items)
+
+
+def raw_listing(docs, field_names):
+    return get_marshaller(responses_v2.NodeInstance, field_names)(docs)
+
+
+LISTINGS = [('models', models_listing), ('raw', raw_listing)]
+
+
+def search_sources(count, runtime_properties_count, field_names):
+    sources = []
+    for i in range(count):
+        source = {
+            'id': 'vm_{0:06x}'.format(i),
+            'node_id': 'vm',
+            'deployment_id': 'deployment',
+            'host_id': 'vm_{0:06x}'.format(i),
+            'state': 'started',
+            'version': None,
+            'relationships': [
+                {'target_id': 'network_{0:06x}'.format(i),
+                 'target_name': 'network',
+                 'type': 'cloudify.relationships.connected_to'}],
+            'runtime_properties': dict(
+                ('property_{0}'.format(p), 'value_{0}'.format(p))
+                for p in range(runtime_properties_count))
+        }
+        # the storage only returns the requested fields
+        sources.append({key: value for key, value in source.iteritems()
+                        if key in field_names})
+    return sources
+
+
+def measure(listing, docs, field_names, repeats):
+    durations = []
+    for _ in range(repeats):
+        # deserializing fills the documents, so each run gets fresh copies
+        run_docs = copy.deepcopy(docs)
+        start = time.time()
+        listing(run_docs, field_names)
+        durations.append(time.time() - start)
+    return min(durations) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--node-instances', type=int, default=5000)
+    parser.add_argument('--runtime-properties', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    cases = [
+        ('/node-instances',
+         responses_v2.NodeInstance.resource_fields.keys()),
+        ('/node-instances?_include=id,state', ['id', 'state'])
+    ]
+    sys.stdout.write('{0:>36} {1:>12} {2:>12} {3:>8}\n'.format(
+        'endpoint', 'models ms', 'raw ms', 'speedup'))
+    for name, field_names in cases:
+        docs = search_sources(args.node_instances, args.runtime_properties,
+                              field_names)
+        outputs = [json.dumps(listing(copy.deepcopy(docs), field_names),
+                              sort_keys=True)
+                   for _, listing in LISTINGS]
+        if outputs[0] != outputs[1]:
+            raise RuntimeError('Different outputs for {0}'.format(name))
+        durations = [measure(listing, docs, field_names, args.repeats)
+                     for _, listing in LISTINGS]
+        sys.stdout.write('{0:>36} {1:>12.2f} {2:>12.2f} {3:>7.1f}x\n'.format(
+            name, durations[0], durations[1], durations[0] / durations[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Measures storage writes/sec under each refresh policy.
+
+Requires a running Elasticsearch with the cloudify_storage index, e.g.:
+
+    python benchmarks/refresh_policies.py --host localhost --writes 2000
+
+Documents are written under a dedicated document type which is removed
+once the benchmark is done.
+"""
+
+import sys
+import time
+import uuid
+import argparse
+import threading
+
+from manager_rest.es_storage_manager import (ESStorageManager,
+                                             STORAGE_INDEX_NAME)
+from manager_rest.refresh_policies import REFRESH_POLICIES
+
+BENCHMARK_DOC_TYPE = 'refresh_policy_benchmark'
+
+
+def _write(sm, run_id, count):
+    for i in range(count):
+        sm._put_doc_if_not_exists(BENCHMARK_DOC_TYPE,
+                                  '{0}-{1}'.format(run_id, i),
+                                  {'run_id': run_id, 'index': i})
+
+
+def run(host, port, policy, writes, threads, interval_ms):
+    sm = ESStorageManager(host, port, refresh_policy=policy,
+                          refresh_interval_ms=interval_ms)
+    run_id = str(uuid.uuid4())
+    per_thread = writes // threads
+    workers = [threading.Thread(target=_write,
+                                args=(sm, '{0}-{1}'.format(run_id, t),
+                                      per_thread))
+               for t in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    # a search has to see every write, whatever the policy
+    sm._refresh_policy.wait_for_refresh()
+    duration = time.time() - start
+    return per_thread * threads / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=9200)
+    parser.add_argument('--writes', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--interval-ms', type=int, default=200)
+    args = parser.parse_args()
+
+    try:
+        for policy in REFRESH_POLICIES:
+            rate = run(args.host, args.port, policy, args.writes,
+                       args.threads, args.interval_ms)
+            sys.stdout.write('{0:>10}: {1:10.1f} writes/sec\n'.format(
+                policy, rate))
+    finally:
+        ESStorageManager(args.host, args.port)._connection.delete_by_query(
+            index=STORAGE_INDEX_NAME,
+            doc_type=BENCHMARK_DOC_TYPE,
+            body={'query': {'match_all': {}}})
+
+
+if __name__ == '__main__':
+    main()
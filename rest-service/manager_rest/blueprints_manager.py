@@ -29,6 +29,7 @@ from manager_rest import config
 from manager_rest import manager_exceptions
 from manager_rest import storage_manager
 from manager_rest import workflow_client as wf_client
+from manager_rest.refresh_policies import REFRESH_NONE
 
 
 class DslParseException(Exception):
@@ -48,22 +49,26 @@ class BlueprintsManager(object):
         self.workflow_client = wf_client.get_workflow_client()
 
     def blueprints_list(self, include=None, filters=None,
-                        pagination=None, sort=None):
+                        pagination=None, sort=None, exclude=None, raw=False):
         return self.sm.blueprints_list(include=include, filters=filters,
-                                       pagination=pagination, sort=sort)
+                                       pagination=pagination, sort=sort,
+                                       exclude=exclude, raw=raw)
 
     def deployments_list(self, include=None, filters=None, pagination=None,
-                         sort=None):
+                         sort=None, exclude=None, raw=False):
         return self.sm.deployments_list(include=include, filters=filters,
-                                        pagination=pagination, sort=sort)
+                                        pagination=pagination, sort=sort,
+                                        exclude=exclude, raw=raw)
 
     def snapshots_list(self, include=None, filters=None, pagination=None,
-                       sort=None):
+                       sort=None, raw=False):
         return self.sm.snapshots_list(include=include, filters=filters,
-                                      pagination=pagination, sort=sort)
+                                      pagination=pagination, sort=sort,
+                                      raw=raw)
 
     def executions_list(self, include=None, is_include_system_workflows=False,
-                        filters=None, pagination=None, sort=None):
+                        filters=None, pagination=None, sort=None, raw=False,
+                        stream=False):
         filters = filters or {}
         is_system_workflow = filters.get('is_system_workflow')
         if is_system_workflow:
@@ -74,7 +79,8 @@ class BlueprintsManager(object):
         elif not is_include_system_workflows:
             filters['is_system_workflow'] = [False]
         return self.sm.executions_list(include=include, filters=filters,
-                                       pagination=pagination, sort=sort)
+                                       pagination=pagination, sort=sort,
+                                       raw=raw, stream=stream)
 
     def get_blueprint(self, blueprint_id, include=None):
         return self.sm.get_blueprint(blueprint_id, include=include)
@@ -133,6 +139,10 @@ class BlueprintsManager(object):
                 config.instance().file_server_uploaded_blueprints_folder,
             'db_address': config.instance().db_address,
             'db_port': config.instance().db_port,
+            'db_connection_pool_size':
+                config.instance().db_connection_pool_size,
+            'db_timeout': config.instance().db_timeout,
+            'db_max_retries': config.instance().db_max_retries,
             'created_status': models.Snapshot.CREATED,
             'failed_status': models.Snapshot.FAILED,
             'file_server_uploaded_plugins_folder':
@@ -241,35 +251,30 @@ class BlueprintsManager(object):
         # validate there are no running executions for this deployment
         deplyment_id_filter = self.create_filters_dict(
             deployment_id=deployment_id)
-        executions = self.sm.executions_list(
-            filters=deplyment_id_filter).items
-        if any(execution.status not in models.Execution.END_STATES for
-           execution in executions):
+        running_execution_ids = [
+            execution.id for execution in self.sm.iter_executions(
+                filters=deplyment_id_filter, include=['id', 'status'])
+            if execution.status not in models.Execution.END_STATES]
+        if running_execution_ids:
             raise manager_exceptions.DependentExistsError(
                 "Can't delete deployment {0} - There are running "
                 "executions for this deployment. Running executions ids: {1}"
-                .format(
-                    deployment_id,
-                    ','.join([execution.id for execution in
-                              executions if execution.status not
-                              in models.Execution.END_STATES])))
+                .format(deployment_id, ','.join(running_execution_ids)))
 
         if not ignore_live_nodes:
             deplyment_id_filter = self.create_filters_dict(
                 deployment_id=deployment_id)
-            node_instances = self.sm.get_node_instances(
-                filters=deplyment_id_filter).items
             # validate either all nodes for this deployment are still
             # uninitialized or have been deleted
-            if any(node.state not in ('uninitialized', 'deleted') for node in
-                   node_instances):
+            live_node_ids = [
+                node.id for node in self.sm.iter_node_instances(
+                    filters=deplyment_id_filter, include=['id', 'state'])
+                if node.state not in ('uninitialized', 'deleted')]
+            if live_node_ids:
                 raise manager_exceptions.DependentExistsError(
                     "Can't delete deployment {0} - There are live nodes for "
                     "this deployment. Live nodes ids: {1}"
-                    .format(deployment_id,
-                            ','.join([node.id for node in node_instances
-                                     if node.state not in
-                                     ('uninitialized', 'deleted')])))
+                    .format(deployment_id, ','.join(live_node_ids)))
 
         self._delete_deployment_environment(deployment_id)
         self._delete_deployment_logs(deployment_id)
@@ -535,11 +540,11 @@ class BlueprintsManager(object):
                     'started deployment modifications: {0}'
                     .format(active_modifications))
 
-        nodes = [node.to_dict() for node in self.sm.get_nodes(
-            filters=deployment_id_filter).items]
+        nodes = [node.to_dict() for node in self.sm.iter_nodes(
+            filters=deployment_id_filter)]
         node_instances = [instance.to_dict() for instance
-                          in self.sm.get_node_instances(
-                          filters=deployment_id_filter).items]
+                          in self.sm.iter_node_instances(
+                          filters=deployment_id_filter)]
         node_instances_modification = tasks.modify_deployment(
             nodes=nodes,
             previous_node_instances=node_instances,
@@ -547,7 +552,7 @@ class BlueprintsManager(object):
 
         node_instances_modification['before_modification'] = [
             instance.to_dict() for instance in
-            self.sm.get_node_instances(filters=deployment_id_filter).items]
+            self.sm.iter_node_instances(filters=deployment_id_filter)]
 
         now = str(datetime.now())
         modification_id = str(uuid.uuid4())
@@ -568,22 +573,27 @@ class BlueprintsManager(object):
                 planned_number_of_instances=modified_node['instances'])
         added_and_related = node_instances_modification['added_and_related']
         added_node_instances = []
+        related_node_instances = []
         for node_instance in added_and_related:
             if node_instance.get('modification') == 'added':
                 added_node_instances.append(node_instance)
             else:
-                current = self.sm.get_node_instance(node_instance['id'])
-                new_relationships = current.relationships
-                new_relationships += node_instance['relationships']
-                self.sm.update_node_instance(models.DeploymentNodeInstance(
-                    id=node_instance['id'],
-                    relationships=new_relationships,
-                    version=current.version,
-                    node_id=None,
-                    host_id=None,
-                    deployment_id=None,
-                    state=None,
-                    runtime_properties=None))
+                related_node_instances.append(node_instance)
+        current_node_instances = self._get_node_instances_by_ids(
+            [node_instance['id'] for node_instance in related_node_instances])
+        for node_instance in related_node_instances:
+            current = current_node_instances[node_instance['id']]
+            new_relationships = current.relationships
+            new_relationships += node_instance['relationships']
+            self.sm.update_node_instance(models.DeploymentNodeInstance(
+                id=node_instance['id'],
+                relationships=new_relationships,
+                version=current.version,
+                node_id=None,
+                host_id=None,
+                deployment_id=None,
+                state=None,
+                runtime_properties=None))
         self._create_deployment_node_instances(deployment_id,
                                                added_node_instances)
         return modification
@@ -602,26 +612,32 @@ class BlueprintsManager(object):
             self.sm.update_node(modification.deployment_id, node_id,
                                 number_of_instances=modified_node['instances'])
         node_instances = modification.node_instances
-        for node_instance in node_instances['removed_and_related']:
-            if node_instance.get('modification') == 'removed':
-                self.sm.delete_node_instance(node_instance['id'])
-            else:
-                removed_relationship_target_ids = set(
-                    [rel['target_id']
-                     for rel in node_instance['relationships']])
-                current = self.sm.get_node_instance(node_instance['id'])
-                new_relationships = [rel for rel in current.relationships
-                                     if rel['target_id']
-                                     not in removed_relationship_target_ids]
-                self.sm.update_node_instance(models.DeploymentNodeInstance(
-                    id=node_instance['id'],
-                    relationships=new_relationships,
-                    version=current.version,
-                    node_id=None,
-                    host_id=None,
-                    deployment_id=None,
-                    state=None,
-                    runtime_properties=None))
+        current_node_instances = self._get_node_instances_by_ids(
+            [node_instance['id'] for node_instance
+             in node_instances['removed_and_related']
+             if node_instance.get('modification') != 'removed'])
+        with self.sm.refresh_policy(REFRESH_NONE):
+            for node_instance in node_instances['removed_and_related']:
+                if node_instance.get('modification') == 'removed':
+                    self.sm.delete_node_instance(node_instance['id'])
+                else:
+                    removed_relationship_target_ids = set(
+                        [rel['target_id']
+                         for rel in node_instance['relationships']])
+                    current = current_node_instances[node_instance['id']]
+                    new_relationships = [
+                        rel for rel in current.relationships
+                        if rel['target_id']
+                        not in removed_relationship_target_ids]
+                    self.sm.update_node_instance(models.DeploymentNodeInstance(
+                        id=node_instance['id'],
+                        relationships=new_relationships,
+                        version=current.version,
+                        node_id=None,
+                        host_id=None,
+                        deployment_id=None,
+                        state=None,
+                        runtime_properties=None))
 
         now = str(datetime.now())
         self.sm.update_deployment_modification(
@@ -655,18 +671,21 @@ class BlueprintsManager(object):
                                         modification.status))
         deplyment_id_filter = self.create_filters_dict(
             deployment_id=modification.deployment_id)
-        node_instances = self.sm.get_node_instances(
-            filters=deplyment_id_filter).items
-        modification.node_instances['before_rollback'] = [
-            instance.to_dict() for instance in node_instances]
-        for instance in node_instances:
-            self.sm.delete_node_instance(instance.id)
-        for instance in modification.node_instances['before_modification']:
-            self.sm.put_node_instance(
-                models.DeploymentNodeInstance(**instance))
-        nodes_num_instances = {node.id: node for node in self.sm.get_nodes(
+        # all instances are read before any of them is deleted, so that the
+        # deletions don't interfere with the scroll
+        before_rollback = [instance.to_dict() for instance in
+                           self.sm.iter_node_instances(
+                               filters=deplyment_id_filter)]
+        modification.node_instances['before_rollback'] = before_rollback
+        with self.sm.refresh_policy(REFRESH_NONE):
+            for instance in before_rollback:
+                self.sm.delete_node_instance(instance['id'])
+            self.sm.put_node_instances_bulk(
+                [models.DeploymentNodeInstance(**instance) for instance
+                 in modification.node_instances['before_modification']])
+        nodes_num_instances = {node.id: node for node in self.sm.iter_nodes(
             filters=deplyment_id_filter,
-            include=['id', 'number_of_instances']).items}
+            include=['id', 'number_of_instances'])}
         for node_id, modified_node in modification.modified_nodes.items():
             self.sm.update_node(
                 modification.deployment_id, node_id,
@@ -704,12 +723,13 @@ class BlueprintsManager(object):
     def _create_deployment_node_instances(self,
                                           deployment_id,
                                           dsl_node_instances):
+        instances = []
         for node_instance in dsl_node_instances:
             instance_id = node_instance['id']
             node_id = node_instance['node_id']
             relationships = node_instance.get('relationships', [])
             host_id = node_instance.get('host_id')
-            instance = models.DeploymentNodeInstance(
+            instances.append(models.DeploymentNodeInstance(
                 id=instance_id,
                 node_id=node_id,
                 host_id=host_id,
@@ -717,23 +737,15 @@ class BlueprintsManager(object):
                 deployment_id=deployment_id,
                 state='uninitialized',
                 runtime_properties={},
-                version=None)
-            self.sm.put_node_instance(instance)
+                version=None))
+        if instances:
+            self.sm.put_node_instances_bulk(instances)
 
     def evaluate_deployment_outputs(self, deployment_id):
         deployment = self.get_deployment(
             deployment_id, include=['outputs'])
-
-        def get_node_instances(node_id=None):
-            filters = self.create_filters_dict(deployment_id=deployment_id,
-                                               node_id=node_id)
-            return self.sm.get_node_instances(filters=filters).items
-
-        def get_node_instance(node_instance_id):
-            return self.sm.get_node_instance(node_instance_id)
-
-        def get_node(node_id):
-            return self.sm.get_node(deployment_id, node_id)
+        get_node_instances, get_node_instance, get_node = \
+            self._get_function_evaluation_methods(deployment_id)
 
         try:
             return functions.evaluate_outputs(
@@ -746,17 +758,12 @@ class BlueprintsManager(object):
 
     def evaluate_functions(self, deployment_id, context, payload):
         self.get_deployment(deployment_id, include=['id'])
-
-        def get_node_instances(node_id=None):
-            filters = self.create_filters_dict(deployment_id=deployment_id,
-                                               node_id=node_id)
-            return self.sm.get_node_instances(filters=filters).items
-
-        def get_node_instance(node_instance_id):
-            return self.sm.get_node_instance(node_instance_id)
-
-        def get_node(node_id):
-            return self.sm.get_node(deployment_id, node_id)
+        context_node_instance_ids = [
+            context[key] for key in ('self', 'source', 'target')
+            if context and context.get(key)]
+        get_node_instances, get_node_instance, get_node = \
+            self._get_function_evaluation_methods(deployment_id,
+                                                  context_node_instance_ids)
 
         try:
             return functions.evaluate_functions(
@@ -768,6 +775,74 @@ class BlueprintsManager(object):
         except parser_exceptions.FunctionEvaluationError, e:
             raise manager_exceptions.FunctionsEvaluationError(str(e))
 
+    def _get_function_evaluation_methods(self, deployment_id,
+                                         node_instance_ids=()):
+        """
+        Creates the storage lookup methods used for evaluating functions
+        at runtime. Rather than fetching node instances and nodes one at a
+        time, a missing node instance is fetched along with all node
+        instances it is likely to be followed by (the provided ids and the
+        relationship targets of fetched instances), and a missing node is
+        fetched along with the nodes of all fetched node instances.
+        """
+        node_instances = {}
+        nodes = {}
+        pending_node_instance_ids = set(node_instance_ids)
+
+        def add_node_instances(instances):
+            for instance in instances:
+                node_instances[instance.id] = instance
+                pending_node_instance_ids.update(
+                    rel['target_id'] for rel in instance.relationships or [])
+            pending_node_instance_ids.difference_update(node_instances)
+
+        def get_node_instances(node_id=None):
+            filters = self.create_filters_dict(deployment_id=deployment_id,
+                                               node_id=node_id)
+            instances = self.sm.get_node_instances(filters=filters).items
+            add_node_instances(instances)
+            return instances
+
+        def get_node_instance(node_instance_id):
+            if node_instance_id not in node_instances:
+                pending_node_instance_ids.add(node_instance_id)
+                ids = list(pending_node_instance_ids)
+                pending_node_instance_ids.clear()
+                add_node_instances(
+                    self.sm.get_node_instances_by_ids(ids).items)
+            if node_instance_id not in node_instances:
+                raise manager_exceptions.NotFoundError(
+                    'node_instance {0} not found'.format(node_instance_id))
+            return node_instances[node_instance_id]
+
+        def get_node(node_id):
+            if node_id not in nodes:
+                node_ids = set(instance.node_id for instance
+                               in node_instances.itervalues())
+                node_ids.add(node_id)
+                node_ids.difference_update(nodes)
+                for node in self.sm.get_nodes_by_ids(deployment_id,
+                                                     list(node_ids)).items:
+                    nodes[node.id] = node
+            if node_id not in nodes:
+                raise manager_exceptions.NotFoundError(
+                    'node {0} not found'.format(node_id))
+            return nodes[node_id]
+
+        return get_node_instances, get_node_instance, get_node
+
+    def _get_node_instances_by_ids(self, node_instance_ids):
+        node_instances = {
+            instance.id: instance for instance in
+            self.sm.get_node_instances_by_ids(node_instance_ids).items}
+        missing_ids = [node_instance_id for node_instance_id
+                       in node_instance_ids
+                       if node_instance_id not in node_instances]
+        if missing_ids:
+            raise manager_exceptions.NotFoundError(
+                'node_instance {0} not found'.format(', '.join(missing_ids)))
+        return node_instances
+
     def _create_deployment_nodes(self, blueprint_id, deployment_id, plan,
                                  node_ids=None):
         """
@@ -785,9 +860,10 @@ class BlueprintsManager(object):
         if node_ids:
             raw_nodes = \
                 [node for node in raw_nodes if node['id'] in node_ids]
+        nodes = []
         for raw_node in raw_nodes:
             num_instances = raw_node['instances']['deploy']
-            self.sm.put_node(models.DeploymentNode(
+            nodes.append(models.DeploymentNode(
                 id=raw_node['name'],
                 deployment_id=deployment_id,
                 blueprint_id=blueprint_id,
@@ -803,6 +879,8 @@ class BlueprintsManager(object):
                 plugins_to_install=raw_node.get('plugins_to_install'),
                 relationships=self._prepare_node_relationships(raw_node)
             ))
+        if nodes:
+            self.sm.put_nodes_bulk(nodes)
 
     @staticmethod
     def _merge_and_validate_execution_parameters(
@@ -882,7 +960,7 @@ class BlueprintsManager(object):
             deployment_id=deployment_id)
         env_creation = next(
             (execution for execution in
-             self.sm.executions_list(filters=deployment_id_filter).items
+             self.sm.iter_executions(filters=deployment_id_filter)
              if execution.workflow_id == 'create_deployment_environment'),
             None)
 
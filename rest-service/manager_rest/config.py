@@ -21,6 +21,19 @@ class Config(object):
     def __init__(self):
         self._db_address = 'localhost'
         self._db_port = 9200
+        self._db_connection_pool_size = 10
+        self._db_timeout = 10
+        self._db_max_retries = 3
+        self._db_keep_alive = True
+        self._db_sniff_on_start = False
+        self._db_sniff_on_connection_fail = False
+        self._db_sniffer_timeout = None
+        self._db_refresh_policy = 'immediate'
+        self._db_refresh_interval_ms = 200
+        self._db_cache_size_mb = 64
+        self._events_ngram_text_search = False
+        self._events_cache_size_mb = 32
+        self._events_raw_fields_check_seconds = 60
         self._amqp_address = 'localhost'
         self.amqp_username = 'guest'
         self.amqp_password = 'guest'
@@ -69,6 +82,110 @@ class Config(object):
     def db_port(self, value):
         self._db_port = value
 
+    @property
+    def db_connection_pool_size(self):
+        return self._db_connection_pool_size
+
+    @db_connection_pool_size.setter
+    def db_connection_pool_size(self, value):
+        self._db_connection_pool_size = value
+
+    @property
+    def db_timeout(self):
+        return self._db_timeout
+
+    @db_timeout.setter
+    def db_timeout(self, value):
+        self._db_timeout = value
+
+    @property
+    def db_max_retries(self):
+        return self._db_max_retries
+
+    @db_max_retries.setter
+    def db_max_retries(self, value):
+        self._db_max_retries = value
+
+    @property
+    def db_keep_alive(self):
+        return self._db_keep_alive
+
+    @db_keep_alive.setter
+    def db_keep_alive(self, value):
+        self._db_keep_alive = value
+
+    @property
+    def db_sniff_on_start(self):
+        return self._db_sniff_on_start
+
+    @db_sniff_on_start.setter
+    def db_sniff_on_start(self, value):
+        self._db_sniff_on_start = value
+
+    @property
+    def db_sniff_on_connection_fail(self):
+        return self._db_sniff_on_connection_fail
+
+    @db_sniff_on_connection_fail.setter
+    def db_sniff_on_connection_fail(self, value):
+        self._db_sniff_on_connection_fail = value
+
+    @property
+    def db_sniffer_timeout(self):
+        return self._db_sniffer_timeout
+
+    @db_sniffer_timeout.setter
+    def db_sniffer_timeout(self, value):
+        self._db_sniffer_timeout = value
+
+    @property
+    def db_refresh_policy(self):
+        return self._db_refresh_policy
+
+    @db_refresh_policy.setter
+    def db_refresh_policy(self, value):
+        self._db_refresh_policy = value
+
+    @property
+    def db_refresh_interval_ms(self):
+        return self._db_refresh_interval_ms
+
+    @db_refresh_interval_ms.setter
+    def db_refresh_interval_ms(self, value):
+        self._db_refresh_interval_ms = value
+
+    @property
+    def db_cache_size_mb(self):
+        return self._db_cache_size_mb
+
+    @db_cache_size_mb.setter
+    def db_cache_size_mb(self, value):
+        self._db_cache_size_mb = value
+
+    @property
+    def events_ngram_text_search(self):
+        return self._events_ngram_text_search
+
+    @events_ngram_text_search.setter
+    def events_ngram_text_search(self, value):
+        self._events_ngram_text_search = value
+
+    @property
+    def events_cache_size_mb(self):
+        return self._events_cache_size_mb
+
+    @events_cache_size_mb.setter
+    def events_cache_size_mb(self, value):
+        self._events_cache_size_mb = value
+
+    @property
+    def events_raw_fields_check_seconds(self):
+        return self._events_raw_fields_check_seconds
+
+    @events_raw_fields_check_seconds.setter
+    def events_raw_fields_check_seconds(self, value):
+        self._events_raw_fields_check_seconds = value
+
     @property
     def amqp_address(self):
         return self._amqp_address
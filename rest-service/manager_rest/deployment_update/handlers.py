@@ -36,8 +36,8 @@ class DeploymentUpdateNodeHandler(UpdateHandler):
         :param dep_update:
         :return: a list of all of the nodes (including the non modified nodes)
         """
-        current_nodes = self.sm.get_nodes(
-                filters={'deployment_id': dep_update.deployment_id}).items
+        current_nodes = self.sm.iter_nodes(
+                filters={'deployment_id': dep_update.deployment_id})
         nodes_dict = {node.id: node.to_dict() for node in current_nodes}
 
         entities_update_mapper = {
@@ -387,8 +387,10 @@ class DeploymentUpdateNodeHandler(UpdateHandler):
             # Since there is no good way deleting a specific value from
             # elasticsearch, we first remove it, and than re-enter it.
             self.sm.delete_node(dep_update.deployment_id, raw_node['id'])
-            node = manager_rest.models.DeploymentNode(**raw_node)
-            self.sm.put_node(node)
+        if modified_nodes:
+            self.sm.put_nodes_bulk(
+                [manager_rest.models.DeploymentNode(**raw_node)
+                 for raw_node in modified_nodes])
 
         for deleted_node_instance in deleted_node_instances:
             self.sm.delete_node(dep_update.deployment_id,
@@ -178,7 +178,7 @@ class DeploymentUpdateManager(object):
         # By this point the node_instances aren't updated yet
         raw_node_instances = \
             [instance.to_dict() for instance in
-             self.sm.get_node_instances(filters=deployment_id_filter).items]
+             self.sm.iter_node_instances(filters=deployment_id_filter)]
 
         # project changes in deployment
         return tasks.modify_deployment(
@@ -256,6 +256,9 @@ class DeploymentUpdateManager(object):
 
         self._node_handler.finalize(dep_update)
 
+        # the update may have changed the deployment
+        self.sm.invalidate_cached_deployment(dep_update.deployment_id)
+
         # mark deployment update as committed
         dep_update.state = STATE.COMMITTED
         self.sm.update_deployment_update(dep_update)
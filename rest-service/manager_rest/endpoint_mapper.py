@@ -46,6 +46,8 @@ def setup_resources(api):
         'NodeInstances': 'node-instances',
         'NodeInstancesId': 'node-instances/<string:node_instance_id>',
         'Events': 'events',
+        'EventsTail': 'events/tail',
+        'EventsExport': 'events/export',
         'Search': 'search',
         'Status': 'status',
         'ProviderContext': 'provider/context',
@@ -63,7 +65,11 @@ def setup_resources(api):
         'DeploymentUpdateCommit':
             'deployment-updates/<string:update_id>/commit',
         'DeploymentUpdateFinalizeCommit':
-            'deployment-updates/<string:update_id>/finalize_commit'
+            'deployment-updates/<string:update_id>/finalize_commit',
+        'SummarizeNodeInstances': 'summary/node-instances',
+        'SummarizeExecutions': 'summary/executions',
+        'SummarizeDeployments': 'summary/deployments',
+        'SummarizeEvents': 'summary/events'
     }
 
     for resource, endpoint_suffix in resources_endpoints.iteritems():
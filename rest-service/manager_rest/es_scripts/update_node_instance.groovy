@@ -0,0 +1,8 @@
+if (state != null) {ctx._source.state = state};
+if (runtime_properties != null) {ctx._source.runtime_properties = runtime_properties};
+if (relationships != null) {ctx._source.relationships = relationships};
+if (runtime_properties_set != null || runtime_properties_delete != null) {
+    if (ctx._source.runtime_properties == null) {ctx._source.runtime_properties = [:]};
+    if (runtime_properties_set != null) {ctx._source.runtime_properties.putAll(runtime_properties_set)};
+    if (runtime_properties_delete != null) {runtime_properties_delete.each {ctx._source.runtime_properties.remove(it)}}
+}
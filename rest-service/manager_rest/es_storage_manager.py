@@ -13,9 +13,11 @@
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
 
+import re
+import threading
+from contextlib import contextmanager
 
 import elasticsearch.exceptions
-from elasticsearch import Elasticsearch
 
 from manager_rest import config
 from manager_rest import manager_exceptions
@@ -30,7 +32,13 @@ from manager_rest.models import (BlueprintState,
                                  ProviderContext,
                                  Plugin,
                                  DeploymentUpdate)
-from manager_rest.manager_elasticsearch import ManagerElasticsearch
+from manager_rest.manager_elasticsearch import (ManagerElasticsearch,
+                                                DEFAULT_SEARCH_SIZE,
+                                                get_es_client)
+from manager_rest.refresh_policies import (REFRESH_IMMEDIATE,
+                                           REFRESH_NONE,
+                                           create_refresh_policy)
+from manager_rest.storage_cache import DocumentCache
 
 STORAGE_INDEX_NAME = 'cloudify_storage'
 NODE_TYPE = 'node'
@@ -45,41 +53,218 @@ EXECUTION_TYPE = 'execution'
 PROVIDER_CONTEXT_TYPE = 'provider_context'
 PROVIDER_CONTEXT_ID = 'CONTEXT'
 
+# maximal number of documents sent in a single bulk request
+BULK_CHUNK_SIZE = 500
 
-MUTATE_PARAMS = {
-    'refresh': True
-}
+# name of the ES script which updates a node instance. The script is shipped
+# as es_scripts/update_node_instance.groovy and has to be copied to the es
+# scripts path, like append.groovy. Without it, node instances are updated by
+# getting and indexing them again.
+UPDATE_NODE_INSTANCE_SCRIPT = 'update_node_instance'
+# the error elasticsearch fails scripted updates with when the file script
+# they name isn't in its scripts path
+MISSING_FILE_SCRIPT_ERROR = 'Unable to find on disk script {0}'
+
+# number of documents fetched per shard by each scroll request, and the
+# time a scroll context is kept alive between two requests
+SCROLL_SIZE = 500
+SCROLL_KEEP_ALIVE = '1m'
+
+# elasticsearch remembers the versions of deleted documents for a while
+# (index.gc_deletes, 60 seconds by default), so a document recreated within
+# that time gets a new version. A cached document which was found to be up
+# to date within this many seconds is therefore validated by its version
+# alone, and otherwise by its creation time as well.
+CACHE_VERSION_CHECK_SECONDS = 30
 
 
 class ESStorageManager(object):
 
-    def __init__(self, host, port):
+    def __init__(self, host, port, refresh_policy=REFRESH_IMMEDIATE,
+                 refresh_interval_ms=None, cache_size_mb=0):
         self.es_host = host
         self.es_port = port
+        # blueprints and deployments are cached, as they are read on every
+        # execution start while practically never changing
+        self._cache = DocumentCache(cache_size_mb * 1024 * 1024) \
+            if cache_size_mb else None
+        self._refresh_interval_ms = refresh_interval_ms
+        self._refresh_policies = {}
+        self._default_refresh_policy = self._get_shared_refresh_policy(
+            refresh_policy)
+        self._local = threading.local()
+        self._update_node_instance_script = UPDATE_NODE_INSTANCE_SCRIPT
+        self._update_node_instance_script_missing = False
+        self._summaries_supported = False
 
     @property
     def _connection(self):
-        return Elasticsearch(hosts=[{'host': self.es_host,
-                                     'port': self.es_port}])
+        return get_es_client(self.es_host, self.es_port)
 
-    def _list_docs(self, doc_type, model_class, body=None, fields=None):
-        include = list(fields) if fields else True
+    def _refresh_index(self):
+        self._connection.indices.refresh(index=STORAGE_INDEX_NAME)
+
+    def _get_shared_refresh_policy(self, name):
+        # a deferred policy owns a refresher thread, so only a single
+        # instance of each policy is shared by all threads
+        if name not in self._refresh_policies:
+            self._refresh_policies[name] = create_refresh_policy(
+                name, self._refresh_index, self._refresh_interval_ms)
+        return self._refresh_policies[name]
+
+    @property
+    def _refresh_policy(self):
+        return getattr(self._local, 'refresh_policy', None) or \
+            self._default_refresh_policy
+
+    @contextmanager
+    def refresh_policy(self, name):
+        """
+        Overrides the refresh policy for mutations made by the current
+        thread within the context. Mutations made using the `none` policy
+        are refreshed once, when the context exits.
+        """
+        if name == REFRESH_NONE:
+            policy = create_refresh_policy(name, self._refresh_index)
+        else:
+            policy = self._get_shared_refresh_policy(name)
+        previous = getattr(self._local, 'refresh_policy', None)
+        self._local.refresh_policy = policy
+        try:
+            yield
+        finally:
+            self._local.refresh_policy = previous
+        if name == REFRESH_NONE:
+            policy.wait_for_refresh()
+
+    def _mutate(self, action, **kwargs):
+        policy = self._refresh_policy
+        kwargs.update(policy.mutate_params)
+        result = getattr(self._connection, action)(index=STORAGE_INDEX_NAME,
+                                                   **kwargs)
+        policy.mutated()
+        return result
+
+    def _list_docs(self, doc_type, model_class, body=None, fields=None,
+                   raw=False, stream=False):
+        """
+        :param raw: when true, the items are the documents' sources as
+                    they are, rather than models. Missing fields are not
+                    filled, so raw items are only fit for marshalling, which
+                    outputs missing fields as None.
+        :param stream: when true, the items are raw, and are an iterator
+                       rather than a list if the page spans several
+                       batches. See `_stream_docs`.
+        """
+        if stream:
+            return self._stream_docs(doc_type, body, fields=fields)
+        # searches only see refreshed documents
+        self._refresh_policy.wait_for_refresh()
+        # an explicit _source parameter would override any _source
+        # excludes set in the request body
+        kwargs = {'_source': list(fields)} if fields else {}
         result = self._connection.search(index=STORAGE_INDEX_NAME,
                                          doc_type=doc_type,
                                          body=body,
-                                         _source=include)
+                                         **kwargs)
         docs = ManagerElasticsearch.extract_search_result_values(result)
 
         # ES doesn't return _version if using its search API.
         if doc_type == NODE_INSTANCE_TYPE:
             for doc in docs:
                 doc['version'] = None
-        items = [self._fill_missing_fields_and_deserialize(doc, model_class)
-                 for doc in docs]
+        if raw:
+            items = docs
+        else:
+            items = [self._fill_missing_fields_and_deserialize(doc,
+                                                               model_class)
+                     for doc in docs]
         metadata = ManagerElasticsearch.build_list_result_metadata(body,
                                                                    result)
         return ListResult(items, metadata)
 
+    def _stream_docs(self, doc_type, body, fields=None):
+        """
+        Same as listing raw documents, but the items of pages which span
+        several batches are an iterator.
+
+        Pages larger than SCROLL_SIZE documents are fetched using a scroll
+        in the body's sort order, so only a single batch of documents is
+        held in memory at a time. The first batch is fetched right away, so
+        the metadata is known and search errors are raised by this call.
+        When the first batch holds the whole page, the items are a list.
+        Pages with an offset are searched as is, since a scroll can't start
+        at an offset, and so are smaller pages, which a single search
+        returns anyway. Their items are a list as well.
+        """
+        if body.get('from') or \
+                body.get('size', DEFAULT_SEARCH_SIZE) <= SCROLL_SIZE:
+            return self._list_docs(doc_type, None, body=body,
+                                   fields=fields, raw=True)
+        self._refresh_policy.wait_for_refresh()
+        kwargs = {'_source': list(fields)} if fields else {}
+        result = self._connection.search(index=STORAGE_INDEX_NAME,
+                                         doc_type=doc_type,
+                                         body=dict(body, size=SCROLL_SIZE),
+                                         scroll=SCROLL_KEEP_ALIVE,
+                                         **kwargs)
+        metadata = ManagerElasticsearch.build_list_result_metadata(body,
+                                                                   result)
+        items = _ScrolledDocs(self._connection, doc_type, result,
+                              size=metadata['pagination']['size'])
+        if items.fetched:
+            items = list(items)
+        return ListResult(items, metadata)
+
+    @staticmethod
+    def _check_scroll_result(doc_type, result):
+        if result['_shards'].get('failed'):
+            raise RuntimeError(
+                'Failed scrolling {0} documents: {1} out of {2} '
+                'shards failed'.format(doc_type,
+                                       result['_shards']['failed'],
+                                       result['_shards']['total']))
+
+    def _iter_docs(self, doc_type, model_class, filters=None, fields=None):
+        """
+        Yields all documents matching the filters, using a scroll. Unlike
+        `_list_docs`, the result is not capped at DEFAULT_SEARCH_SIZE and
+        only a single batch of documents is held in memory at a time.
+        Documents are yielded in no particular order.
+        """
+        self._refresh_policy.wait_for_refresh()
+        include = list(fields) if fields else True
+        body = ManagerElasticsearch.build_request_body(filters=filters,
+                                                       skip_size=True)
+        body['size'] = SCROLL_SIZE
+        result = self._connection.search(index=STORAGE_INDEX_NAME,
+                                         doc_type=doc_type,
+                                         body=body,
+                                         _source=include,
+                                         search_type='scan',
+                                         scroll=SCROLL_KEEP_ALIVE)
+        scroll_id = result.get('_scroll_id')
+        try:
+            while scroll_id:
+                result = self._connection.scroll(scroll_id=scroll_id,
+                                                 scroll=SCROLL_KEEP_ALIVE)
+                self._check_scroll_result(doc_type, result)
+                scroll_id = result.get('_scroll_id')
+                docs = ManagerElasticsearch.extract_search_result_values(
+                    result)
+                if not docs:
+                    break
+                for doc in docs:
+                    # ES doesn't return _version if using its search API.
+                    if doc_type == NODE_INSTANCE_TYPE:
+                        doc['version'] = None
+                    yield self._fill_missing_fields_and_deserialize(
+                        doc, model_class)
+        finally:
+            if scroll_id:
+                self._connection.clear_scroll(scroll_id=scroll_id,
+                                              ignore=404)
+
     def _get_doc(self, doc_type, doc_id, fields=None):
         try:
             if fields:
@@ -95,6 +280,41 @@ class ESStorageManager(object):
             raise manager_exceptions.NotFoundError(
                 '{0} {1} not found'.format(doc_type, doc_id))
 
+    def _get_doc_version(self, doc_type, doc_id):
+        try:
+            return self._connection.get(index=STORAGE_INDEX_NAME,
+                                        doc_type=doc_type,
+                                        id=doc_id,
+                                        _source=False)['_version']
+        except elasticsearch.exceptions.NotFoundError:
+            raise manager_exceptions.NotFoundError(
+                '{0} {1} not found'.format(doc_type, doc_id))
+
+    def _get_docs(self, doc_type, doc_ids, fields=None):
+        """
+        Gets several documents using a single multi get request.
+        Documents which don't exist are skipped.
+        :param doc_type: document type
+        :param doc_ids: ids of the documents to get
+        :param fields: optional list of fields to get
+        :return: the found documents, in the order of doc_ids
+        """
+        if not doc_ids:
+            return []
+        params = {'_source': list(fields)} if fields else {}
+        result = self._connection.mget(index=STORAGE_INDEX_NAME,
+                                       doc_type=doc_type,
+                                       body={'ids': list(doc_ids)},
+                                       **params)
+        return [doc for doc in result['docs'] if doc.get('found')]
+
+    @staticmethod
+    def _build_full_list_result(items):
+        metadata = {'pagination': {'total': len(items),
+                                   'size': len(items),
+                                   'offset': 0}}
+        return ListResult(items, metadata)
+
     def _append_doc_list_field(self, doc_type, doc_id, field, value):
         """
         Appends a value to a list field in a document (or creates the list)
@@ -136,21 +356,96 @@ class ESStorageManager(object):
             return self._fill_missing_fields_and_deserialize(fields_data,
                                                              model_class)
 
+    def _get_cached_doc_and_deserialize(self, doc_type, doc_id, model_class,
+                                        fields=None):
+        """
+        Same as `_get_doc_and_deserialize`, but full documents are served
+        from the cache when possible. Other rest service processes may
+        have updated, or deleted and recreated the document, so a cached
+        document is validated against the stored version, which doesn't
+        require reading the document's source at all. Entries which were
+        not validated recently are validated against the stored creation
+        time as well, see CACHE_VERSION_CHECK_SECONDS.
+        """
+        if fields or self._cache is None:
+            return self._get_doc_and_deserialize(doc_type, doc_id,
+                                                 model_class, fields)
+
+        def _stamp(doc):
+            return doc['_version'], doc['_source'].get('created_at')
+
+        def _is_current(stamp, validated_seconds_ago):
+            if validated_seconds_ago < CACHE_VERSION_CHECK_SECONDS:
+                return stamp[0] == self._get_doc_version(doc_type, doc_id)
+            return stamp == _stamp(self._get_doc(doc_type, doc_id,
+                                                 fields=['created_at']))
+
+        key = (doc_type, doc_id)
+        source = self._cache.get(key, _is_current)
+        if source is None:
+            doc = self._get_doc(doc_type, doc_id)
+            source = doc['_source']
+            self._cache.put(key, _stamp(doc), source)
+        return model_class(**source)
+
+    def _invalidate_cached_doc(self, doc_type, doc_id):
+        if self._cache is not None:
+            self._cache.invalidate((doc_type, doc_id))
+
+    def get_cache_stats(self):
+        return self._cache.stats() if self._cache is not None else {}
+
     def _put_doc_if_not_exists(self, doc_type, doc_id, value):
         try:
-            self._connection.create(index=STORAGE_INDEX_NAME,
-                                    doc_type=doc_type, id=doc_id,
-                                    body=value,
-                                    **MUTATE_PARAMS)
+            self._mutate('create', doc_type=doc_type, id=doc_id, body=value)
         except elasticsearch.exceptions.ConflictError:
             raise manager_exceptions.ConflictError(
                 '{0} {1} already exists'.format(doc_type, doc_id))
 
+    def _put_docs_if_not_exist(self, doc_type, docs):
+        """
+        Creates several documents using the bulk API. Documents which do
+        not conflict with existing ones are stored even if others conflict.
+        :param doc_type: document type
+        :param docs: a list of (doc_id, value) tuples
+        """
+        policy = self._refresh_policy
+        conflicts = []
+        failures = []
+        for start in range(0, len(docs), BULK_CHUNK_SIZE):
+            chunk = docs[start:start + BULK_CHUNK_SIZE]
+            body = []
+            for doc_id, value in chunk:
+                body.append({'create': {'_id': doc_id}})
+                body.append(value)
+            # refreshing once, after the last chunk has been indexed
+            params = policy.mutate_params \
+                if start + BULK_CHUNK_SIZE >= len(docs) else {}
+            result = self._connection.bulk(index=STORAGE_INDEX_NAME,
+                                           doc_type=doc_type,
+                                           body=body,
+                                           **params)
+            policy.mutated()
+            if not result.get('errors'):
+                continue
+            for item in result['items']:
+                item_result = item['create']
+                if item_result.get('status') == 409:
+                    conflicts.append(item_result['_id'])
+                elif 'error' in item_result:
+                    failures.append('{0}: {1}'.format(item_result['_id'],
+                                                      item_result['error']))
+        if conflicts:
+            raise manager_exceptions.ConflictError(
+                '{0} {1} already exist'.format(doc_type,
+                                               ', '.join(conflicts)))
+        if failures:
+            raise RuntimeError('Failed storing {0} documents: {1}'.format(
+                doc_type, '; '.join(failures)))
+
     def _delete_doc(self, doc_type, doc_id, model_class, id_field='id'):
         try:
-            res = self._connection.delete(STORAGE_INDEX_NAME, doc_type,
-                                          doc_id,
-                                          **MUTATE_PARAMS)
+            res = self._mutate('delete', doc_type=doc_type, id=doc_id)
         except elasticsearch.exceptions.NotFoundError:
             raise manager_exceptions.NotFoundError(
                 "{0} {1} not found".format(doc_type, doc_id))
@@ -165,6 +460,7 @@ class ESStorageManager(object):
         self._connection.delete_by_query(index=STORAGE_INDEX_NAME,
                                          doc_type=doc_type,
                                          body=query)
+        self._refresh_policy.mutated()
 
     @staticmethod
     def _fill_missing_fields_and_deserialize(fields_data, model_class):
@@ -174,31 +470,36 @@ class ESStorageManager(object):
         return model_class(**fields_data)
 
     def blueprints_list(self, include=None, filters=None, pagination=None,
-                        sort=None):
+                        sort=None, exclude=None, raw=False):
         return self._get_items_list(BLUEPRINT_TYPE,
                                     BlueprintState,
                                     pagination=pagination,
                                     filters=filters,
                                     include=include,
-                                    sort=sort)
+                                    sort=sort,
+                                    exclude=exclude,
+                                    raw=raw)
 
     def snapshots_list(self, include=None, filters=None, pagination=None,
-                       sort=None):
+                       sort=None, raw=False):
         return self._get_items_list(SNAPSHOT_TYPE,
                                     Snapshot,
                                     include=include,
                                     filters=filters,
                                     pagination=pagination,
-                                    sort=sort)
+                                    sort=sort,
+                                    raw=raw)
 
     def deployments_list(self, include=None, filters=None, pagination=None,
-                         sort=None):
+                         sort=None, exclude=None, raw=False):
         return self._get_items_list(DEPLOYMENT_TYPE,
                                     Deployment,
                                     pagination=pagination,
                                     filters=filters,
                                     include=include,
-                                    sort=sort)
+                                    sort=sort,
+                                    exclude=exclude,
+                                    raw=raw)
 
     def deployment_updates_list(self, include=None, filters=None,
                                 pagination=None, sort=None):
@@ -210,13 +511,15 @@ class ESStorageManager(object):
                                     sort=sort)
 
     def executions_list(self, include=None, filters=None, pagination=None,
-                        sort=None):
+                        sort=None, raw=False, stream=False):
         return self._get_items_list(EXECUTION_TYPE,
                                     Execution,
                                     pagination=pagination,
                                     filters=filters,
                                     include=include,
-                                    sort=sort)
+                                    sort=sort,
+                                    raw=raw,
+                                    stream=stream)
 
     def get_blueprint_deployments(self, blueprint_id, include=None):
         deployment_filters = {'blueprint_id': blueprint_id}
@@ -233,6 +536,30 @@ class ESStorageManager(object):
                                       **doc['_source'])
         return node
 
+    def get_node_instances_by_ids(self, node_instance_ids, include=None,
+                                  raw=False):
+        docs = self._get_docs(NODE_INSTANCE_TYPE,
+                              node_instance_ids,
+                              fields=include)
+        items = []
+        for doc in docs:
+            doc['_source']['version'] = doc['_version']
+            if raw:
+                items.append(doc['_source'])
+            else:
+                items.append(self._fill_missing_fields_and_deserialize(
+                    doc['_source'], DeploymentNodeInstance))
+        return self._build_full_list_result(items)
+
+    def get_nodes_by_ids(self, deployment_id, node_ids, include=None):
+        storage_node_ids = [self._storage_node_id(deployment_id, node_id)
+                            for node_id in node_ids]
+        docs = self._get_docs(NODE_TYPE, storage_node_ids, fields=include)
+        return self._build_full_list_result(
+            [self._fill_missing_fields_and_deserialize(doc['_source'],
+                                                       DeploymentNode)
+             for doc in docs])
+
     def get_node(self, deployment_id, node_id, include=None):
         storage_node_id = self._storage_node_id(deployment_id, node_id)
         return self._get_doc_and_deserialize(doc_id=storage_node_id,
@@ -241,47 +568,138 @@ class ESStorageManager(object):
                                              fields=include)
 
     def get_node_instances(self, include=None, filters=None, pagination=None,
-                           sort=None):
+                           sort=None, raw=False, stream=False):
         return self._get_items_list(NODE_INSTANCE_TYPE,
                                     DeploymentNodeInstance,
                                     filters=filters,
                                     include=include,
                                     pagination=pagination,
-                                    sort=sort)
+                                    sort=sort,
+                                    raw=raw,
+                                    stream=stream)
 
     def get_plugins(self, include=None, filters=None, pagination=None,
-                    sort=None):
+                    sort=None, raw=False):
         return self._get_items_list(PLUGIN_TYPE,
                                     Plugin,
                                     filters=filters,
                                     include=include,
                                     pagination=pagination,
-                                    sort=sort)
+                                    sort=sort,
+                                    raw=raw)
 
     def get_nodes(self, include=None, filters=None, pagination=None,
-                  sort=None):
+                  sort=None, raw=False, stream=False):
         return self._get_items_list(NODE_TYPE,
                                     DeploymentNode,
                                     filters=filters,
                                     pagination=pagination,
                                     include=include,
-                                    sort=sort)
+                                    sort=sort,
+                                    raw=raw,
+                                    stream=stream)
 
     def _get_items_list(self, doc_type, model_class, include=None,
-                        filters=None, pagination=None, sort=None):
-        body = ManagerElasticsearch.build_request_body(filters=filters,
-                                                       pagination=pagination,
-                                                       sort=sort)
+                        filters=None, pagination=None, sort=None,
+                        exclude=None, raw=False, stream=False):
+        body = ManagerElasticsearch.build_request_body(
+            filters=filters,
+            pagination=pagination,
+            sort=sort,
+            source_excludes=None if include else exclude)
         return self._list_docs(doc_type,
                                model_class,
                                body=body,
+                               fields=include,
+                               raw=raw,
+                               stream=stream)
+
+    def iter_node_instances(self, filters=None, include=None):
+        return self._iter_docs(NODE_INSTANCE_TYPE,
+                               DeploymentNodeInstance,
+                               filters=filters,
+                               fields=include)
+
+    def iter_nodes(self, filters=None, include=None):
+        return self._iter_docs(NODE_TYPE,
+                               DeploymentNode,
+                               filters=filters,
                                fields=include)
 
+    def iter_executions(self, filters=None, include=None):
+        return self._iter_docs(EXECUTION_TYPE,
+                               Execution,
+                               filters=filters,
+                               fields=include)
+
+    def iter_deployments(self, filters=None, include=None):
+        return self._iter_docs(DEPLOYMENT_TYPE,
+                               Deployment,
+                               filters=filters,
+                               fields=include)
+
+    def _summarize_docs(self, doc_type, target_fields, filters=None):
+        """
+        Counts the documents matching the filters, grouped by each of the
+        target fields in turn. Only the counts are fetched, using nested
+        terms aggregations.
+        :return: a ListResult of {<field>: <value>, 'count': <count>} items,
+                 where items of all but the last target field also contain
+                 a 'by' list of the same form for the following field.
+        """
+        self._verify_summaries_supported()
+        self._refresh_policy.wait_for_refresh()
+        body = ManagerElasticsearch.build_request_body(filters=filters,
+                                                       skip_size=True)
+        body['size'] = 0
+        aggregations = body
+        for field in target_fields:
+            # a size of 0 returns all the buckets
+            aggregations['aggs'] = {
+                field: {'terms': {'field': field, 'size': 0}}}
+            aggregations = aggregations['aggs'][field]
+        result = self._connection.search(index=STORAGE_INDEX_NAME,
+                                         doc_type=doc_type,
+                                         body=body)
+        return self._build_full_list_result(
+            ManagerElasticsearch.extract_aggregation_items(
+                result['aggregations'], target_fields))
+
+    def _verify_summaries_supported(self):
+        # terms aggregations on analyzed fields count their tokens rather
+        # than their values. fields are only mapped as not analyzed since
+        # schema version 1, and the schema version never goes back.
+        if self._summaries_supported:
+            return
+        # storage_schema imports this module
+        from manager_rest.storage_schema import get_schema_version
+        if not get_schema_version(self._connection):
+            raise manager_exceptions.StorageMigrationRequiredError(
+                'Summaries require the storage index to be migrated to the '
+                'current schema, using `python -m manager_rest.storage_schema '
+                'migrate`')
+        self._summaries_supported = True
+
+    def summarize_node_instances(self, target_fields, filters=None):
+        return self._summarize_docs(NODE_INSTANCE_TYPE,
+                                    target_fields,
+                                    filters=filters)
+
+    def summarize_executions(self, target_fields, filters=None):
+        return self._summarize_docs(EXECUTION_TYPE,
+                                    target_fields,
+                                    filters=filters)
+
+    def summarize_deployments(self, target_fields, filters=None):
+        return self._summarize_docs(DEPLOYMENT_TYPE,
+                                    target_fields,
+                                    filters=filters)
+
     def get_blueprint(self, blueprint_id, include=None):
-        return self._get_doc_and_deserialize(BLUEPRINT_TYPE,
-                                             blueprint_id,
-                                             BlueprintState,
-                                             fields=include)
+        return self._get_cached_doc_and_deserialize(BLUEPRINT_TYPE,
+                                                    blueprint_id,
+                                                    BlueprintState,
+                                                    fields=include)
 
     def get_snapshot(self, snapshot_id, include=None):
         return self._get_doc_and_deserialize(SNAPSHOT_TYPE,
@@ -290,10 +708,10 @@ class ESStorageManager(object):
                                              fields=include)
 
     def get_deployment(self, deployment_id, include=None):
-        return self._get_doc_and_deserialize(DEPLOYMENT_TYPE,
-                                             deployment_id,
-                                             Deployment,
-                                             fields=include)
+        return self._get_cached_doc_and_deserialize(DEPLOYMENT_TYPE,
+                                                    deployment_id,
+                                                    Deployment,
+                                                    fields=include)
 
     def get_execution(self, execution_id, include=None):
         return self._get_doc_and_deserialize(EXECUTION_TYPE,
@@ -341,6 +759,20 @@ class ESStorageManager(object):
                                     doc_data)
         return 1
 
+    def put_nodes_bulk(self, nodes):
+        docs = [(self._storage_node_id(node.deployment_id, node.id),
+                 node.to_dict()) for node in nodes]
+        self._put_docs_if_not_exist(NODE_TYPE, docs)
+
+    def put_node_instances_bulk(self, node_instances):
+        docs = []
+        for node_instance in node_instances:
+            doc_data = node_instance.to_dict()
+            del(doc_data['version'])
+            docs.append((str(node_instance.id), doc_data))
+        self._put_docs_if_not_exist(NODE_INSTANCE_TYPE, docs)
+        return len(docs)
+
     def get_deployment_update(self, deployment_update_id):
         return self._get_doc_and_deserialize(DEPLOYMENT_UPDATE_TYPE,
                                              deployment_update_id,
@@ -363,6 +795,7 @@ class ESStorageManager(object):
                                     value=step.to_dict())
 
     def delete_blueprint(self, blueprint_id):
+        self._invalidate_cached_doc(BLUEPRINT_TYPE, blueprint_id)
         return self._delete_doc(BLUEPRINT_TYPE, blueprint_id,
                                 BlueprintState)
 
@@ -378,11 +811,10 @@ class ESStorageManager(object):
                            'error': error}
         update_doc = {'doc': update_doc_data}
         try:
-            self._connection.update(index=STORAGE_INDEX_NAME,
-                                    doc_type=SNAPSHOT_TYPE,
-                                    id=str(snapshot_id),
-                                    body=update_doc,
-                                    **MUTATE_PARAMS)
+            self._mutate('update',
+                         doc_type=SNAPSHOT_TYPE,
+                         id=str(snapshot_id),
+                         body=update_doc)
         except elasticsearch.exceptions.NotFoundError:
             raise manager_exceptions.NotFoundError(
                 "Snapshot {0} not found".format(snapshot_id))
@@ -393,11 +825,10 @@ class ESStorageManager(object):
         update_doc = {'doc': update_doc_data}
 
         try:
-            self._connection.update(index=STORAGE_INDEX_NAME,
-                                    doc_type=EXECUTION_TYPE,
-                                    id=str(execution_id),
-                                    body=update_doc,
-                                    **MUTATE_PARAMS)
+            self._mutate('update',
+                         doc_type=EXECUTION_TYPE,
+                         id=str(execution_id),
+                         body=update_doc)
         except elasticsearch.exceptions.NotFoundError:
             raise manager_exceptions.NotFoundError(
                 "Execution {0} not found".format(execution_id))
@@ -405,11 +836,10 @@ class ESStorageManager(object):
     def update_provider_context(self, provider_context):
         doc_data = {'doc': provider_context.to_dict()}
         try:
-            self._connection.update(index=STORAGE_INDEX_NAME,
-                                    doc_type=PROVIDER_CONTEXT_TYPE,
-                                    id=PROVIDER_CONTEXT_ID,
-                                    body=doc_data,
-                                    **MUTATE_PARAMS)
+            self._mutate('update',
+                         doc_type=PROVIDER_CONTEXT_TYPE,
+                         id=PROVIDER_CONTEXT_ID,
+                         body=doc_data)
         except elasticsearch.exceptions.NotFoundError:
             raise manager_exceptions.NotFoundError(
                 'Provider Context not found')
@@ -423,8 +853,12 @@ class ESStorageManager(object):
         self._delete_doc_by_query(NODE_INSTANCE_TYPE, query)
         self._delete_doc_by_query(NODE_TYPE, query)
         self._delete_doc_by_query(DEPLOYMENT_MODIFICATION_TYPE, query)
+        self._invalidate_cached_doc(DEPLOYMENT_TYPE, deployment_id)
         return self._delete_doc(DEPLOYMENT_TYPE, deployment_id, Deployment)
 
+    def invalidate_cached_deployment(self, deployment_id):
+        self._invalidate_cached_doc(DEPLOYMENT_TYPE, deployment_id)
+
     def delete_execution(self, execution_id):
         return self._delete_doc(EXECUTION_TYPE, execution_id, Execution)
 
@@ -452,46 +886,117 @@ class ESStorageManager(object):
                 'planned_number_of_instances'] = planned_number_of_instances
         update_doc = {'doc': update_doc_data}
         try:
-            self._connection.update(index=STORAGE_INDEX_NAME,
-                                    doc_type=NODE_TYPE,
-                                    id=storage_node_id,
-                                    body=update_doc,
-                                    **MUTATE_PARAMS)
+            self._mutate('update',
+                         doc_type=NODE_TYPE,
+                         id=storage_node_id,
+                         body=update_doc)
             return update_doc_data
         except elasticsearch.exceptions.NotFoundError:
             raise manager_exceptions.NotFoundError(
                 "Node {0} not found".format(node_id))
 
-    def update_node_instance(self, node):
-        new_state = node.state
-        new_runtime_props = node.runtime_properties
-        new_relationships = node.relationships
-
+    def update_node_instance(self, node, set_runtime_properties=None,
+                             delete_runtime_properties=None):
+        """
+        Updates the state, runtime properties and relationships of a node
+        instance (those which are not None) using a single scripted update.
+        Elasticsearch validates the version as part of the update, so
+        concurrent updates can't override each other. A version of 0 skips
+        the validation.
+        Rather than replacing all of the runtime properties, specific keys
+        may be set or deleted, in which case only these keys are sent.
+        NOTE: when update_node_instance.groovy isn't located in es scripts
+        path, the node instance is updated with a versioned get and index
+        instead, which takes two requests
+        :param node: the node instance update
+        :param set_runtime_properties: a dict of runtime properties to set
+        :param delete_runtime_properties: a list of runtime property keys to
+                                          delete
+        :return: the updated node instance, including its new version
+        """
+        if self._update_node_instance_script_missing:
+            return self._get_and_index_node_instance(
+                node, set_runtime_properties, delete_runtime_properties)
+        version_params = {'version': node.version} if node.version else {}
+        try:
+            result = self._mutate(
+                'update',
+                doc_type=NODE_INSTANCE_TYPE,
+                id=node.id,
+                body={
+                    # a file script, which unlike an inline script doesn't
+                    # require dynamic scripting
+                    'script_file': self._update_node_instance_script,
+                    'lang': 'groovy',
+                    'params': {
+                        'state': node.state,
+                        'runtime_properties': node.runtime_properties,
+                        'relationships': node.relationships,
+                        'runtime_properties_set': set_runtime_properties,
+                        'runtime_properties_delete': delete_runtime_properties
+                    }
+                },
+                fields='_source',
+                **version_params)
+        except elasticsearch.exceptions.NotFoundError:
+            raise manager_exceptions.NotFoundError(
+                'Node instance {0} not found'.format(node.id))
+        except elasticsearch.exceptions.ConflictError as e:
+            self._raise_node_instance_conflict(node, e)
+        except elasticsearch.exceptions.TransportError as e:
+            missing_script_error = MISSING_FILE_SCRIPT_ERROR.format(
+                self._update_node_instance_script)
+            if missing_script_error not in str(e):
+                raise
+            self._update_node_instance_script_missing = True
+            return self._get_and_index_node_instance(
+                node, set_runtime_properties, delete_runtime_properties)
+        return DeploymentNodeInstance(version=result['_version'],
+                                      **result['get']['_source'])
+
+    def _get_and_index_node_instance(self, node, set_runtime_properties,
+                                     delete_runtime_properties):
         current = self.get_node_instance(node.id)
-        # Validate version - this is not 100% safe since elasticsearch
-        # update doesn't accept the version field.
         if node.version != 0 and current.version != node.version:
             raise manager_exceptions.ConflictError(
                 'Node instance update conflict [current_version={0}, updated_'
                 'version={1}]'.format(current.version, node.version))
 
-        if new_state is not None:
-            current.state = new_state
-
-        if new_runtime_props is not None:
-            current.runtime_properties = new_runtime_props
-
-        if new_relationships is not None:
-            current.relationships = new_relationships
+        if node.state is not None:
+            current.state = node.state
+        if node.runtime_properties is not None:
+            current.runtime_properties = node.runtime_properties
+        if node.relationships is not None:
+            current.relationships = node.relationships
+        if set_runtime_properties or delete_runtime_properties:
+            current.runtime_properties = current.runtime_properties or {}
+            current.runtime_properties.update(set_runtime_properties or {})
+            for key in delete_runtime_properties or []:
+                current.runtime_properties.pop(key, None)
 
         updated = current.to_dict()
         del updated['version']
+        # indexing with the version that was read fails if the node
+        # instance was updated in the meantime
+        try:
+            result = self._mutate('index',
+                                  doc_type=NODE_INSTANCE_TYPE,
+                                  id=node.id,
+                                  body=updated,
+                                  version=current.version)
+        except elasticsearch.exceptions.ConflictError as e:
+            self._raise_node_instance_conflict(node, e)
+        return DeploymentNodeInstance(version=result['_version'], **updated)
 
-        self._connection.index(index=STORAGE_INDEX_NAME,
-                               doc_type=NODE_INSTANCE_TYPE,
-                               id=node.id,
-                               body=updated,
-                               **MUTATE_PARAMS)
+    @staticmethod
+    def _raise_node_instance_conflict(node, es_error):
+        current_version = re.search(r'current \[(\d+)\]',
+                                    str(es_error.error))
+        raise manager_exceptions.ConflictError(
+            'Node instance update conflict [current_version={0}, updated_'
+            'version={1}]'.format(
+                current_version.group(1) if current_version else None,
+                node.version))
 
     def put_provider_context(self, provider_context):
         doc_data = provider_context.to_dict()
@@ -529,23 +1034,23 @@ class ESStorageManager(object):
 
         update_doc = {'doc': update_doc_data}
         try:
-            self._connection.update(index=STORAGE_INDEX_NAME,
-                                    doc_type=DEPLOYMENT_MODIFICATION_TYPE,
-                                    id=modification_id,
-                                    body=update_doc,
-                                    **MUTATE_PARAMS)
+            self._mutate('update',
+                         doc_type=DEPLOYMENT_MODIFICATION_TYPE,
+                         id=modification_id,
+                         body=update_doc)
         except elasticsearch.exceptions.NotFoundError:
             raise manager_exceptions.NotFoundError(
                 "Modification {0} not found".format(modification_id))
 
     def deployment_modifications_list(self, include=None, filters=None,
-                                      pagination=None, sort=None):
+                                      pagination=None, sort=None, raw=False):
         return self._get_items_list(DEPLOYMENT_MODIFICATION_TYPE,
                                     DeploymentModification,
                                     filters=filters,
                                     include=include,
                                     pagination=pagination,
-                                    sort=sort)
+                                    sort=sort,
+                                    raw=raw)
 
     @staticmethod
     def _storage_node_id(deployment_id, node_id):
@@ -555,5 +1060,74 @@ class ESStorageManager(object):
 def create():
     return ESStorageManager(
         config.instance().db_address,
-        config.instance().db_port
+        config.instance().db_port,
+        refresh_policy=config.instance().db_refresh_policy,
+        refresh_interval_ms=config.instance().db_refresh_interval_ms,
+        cache_size_mb=config.instance().db_cache_size_mb
     )
+
+
+class _ScrolledDocs(object):
+    """
+    Iterates over the documents of a scroll, starting with those of its
+    first search result, yielding at most `size` documents.
+
+    The scroll is cleared as soon as its last batch is fetched, so a scroll
+    which fits in a single batch is never left open. Closing the iterator
+    clears the scroll as well, whether or not the iteration started.
+    """
+
+    def __init__(self, connection, doc_type, result, size):
+        self._connection = connection
+        self._doc_type = doc_type
+        self._scroll_id = result.get('_scroll_id')
+        self._remaining = min(size, result['hits']['total'])
+        self._docs = self._extract_docs(result)
+
+    def __iter__(self):
+        return self
+
+    @property
+    def fetched(self):
+        """Whether all the documents were fetched, closing the scroll"""
+        return self._scroll_id is None
+
+    def next(self):
+        while True:
+            try:
+                return next(self._docs)
+            except StopIteration:
+                if not self._scroll_id:
+                    raise
+            result = self._connection.scroll(scroll_id=self._scroll_id,
+                                             scroll=SCROLL_KEEP_ALIVE)
+            self._scroll_id = result.get('_scroll_id')
+            self._docs = self._extract_docs(result)
+
+    def close(self):
+        self._docs = iter([])
+        self._clear_scroll()
+
+    def _clear_scroll(self):
+        if self._scroll_id:
+            scroll_id, self._scroll_id = self._scroll_id, None
+            self._connection.clear_scroll(scroll_id=scroll_id, ignore=404)
+
+    def _extract_docs(self, result):
+        try:
+            ESStorageManager._check_scroll_result(self._doc_type, result)
+        except RuntimeError:
+            self._clear_scroll()
+            raise
+        docs = ManagerElasticsearch.extract_search_result_values(result)
+        # a short batch is the last one, and so is the one which completes
+        # the requested size or the total
+        if len(docs) < SCROLL_SIZE or len(docs) >= self._remaining:
+            self._clear_scroll()
+        docs = docs[:self._remaining]
+        self._remaining -= len(docs)
+        # ES doesn't return _version if using its search API.
+        if self._doc_type == NODE_INSTANCE_TYPE:
+            for doc in docs:
+                doc['version'] = None
+        return iter(docs)
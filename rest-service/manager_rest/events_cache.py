@@ -0,0 +1,151 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from manager_rest import config
+from manager_rest import manager_exceptions
+from manager_rest.models import Execution
+from manager_rest.storage_cache import DocumentCache
+from manager_rest.storage_manager import ListResult
+from manager_rest.manager_elasticsearch import EVENTS_RAW_FIELD_SUFFIX
+
+EXECUTION_ID_FIELD = 'context.execution_id{0}'.format(EVENTS_RAW_FIELD_SUFFIX)
+
+# events are sent through the message broker and logstash, so they may
+# still be stored for a little while after their execution has ended
+SETTLE_SECONDS = 30
+MAX_TRACKED_EXECUTIONS = 10000
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_execution_ids(query):
+    """
+    Get the ids of the executions an events query is restricted to.
+    Only exact filters on the raw execution id subfield are recognized;
+    match queries on the analyzed field may match other executions too,
+    so such queries are never cached.
+    :return: a list of execution ids, or None if the query is not
+             restricted to specific executions
+    """
+    conditions = query.get('query', {}).get('filtered', {}).get(
+        'filter', {}).get('bool', {}).get('must', [])
+    for condition in conditions:
+        for filter_type in ('terms', 'term'):
+            if EXECUTION_ID_FIELD in condition.get(filter_type, {}):
+                execution_ids = condition[filter_type][EXECUTION_ID_FIELD]
+                if not isinstance(execution_ids, list):
+                    execution_ids = [execution_ids]
+                return execution_ids
+    return None
+
+
+class EventsCache(object):
+    """
+    A thread safe LRU cache of events query results, bounded by the total
+    size of the cached results.
+
+    The events of an ended execution do not change, so only the results of
+    queries which are restricted to ended executions are cached, once the
+    executions have been seen ended for `settle_seconds`. An execution
+    never leaves its end state, so its status is only read from the
+    storage until it is first seen ended.
+    """
+
+    def __init__(self, max_size_bytes, settle_seconds=SETTLE_SECONDS):
+        self._results = DocumentCache(max_size_bytes)
+        self._settle_seconds = settle_seconds
+        # execution id -> time the execution was first seen ended
+        self._ended_executions = OrderedDict()
+        self._lock = threading.Lock()
+        self._bypasses = 0
+
+    def list_events(self, query, list_events, get_execution, **kwargs):
+        """
+        List events, serving the result from the cache when possible.
+        :param query: an events query
+        :param list_events: a function accepting the query and the keyword
+                            arguments, returning a ListResult of events
+        :param get_execution: a function returning an execution by its id
+        """
+        execution_ids = get_execution_ids(query)
+        if not execution_ids or not self._have_settled(execution_ids,
+                                                       get_execution):
+            with self._lock:
+                self._bypasses += 1
+            return list_events(query, **kwargs)
+
+        key = json.dumps([query, kwargs], sort_keys=True)
+        cached = self._results.get(key, lambda stamp, age: True)
+        if cached is not None:
+            return ListResult(cached['items'], cached['metadata'])
+        result = list_events(query, **kwargs)
+        self._results.put(key, None, {'items': result.items,
+                                      'metadata': result.metadata})
+        return result
+
+    def _have_settled(self, execution_ids, get_execution):
+        now = time.time()
+        for execution_id in execution_ids:
+            with self._lock:
+                ended_at = self._ended_executions.get(execution_id)
+            if ended_at is None:
+                try:
+                    execution = get_execution(execution_id,
+                                              include=['status'])
+                except manager_exceptions.NotFoundError:
+                    return False
+                if execution.status not in Execution.END_STATES:
+                    return False
+                with self._lock:
+                    ended_at = self._ended_executions.setdefault(
+                        execution_id, now)
+                    while len(self._ended_executions) > \
+                            MAX_TRACKED_EXECUTIONS:
+                        self._ended_executions.popitem(last=False)
+            if now - ended_at < self._settle_seconds:
+                return False
+        return True
+
+    def stats(self):
+        stats = self._results.stats()
+        with self._lock:
+            stats['bypasses'] = self._bypasses
+            stats['ended_executions'] = len(self._ended_executions)
+        return stats
+
+
+def get_events_cache():
+    """
+    Get the process wide events cache, or None if it is disabled.
+    """
+    global _cache
+    size_mb = config.instance().events_cache_size_mb
+    if not size_mb:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EventsCache(size_mb * 1024 * 1024)
+        return _cache
+
+
+def get_events_cache_stats():
+    cache = get_events_cache()
+    return cache.stats() if cache is not None else {}
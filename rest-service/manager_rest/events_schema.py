@@ -0,0 +1,116 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Index template of the (logstash created) daily events indices.
+
+The template is applied on top of the logstash template, and adds an
+n-gram subfield to event and log message texts, so searching them does not
+require leading wildcard queries. Only indices created after the template
+is installed have the subfield, so `events_ngram_text_search` should only be
+enabled once every retained events index has been created with it.
+
+Usage:
+
+    python -m manager_rest.events_schema [--host H] [--port P] install
+"""
+
+import argparse
+
+from manager_rest.manager_elasticsearch import (get_es_client,
+                                                EVENTS_INDICES_PATTERN,
+                                                EVENTS_TEXT_NGRAM_SUBFIELD,
+                                                EVENTS_TEXT_NGRAM_SIZE)
+
+EVENTS_TEMPLATE_NAME = 'cloudify_events'
+# the logstash template has order 0
+EVENTS_TEMPLATE_ORDER = 1
+
+NGRAM_ANALYZER = 'event_text_ngram'
+
+
+def get_events_template():
+    return {
+        'template': EVENTS_INDICES_PATTERN,
+        'order': EVENTS_TEMPLATE_ORDER,
+        'settings': {
+            'analysis': {
+                'tokenizer': {
+                    NGRAM_ANALYZER: {
+                        'type': 'nGram',
+                        # a single gram size keeps the grams' positions
+                        # sequential, so that phrase queries on the grams
+                        # match substrings
+                        'min_gram': EVENTS_TEXT_NGRAM_SIZE,
+                        'max_gram': EVENTS_TEXT_NGRAM_SIZE,
+                        'token_chars': ['letter', 'digit', 'punctuation',
+                                        'symbol']
+                    }
+                },
+                'analyzer': {
+                    NGRAM_ANALYZER: {
+                        'type': 'custom',
+                        'tokenizer': NGRAM_ANALYZER,
+                        'filter': ['lowercase']
+                    }
+                }
+            }
+        },
+        'mappings': {
+            '_default_': {
+                'properties': {
+                    'message': {
+                        'properties': {
+                            'text': {
+                                'type': 'string',
+                                'omit_norms': True,
+                                'fields': {
+                                    # kept from the logstash template
+                                    'raw': {'type': 'string',
+                                            'index': 'not_analyzed',
+                                            'ignore_above': 256},
+                                    EVENTS_TEXT_NGRAM_SUBFIELD: {
+                                        'type': 'string',
+                                        'analyzer': NGRAM_ANALYZER,
+                                        'omit_norms': True
+                                    }
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
+
+
+def install_events_template(es):
+    es.indices.put_template(name=EVENTS_TEMPLATE_NAME,
+                            body=get_events_template())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the events indices '
+                                                 'template')
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('install', help='install the events template')
+    args = parser.parse_args()
+    install_events_template(get_es_client(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,7 @@
 
 import os
 import json
+from contextlib import contextmanager
 
 from manager_rest.storage_manager import ListResult
 from manager_rest.models import (BlueprintState,
@@ -58,7 +59,33 @@ def sort_list(list_of_objects, sort=None):
     return list_of_objects
 
 
-def paginate_list(list_of_objects, pagination=None):
+def summarize_list(list_of_objects, target_fields):
+    field = target_fields[0]
+    groups = {}
+    for obj in list_of_objects:
+        value = getattr(obj, field)
+        if value is not None:
+            groups.setdefault(value, []).append(obj)
+    items = []
+    # ordered like elasticsearch terms aggregation buckets
+    for value, group in sorted(groups.iteritems(),
+                               key=lambda (k, v): (-len(v), k)):
+        item = {field: value, 'count': len(group)}
+        if len(target_fields) > 1:
+            item['by'] = summarize_list(group, target_fields[1:])
+        items.append(item)
+    return items
+
+
+def paginate_list(list_of_objects, pagination=None, raw=False,
+                  stream=False):
+    """
+    :param raw: when true, the items are converted to dicts, like the raw
+                items of the elasticsearch storage manager
+    :param stream: when true, the items are raw. Like the streamed items of
+                   the elasticsearch storage manager which fit in a single
+                   batch, they are a list
+    """
     total = len(list_of_objects)
     if pagination:
         offset = pagination.get('offset')
@@ -75,6 +102,8 @@ def paginate_list(list_of_objects, pagination=None):
                   'size': size,
                   'offset': offset}
     meta = {'pagination': pagination}
+    if raw or stream:
+        list_of_objects = [obj.to_dict() for obj in list_of_objects]
     return ListResult(list_of_objects, meta)
 
 
@@ -101,6 +130,15 @@ class FileStorageManager(object):
         if os.path.isfile(storage_path):
             os.remove(storage_path)
 
+    @contextmanager
+    def refresh_policy(self, name):
+        # file storage mutations are visible immediately
+        yield
+
+    def invalidate_cached_deployment(self, deployment_id):
+        # nothing is cached by the file storage
+        pass
+
     def _init_file(self):
         data = {}
         for entity_name in FileStorageManager.entities.keys():
@@ -135,37 +173,82 @@ class FileStorageManager(object):
         raise manager_exceptions.NotFoundError(
             "Node {0} not found".format(node_id))
 
+    def get_node_instances_by_ids(self, node_instance_ids, raw=False, **_):
+        node_instances = self._load_data()[NODE_INSTANCES]
+        return paginate_list([node_instances[node_instance_id]
+                              for node_instance_id in node_instance_ids
+                              if node_instance_id in node_instances],
+                             raw=raw)
+
+    def get_nodes_by_ids(self, deployment_id, node_ids, **_):
+        nodes = self._load_data()[NODES]
+        storage_node_ids = ['{0}_{1}'.format(deployment_id, node_id)
+                            for node_id in node_ids]
+        return paginate_list([nodes[storage_node_id]
+                              for storage_node_id in storage_node_ids
+                              if storage_node_id in nodes])
+
     def get_node_instances(self, filters=None, pagination=None,
-                           sort=None, **_):
+                           sort=None, raw=False, stream=False, **_):
         instances = self._load_data()[NODE_INSTANCES].values()
         instances = sort_list(instances, sort)
         result = self.filter_data(instances, filters)
         return paginate_list(result,
-                             pagination=pagination)
+                             pagination=pagination,
+                             raw=raw,
+                             stream=stream)
 
     def get_nodes(self, filters=None, pagination=None,
-                  sort=None, **_):
+                  sort=None, raw=False, stream=False, **_):
         nodes = self._load_data()[NODES].values()
         nodes = sort_list(nodes, sort)
         result = self.filter_data(nodes, filters)
         return paginate_list(result,
-                             pagination=pagination)
+                             pagination=pagination,
+                             raw=raw,
+                             stream=stream)
+
+    def iter_node_instances(self, filters=None, **_):
+        return iter(self.get_node_instances(filters=filters).items)
+
+    def iter_nodes(self, filters=None, **_):
+        return iter(self.get_nodes(filters=filters).items)
+
+    def iter_executions(self, filters=None, **_):
+        return iter(self.executions_list(filters=filters).items)
+
+    def iter_deployments(self, filters=None, **_):
+        return iter(self.deployments_list(filters=filters).items)
+
+    def summarize_node_instances(self, target_fields, filters=None):
+        return paginate_list(summarize_list(
+            self.get_node_instances(filters=filters).items, target_fields))
+
+    def summarize_executions(self, target_fields, filters=None):
+        return paginate_list(summarize_list(
+            self.executions_list(filters=filters).items, target_fields))
+
+    def summarize_deployments(self, target_fields, filters=None):
+        return paginate_list(summarize_list(
+            self.deployments_list(filters=filters).items, target_fields))
 
     def get_plugins(self, include=None, filters=None, pagination=None,
-                    sort=None):
+                    sort=None, raw=False):
         plugins = self._load_data()[PLUGINS].values()
         plugins = sort_list(plugins, sort)
         result = self.filter_data(plugins, filters)
         return paginate_list(result,
-                             pagination=pagination)
+                             pagination=pagination,
+                             raw=raw)
 
     def snapshots_list(self, include=None, filters=None, pagination=None,
-                       sort=None):
+                       sort=None, raw=False):
         snapshots = self._load_data()[SNAPSHOTS].values()
         snapshots = sort_list(snapshots, sort)
         result = self.filter_data(snapshots, filters)
         return paginate_list(result,
-                             pagination=pagination)
+                             pagination=pagination,
+                             raw=raw)
 
     def get_node(self, deployment_id, node_id, **_):
         data = self._load_data()
@@ -195,6 +278,36 @@ class FileStorageManager(object):
         self._dump_data(data)
         return 1
 
+    def put_nodes_bulk(self, nodes):
+        data = self._load_data()
+        conflicts = []
+        for node in nodes:
+            node_id = '{0}_{1}'.format(node.deployment_id, node.id)
+            if node_id in data[NODES]:
+                conflicts.append(node_id)
+                continue
+            data[NODES][node_id] = node
+        self._dump_data(data)
+        if conflicts:
+            raise manager_exceptions.ConflictError(
+                'Nodes {0} already exist'.format(', '.join(conflicts)))
+
+    def put_node_instances_bulk(self, node_instances):
+        data = self._load_data()
+        conflicts = []
+        for node_instance in node_instances:
+            node_instance_id = str(node_instance.id)
+            if node_instance_id in data[NODE_INSTANCES]:
+                conflicts.append(node_instance_id)
+                continue
+            data[NODE_INSTANCES][node_instance_id] = node_instance
+        self._dump_data(data)
+        if conflicts:
+            raise manager_exceptions.ConflictError(
+                'Node instances {0} already exist'.format(
+                    ', '.join(conflicts)))
+        return len(node_instances)
+
     def update_execution_status(self, execution_id, status, error):
         data = self._load_data()
         if execution_id not in data[EXECUTIONS]:
@@ -222,7 +335,8 @@ class FileStorageManager(object):
             node.planned_number_of_instances = planned_number_of_instances
         self._dump_data(data)
 
-    def update_node_instance(self, node_update):
+    def update_node_instance(self, node_update, set_runtime_properties=None,
+                             delete_runtime_properties=None):
         data = self._load_data()
         if node_update.id not in data[NODE_INSTANCES]:
             raise manager_exceptions.NotFoundError(
@@ -233,19 +347,29 @@ class FileStorageManager(object):
             node.state = node_update.state
         if node_update.runtime_properties is not None:
             node.runtime_properties = node_update.runtime_properties
+        if set_runtime_properties or delete_runtime_properties:
+            node.runtime_properties = node.runtime_properties or {}
+            node.runtime_properties.update(set_runtime_properties or {})
+            for key in delete_runtime_properties or []:
+                node.runtime_properties.pop(key, None)
         if node_update.relationships is not None:
             node.relationships = node_update.relationships
+        # like elasticsearch, every update bumps the version
+        if node.version is not None:
+            node.version += 1
 
         data[NODE_INSTANCES][node.id] = node
         self._dump_data(data)
+        return node
 
     def blueprints_list(self, filters=None, pagination=None,
-                        sort=None, **_):
+                        sort=None, raw=False, **_):
         blueprints = self._load_data()[BLUEPRINTS].values()
         blueprints = sort_list(blueprints, sort)
         result = self.filter_data(blueprints, filters)
         return paginate_list(result,
-                             pagination=pagination)
+                             pagination=pagination,
+                             raw=raw)
 
     @staticmethod
     def filter_data(items_lst, filters=None):
@@ -263,12 +387,13 @@ class FileStorageManager(object):
         return result
 
     def deployments_list(self, filters=None, pagination=None,
-                         sort=None, **_):
+                         sort=None, raw=False, **_):
         deployments = self._load_data()[DEPLOYMENTS].values()
         deployments = sort_list(deployments, sort)
         result = self.filter_data(deployments, filters)
         return paginate_list(result,
-                             pagination=pagination)
+                             pagination=pagination,
+                             raw=raw)
 
     def deployment_updates_list(self, filters=None, pagination=None,
                                 sort=None, **_):
@@ -279,12 +404,14 @@ class FileStorageManager(object):
                              pagination=pagination)
 
     def executions_list(self, filters=None, pagination=None,
-                        sort=None, **_):
+                        sort=None, raw=False, stream=False, **_):
         executions = self._load_data()[EXECUTIONS].values()
         executions = sort_list(executions, sort)
         result = self.filter_data(executions, filters)
         return paginate_list(result,
-                             pagination=pagination)
+                             pagination=pagination,
+                             raw=raw,
+                             stream=stream)
 
     def get_blueprint_deployments(self, blueprint_id, **_):
         return self.deployments_list(filters={'blueprint_id': blueprint_id})
@@ -488,12 +615,13 @@ class FileStorageManager(object):
             "Deployment modification {0} not found".format(modification_id))
 
     def deployment_modifications_list(self, include=None, filters=None,
-                                      pagination=None, sort=None):
+                                      pagination=None, sort=None, raw=False):
         modifications = self._load_data()[DEPLOYMENT_MODIFICATIONS].values()
         modifications = sort_list(modifications, sort)
         result = self.filter_data(modifications, filters)
         return paginate_list(result,
-                             pagination=pagination)
+                             pagination=pagination,
+                             raw=raw)
 
     def update_deployment_modification(self, modification):
             modification_id = modification.id
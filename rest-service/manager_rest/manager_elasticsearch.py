@@ -11,18 +11,112 @@
 #  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
+import os
 import re
+import time
+import threading
+from datetime import datetime, timedelta
 
 import elasticsearch
-from flask import g
 
 from manager_rest import config
 
 DEFAULT_SEARCH_SIZE = 10000
 EVENTS_INDICES_PATTERN = 'logstash-*'
+# logstash creates an events index per (UTC) day
+EVENTS_INDEX_NAME_FORMAT = 'logstash-%Y.%m.%d'
+# longer time ranges search all the events indices
+MAX_PRUNED_EVENTS_INDICES = 90
+# the logstash template maps every string field of the events indices to
+# an analyzed field with a not analyzed `raw` subfield. Indices which were
+# created without the template, e.g. using dynamic mappings, lack them.
+EVENTS_RAW_FIELD_SUFFIX = '.raw'
+# the field whose mapping tells whether the events indices have raw
+# subfields
+EVENTS_RAW_FIELD_PROBE = 'context.execution_id'
+# message texts are also indexed as trigrams, by the events index template
+EVENTS_TEXT_NGRAM_SUBFIELD = 'ngram'
+EVENTS_TEXT_NGRAM_SIZE = 3
+# number of events fetched by each scroll request, and the time a scroll
+# context is kept alive between two requests
+EVENTS_SCROLL_SIZE = 1000
+EVENTS_SCROLL_KEEP_ALIVE = '1m'
 
 RESERVED_CHARS_REGEX = '([\(\)\{\}\+\-\=\>\<\!\[\]\^\"\~\*\?\:\\/]|&&|\|\|\s)'
 
+# process-wide Elasticsearch clients, keyed by (host, port). Clients are
+# bound to the pid which created them, so a forked worker never shares
+# sockets with its parent.
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+_client_stats = {'clients_created': 0, 'clients_reused': 0}
+_events_raw_fields = {'present': False, 'checked_at': None}
+
+
+def get_es_client(host=None, port=None):
+    """Return the shared, pooled Elasticsearch client for host:port.
+
+    The client and its connection pool are created once per process (using
+    the `db_*` connection settings of the manager configuration) and reused
+    by every subsequent caller.
+    """
+    global _clients_pid
+    cfg = config.instance()
+    key = (host or cfg.db_address, int(port or cfg.db_port))
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            # first call in this process (or we have been forked)
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(key)
+        if client is None:
+            client = _create_es_client(key[0], key[1], cfg)
+            _clients[key] = client
+            _client_stats['clients_created'] += 1
+        else:
+            _client_stats['clients_reused'] += 1
+        return client
+
+
+def _create_es_client(host, port, cfg):
+    client = elasticsearch.Elasticsearch(
+        hosts=[{'host': host, 'port': port}],
+        maxsize=cfg.db_connection_pool_size,
+        timeout=cfg.db_timeout,
+        max_retries=cfg.db_max_retries,
+        retry_on_timeout=True,
+        sniff_on_start=cfg.db_sniff_on_start,
+        sniff_on_connection_fail=cfg.db_sniff_on_connection_fail,
+        sniffer_timeout=cfg.db_sniffer_timeout)
+    if not cfg.db_keep_alive:
+        for connection in client.transport.connection_pool.connections:
+            connection.headers['connection'] = 'close'
+    return client
+
+
+def get_es_client_stats():
+    """Return usage counters of the Elasticsearch clients of this process.
+
+    `connections_opened` is the number of TCP connections opened by the
+    clients' connection pools, `connections_reused` is the number of
+    requests which were served over an already open connection.
+    """
+    with _clients_lock:
+        stats = dict(_client_stats)
+        opened = requests = 0
+        if _clients_pid == os.getpid():
+            for client in _clients.values():
+                for connection in \
+                        client.transport.connection_pool.connections:
+                    pool = getattr(connection, 'pool', None)
+                    if pool is not None:
+                        opened += pool.num_connections
+                        requests += pool.num_requests
+    stats['connections_opened'] = opened
+    stats['connections_reused'] = max(requests - opened, 0)
+    return stats
+
 
 # Singleton class
 class ManagerElasticsearch:
@@ -32,7 +126,9 @@ class ManagerElasticsearch:
 
     @staticmethod
     def build_request_body(filters=None, pagination=None, skip_size=False,
-                           sort=None, range_filters=None, wildcards=None):
+                           sort=None, range_filters=None, wildcards=None,
+                           source_excludes=None, nested_field_suffix=None,
+                           wildcards_ngram_subfield=None):
         """
         This method is used to create an elasticsearch request based on the
         Query DSL.
@@ -55,6 +151,18 @@ class ManagerElasticsearch:
                         ('asc' or 'desc')
         :param range_filters:   An optional dictionary where keys are fields
                         and values are the range limits of that field
+        :param source_excludes: An optional list of fields to leave out of
+                        the `_source` of the returned documents
+        :param nested_field_suffix: An optional suffix appended to nested
+                        (dotted) filter keys, naming a not analyzed subfield
+                        of those fields which term filters can match.
+                        Without it, nested keys are matched using match
+                        queries
+        :param wildcards_ngram_subfield: An optional name of a subfield of
+                        the `wildcards` fields, indexed as n-grams of
+                        EVENTS_TEXT_NGRAM_SIZE characters. Wildcard keywords
+                        which are long enough are then matched as n-gram
+                        phrases rather than as leading wildcard queries
         :return: An elasticsearch Query DSL body.
         """
         def _escape_reserved_es_chars(val):
@@ -85,6 +193,19 @@ class ManagerElasticsearch:
                 }
             return condition
 
+        def _build_ngram_condition(k, v):
+            field_name = '{0}.{1}'.format(k, wildcards_ngram_subfield)
+            keywords = v.strip().split()
+            conditions = [{'query': {'match_phrase': {field_name: keyword}}}
+                          for keyword in keywords
+                          if len(keyword) >= EVENTS_TEXT_NGRAM_SIZE]
+            short_keywords = ' '.join(keyword for keyword in keywords
+                                      if len(keyword) < EVENTS_TEXT_NGRAM_SIZE)
+            if short_keywords:
+                # too short to be matched using n-grams
+                conditions.append(_build_wildcard_condition(k, short_keywords))
+            return conditions
+
         def _build_wildcard_condition(k, v):
             field_name = _escape_reserved_es_chars(k)
             keywords = _omit_reserved_es_chars(v).strip().split()
@@ -110,19 +231,21 @@ class ManagerElasticsearch:
                 body['from'] = pagination['offset']
         elif not skip_size:
             body['size'] = DEFAULT_SEARCH_SIZE
+        if source_excludes:
+            body['_source'] = {'exclude': list(source_excludes)}
         if filters:
             filter_conditions = []
             for key, val_list in filters.iteritems():
                 if '.' in key:
-                    # nested objects require special care...
-                    # TODO: try to replace query_match with filter_term
-                    query_condition = \
-                        _build_query_match_condition(key, val_list)
-                    filter_conditions.append(query_condition)
-                else:
-                    filter_type = \
-                        'terms' if isinstance(val_list, list) else 'term'
-                    filter_conditions.append({filter_type: {key: val_list}})
+                    if not nested_field_suffix:
+                        # nested objects require special care...
+                        filter_conditions.append(
+                            _build_query_match_condition(key, val_list))
+                        continue
+                    key = '{0}{1}'.format(key, nested_field_suffix)
+                filter_type = \
+                    'terms' if isinstance(val_list, list) else 'term'
+                filter_conditions.append({filter_type: {key: val_list}})
             mandatory_conditions.extend(filter_conditions)
 
         if range_filters:
@@ -130,7 +253,10 @@ class ManagerElasticsearch:
                 [{'range': {k: v} for k, v in range_filters.iteritems()}]
             mandatory_conditions.extend(range_conditions)
 
-        if wildcards:
+        if wildcards and wildcards_ngram_subfield:
+            for k, v in wildcards.iteritems():
+                mandatory_conditions.extend(_build_ngram_condition(k, v))
+        elif wildcards:
             wildcard_conditions = \
                 [_build_wildcard_condition(k, v) for k, v
                  in wildcards.iteritems()]
@@ -152,12 +278,47 @@ class ManagerElasticsearch:
     def get_connection():
         """Return a connection to Cloudify manager's Elasticsearch
         """
-        if 'es_connection' not in g:
-            es_host = config.instance().db_address
-            es_port = config.instance().db_port
-            g.es_connection = elasticsearch.Elasticsearch(
-                hosts=[{"host": es_host, "port": es_port}])
-        return g.es_connection
+        return get_es_client()
+
+    @staticmethod
+    def get_events_raw_field_suffix():
+        """
+        Get the suffix of the not analyzed subfields of the events' string
+        fields, or None if any of the events indices lacks them, in which
+        case string fields can only be matched by their analyzed tokens.
+        The answer is kept for the configured events_raw_fields_check_seconds.
+        """
+        checked_at = _events_raw_fields['checked_at']
+        now = time.time()
+        check_seconds = config.instance().events_raw_fields_check_seconds
+        if checked_at is None or now - checked_at >= check_seconds:
+            _events_raw_fields['present'] = \
+                ManagerElasticsearch._have_events_raw_fields()
+            _events_raw_fields['checked_at'] = now
+        return EVENTS_RAW_FIELD_SUFFIX \
+            if _events_raw_fields['present'] else None
+
+    @staticmethod
+    def _have_events_raw_fields():
+        # events indices without events yet don't map the probed field,
+        # and don't tell. without any index to tell, matching tokens is
+        # the safe choice.
+        raw_field = EVENTS_RAW_FIELD_PROBE + EVENTS_RAW_FIELD_SUFFIX
+        es = ManagerElasticsearch.get_connection()
+        mappings = es.indices.get_field_mapping(
+            field=[EVENTS_RAW_FIELD_PROBE, raw_field],
+            index=EVENTS_INDICES_PATTERN,
+            ignore_unavailable=True,
+            allow_no_indices=True)
+        present = False
+        for index_mappings in mappings.itervalues():
+            for fields in index_mappings.get('mappings', {}).itervalues():
+                if EVENTS_RAW_FIELD_PROBE not in fields:
+                    continue
+                if raw_field not in fields:
+                    return False
+                present = True
+        return present
 
     @staticmethod
     def search(index, doc_type=None, body=None, include=None, **kwargs):
@@ -174,9 +335,36 @@ class ManagerElasticsearch:
                          **kwargs)
 
     @staticmethod
-    def search_events(doc_type=None, body=None, include=None):
+    def get_events_indices(start_date, end_date=None):
+        """
+        Get the names of the daily events indices which may hold events of
+        the given time range. The range is widened by a day on each side, as
+        the dates may not be UTC dates.
+        :param start_date: the first date of the range
+        :param end_date: the last date of the range, defaults to today
+        :return: a list of index names, or None if all events indices should
+                 be searched
+        """
+        if start_date is None:
+            return None
+        end_date = end_date or datetime.utcnow().date()
+        start_date -= timedelta(days=1)
+        end_date += timedelta(days=1)
+        days = (end_date - start_date).days + 1
+        if days <= 0 or days > MAX_PRUNED_EVENTS_INDICES:
+            return None
+        return [(start_date + timedelta(days=day)).strftime(
+                EVENTS_INDEX_NAME_FORMAT) for day in range(days)]
+
+    @staticmethod
+    def search_events(doc_type=None, body=None, include=None, indices=None):
+        """
+        Search events in the given indices, or in all the events indices.
+        Missing indices are ignored.
+        """
+        index = ','.join(indices) if indices else EVENTS_INDICES_PATTERN
         try:
-            return ManagerElasticsearch.search(index=EVENTS_INDICES_PATTERN,
+            return ManagerElasticsearch.search(index=index,
                                                doc_type=doc_type,
                                                body=body,
                                                include=include,
@@ -190,10 +378,69 @@ class ManagerElasticsearch:
             else:
                 raise
 
+    @staticmethod
+    def scroll_events(body, include=None, indices=None):
+        """
+        Yields all the events matching the query body, in the body's sort
+        order, using a scroll. Only a single batch of EVENTS_SCROLL_SIZE
+        events is held in memory at a time.
+        """
+        es = ManagerElasticsearch.get_connection()
+        body = dict(body, size=EVENTS_SCROLL_SIZE)
+        body.pop('from', None)
+        result = es.search(
+            index=','.join(indices) if indices else EVENTS_INDICES_PATTERN,
+            body=body,
+            _source=include or True,
+            scroll=EVENTS_SCROLL_KEEP_ALIVE,
+            ignore_unavailable=True,
+            allow_no_indices=True,
+            expand_wildcards='open')
+        scroll_id = result.get('_scroll_id')
+        try:
+            while True:
+                if result['_shards'].get('failed'):
+                    raise RuntimeError(
+                        'Failed scrolling events: {0} out of {1} shards '
+                        'failed'.format(result['_shards']['failed'],
+                                        result['_shards']['total']))
+                events = ManagerElasticsearch.extract_search_result_values(
+                    result)
+                if not events:
+                    return
+                for event in events:
+                    yield event
+                result = es.scroll(scroll_id=scroll_id,
+                                   scroll=EVENTS_SCROLL_KEEP_ALIVE)
+                scroll_id = result.get('_scroll_id')
+        finally:
+            if scroll_id:
+                es.clear_scroll(scroll_id=scroll_id, ignore=404)
+
     @staticmethod
     def extract_search_result_values(search_result):
         return [item['_source'] for item in search_result['hits']['hits']]
 
+    @staticmethod
+    def extract_aggregation_items(aggregations, fields):
+        """
+        Converts the result of nested bucket aggregations, named after the
+        given fields, to a list of {<field>: <key>, 'count': <count>} items,
+        where items of all but the last field also contain a 'by' list of
+        the same form for the following field.
+        """
+        field = fields[0]
+        items = []
+        for bucket in aggregations[field]['buckets']:
+            # date histogram keys are epoch milliseconds
+            item = {field: bucket.get('key_as_string', bucket['key']),
+                    'count': bucket['doc_count']}
+            if len(fields) > 1:
+                item['by'] = ManagerElasticsearch.extract_aggregation_items(
+                    bucket, fields[1:])
+            items.append(item)
+        return items
+
     @staticmethod
     def build_list_result_metadata(query, search_result):
 
@@ -334,3 +334,15 @@ class SnapshotActionError(ManagerException):
             *args,
             **kwargs
         )
+
+
+class StorageMigrationRequiredError(ManagerException):
+    ERROR_CODE = 'storage_migration_required_error'
+
+    def __init__(self, *args, **kwargs):
+        super(StorageMigrationRequiredError, self).__init__(
+            500,
+            StorageMigrationRequiredError.ERROR_CODE,
+            *args,
+            **kwargs
+        )
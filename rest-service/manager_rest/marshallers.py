@@ -0,0 +1,171 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Marshallers of storage data to REST responses.
+
+A marshaller outputs the same values flask-restful's `marshal` would for
+an instance of a response class created from the data, but reads the data
+directly rather than through a response object, and has the output
+function of each field resolved in advance.
+
+Response classes which convert the data of a field when created, do so
+with a `_responsify_<field>_field` static method, which marshallers apply
+to the field's data as well.
+"""
+
+import json
+
+from flask.ext.restful import fields, marshal
+
+from manager_rest import models
+
+# a marshaller is compiled for each set of fields requested by `_include`
+MAX_CACHED_MARSHALLERS = 1024
+
+# number of list items encoded into each chunk of a streamed list response
+LIST_STREAM_CHUNK_SIZE = 500
+
+_marshallers = {}
+
+
+def _compile_field(key, field, converter=None):
+    """
+    :return: a function of the response data, returning the output value of
+             the field
+    """
+    if isinstance(field, dict):
+        return lambda data: marshal(data, field)
+    if isinstance(field, type):
+        field = field()
+    attribute = key if field.attribute is None else field.attribute
+    if converter is not None:
+        return lambda data: field.output(
+            attribute, {attribute: converter(data.get(attribute))})
+    if not isinstance(attribute, basestring) or '.' in attribute:
+        return lambda data: field.output(key, data)
+
+    default = field.default
+    field_type = type(field)
+    if field_type is fields.Raw:
+        def output(data):
+            value = data.get(attribute)
+            return default if value is None else value
+    elif field_type is fields.String:
+        def output(data):
+            value = data.get(attribute)
+            return default if value is None else unicode(value)
+    elif field_type is fields.Boolean:
+        def output(data):
+            value = data.get(attribute)
+            return default if value is None else bool(value)
+    else:
+        def output(data):
+            return field.output(key, data)
+    return output
+
+
+def _get_converter(response_class, key):
+    converter = getattr(response_class,
+                        '_responsify_{0}_field'.format(key), None)
+    # classes decorated with swagger.nested are proxies, which return the
+    # class attributes as they are
+    if isinstance(converter, staticmethod):
+        converter = converter.__func__
+    return converter
+
+
+class Marshaller(object):
+
+    def __init__(self, response_class, field_names=None):
+        """
+        :param response_class: a response class, which has a
+                               "resource_fields" class variable
+        :param field_names: the fields to output, defaults to all fields
+        """
+        resource_fields = response_class.resource_fields
+        if field_names is None:
+            field_names = resource_fields.keys()
+        self._outputs = [
+            (key, _compile_field(key, resource_fields[key],
+                                 _get_converter(response_class, key)))
+            for key in field_names]
+        # the model fields which are read, None if they all may be
+        self._model_fields = set()
+        for key in field_names:
+            field = resource_fields[key]
+            attribute = getattr(field, 'attribute', None) or key
+            if isinstance(field, dict) or \
+                    not isinstance(attribute, basestring):
+                self._model_fields = None
+                break
+            self._model_fields.add(attribute.split('.')[0])
+
+    def __call__(self, data):
+        """
+        Marshal storage data, given as dicts or models, or lists of them.
+        """
+        if isinstance(data, list):
+            return map(self, data)
+        if isinstance(data, models.SerializableObject):
+            data = data.to_dict(self._model_fields)
+        elif not isinstance(data, dict):
+            raise RuntimeError('Unexpected response data type {0}'.format(
+                type(data)))
+        return {key: output(data) for key, output in self._outputs}
+
+
+def get_marshaller(response_class, field_names=None):
+    """
+    Get the marshaller of the given response class fields, compiling it
+    on first use.
+    """
+    if field_names is None:
+        field_names = response_class.resource_fields.keys()
+    key = (response_class, frozenset(field_names))
+    marshaller = _marshallers.get(key)
+    if marshaller is None:
+        if len(_marshallers) >= MAX_CACHED_MARSHALLERS:
+            _marshallers.clear()
+        marshaller = _marshallers[key] = Marshaller(response_class,
+                                                    field_names)
+    return marshaller
+
+
+def encode_list_response(items, metadata, marshaller):
+    """
+    Yields the JSON encoding of a list response in chunks, marshalling and
+    encoding the items as they are iterated, so only a single chunk of
+    encoded items is held in memory at a time, besides whatever the items
+    iterator holds.
+    """
+    try:
+        yield '{"items": ['
+        chunk = []
+        separator = ''
+        for item in items:
+            chunk.append(json.dumps(marshaller(item)))
+            if len(chunk) == LIST_STREAM_CHUNK_SIZE:
+                yield separator + ', '.join(chunk)
+                separator = ', '
+                chunk = []
+        if chunk:
+            yield separator + ', '.join(chunk)
+        yield '], "metadata": {0}}}'.format(json.dumps(metadata))
+    finally:
+        # releases the storage resources of an iterator which was not
+        # exhausted, e.g. when the client disconnected
+        if hasattr(items, 'close'):
+            items.close()
@@ -24,16 +24,83 @@ from deployment_update.constants import (ENTITY_TYPES,
 from manager_exceptions import UnknownModificationStageError
 
 
+_PRIMITIVE_TYPES = {unicode, bool, int, long, float}
+_SEQUENCE_TYPES = {list, tuple, set}
+
+
+def _to_serializable(value):
+    """
+    Converts a model field value to plain JSON types, the same way a
+    jsonpickle encoding (unpicklable=False) followed by a JSON decoding
+    would, without going through a JSON string. Values are copied, so the
+    result may be modified freely.
+    """
+    value_type = type(value)
+    if value is None or value_type in _PRIMITIVE_TYPES:
+        return value
+    if value_type is str:
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+    elif value_type is dict:
+        result = {}
+        for k, v in value.iteritems():
+            if k is None:
+                k = 'null'
+            elif not isinstance(k, basestring):
+                k = repr(k)
+            result[k] = _to_serializable(v)
+        return result
+    elif value_type in _SEQUENCE_TYPES:
+        return [_to_serializable(v) for v in value]
+    elif isinstance(value, SerializableObject):
+        return value.to_dict()
+    # anything else, including subclasses of the builtin types, is left to
+    # jsonpickle
+    return json.loads(jsonpickle.encode(value, unpicklable=False))
+
+
+class _ModelType(type):
+    """
+    Gives every model class `__slots__` for the fields it adds, so that
+    model instances have no per instance `__dict__`.
+    """
+
+    def __new__(mcs, name, bases, attrs):
+        if '__slots__' not in attrs:
+            base_fields = set()
+            for base in bases:
+                base_fields.update(getattr(base, 'fields', ()))
+            attrs['__slots__'] = tuple(
+                sorted(set(attrs.get('fields', ())) - base_fields))
+        return super(_ModelType, mcs).__new__(mcs, name, bases, attrs)
+
+
 class SerializableObject(object):
+    __metaclass__ = _ModelType
+    __slots__ = ()
 
     def __getstate__(self):
         return {field: getattr(self, field) for field in self.fields}
 
-    def to_dict(self):
-        return json.loads(jsonpickle.encode(self, unpicklable=False))
+    def __setstate__(self, state):
+        for field, value in state.iteritems():
+            setattr(self, field, value)
+
+    def to_dict(self, fields=None):
+        """
+        :param fields: the fields to convert, defaults to all fields
+        """
+        if fields is None:
+            fields = self.fields
+        else:
+            fields = self.fields.intersection(fields)
+        return {field: _to_serializable(getattr(self, field))
+                for field in fields}
 
     def to_json(self):
-        return jsonpickle.encode(self, unpicklable=False)
+        return json.dumps(self.to_dict())
 
 
 class BlueprintState(SerializableObject):
@@ -41,6 +108,8 @@ class BlueprintState(SerializableObject):
         'plan', 'id', 'description', 'created_at', 'updated_at',
         'main_file_name'
     }
+    # fields left out of list responses unless full objects are requested
+    summary_excludes = {'plan'}
 
     def __init__(self, **kwargs):
         self.plan = kwargs['plan']
@@ -72,6 +141,8 @@ class Deployment(SerializableObject):
     fields = {'id', 'created_at', 'updated_at', 'blueprint_id',
               'workflows', 'permalink', 'inputs', 'policy_types',
               'policy_triggers', 'groups', 'outputs'}
+    summary_excludes = {'workflows', 'policy_types', 'policy_triggers',
+                        'groups'}
 
     def __init__(self, **kwargs):
         self.id = kwargs['id']
@@ -0,0 +1,168 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Strategies for making storage mutations visible to searches.
+
+Elasticsearch documents become searchable only after the index has been
+refreshed. A policy decides which parameters are passed along with each
+mutation, what happens after a mutation and what a reader that needs to see
+previous writes (read-your-writes) has to wait for.
+"""
+
+import os
+import time
+import logging
+import threading
+
+REFRESH_IMMEDIATE = 'immediate'
+REFRESH_DEFERRED = 'deferred'
+REFRESH_NONE = 'none'
+
+REFRESH_POLICIES = [REFRESH_IMMEDIATE, REFRESH_DEFERRED, REFRESH_NONE]
+
+DEFAULT_REFRESH_INTERVAL_MS = 200
+
+logger = logging.getLogger(__name__)
+
+
+class ImmediateRefreshPolicy(object):
+    """
+    Refresh the index as part of every mutation.
+    """
+    name = REFRESH_IMMEDIATE
+    mutate_params = {'refresh': True}
+
+    def mutated(self):
+        pass
+
+    def wait_for_refresh(self):
+        pass
+
+
+class NoRefreshPolicy(object):
+    """
+    Never refresh as part of a mutation. Pending mutations are made
+    visible by a single refresh once a reader asks for it, which makes this
+    policy suitable for bulk phases.
+    """
+    name = REFRESH_NONE
+    mutate_params = {}
+
+    def __init__(self, refresh_func):
+        self._refresh = refresh_func
+        self._dirty = False
+
+    def mutated(self):
+        self._dirty = True
+
+    def wait_for_refresh(self):
+        if self._dirty:
+            self._dirty = False
+            self._refresh()
+
+
+class DeferredRefreshPolicy(object):
+    """
+    Coalesce refreshes: mutations only mark the index as dirty and a
+    background thread refreshes it at most once every `interval_ms`
+    milliseconds. Readers which need their writes to be searchable wait for
+    the first refresh that started after their writes completed.
+    """
+    name = REFRESH_DEFERRED
+    mutate_params = {}
+
+    def __init__(self, refresh_func, interval_ms, wait_timeout=None):
+        self._refresh = refresh_func
+        self._interval = interval_ms / 1000.0
+        self._wait_timeout = wait_timeout or max(1.0, 10 * self._interval)
+        self._cond = threading.Condition()
+        self._dirty = False
+        # number of refreshes started and successfully completed
+        self._started = 0
+        self._completed = 0
+        self._last_refresh = 0
+        self._thread = None
+        self._thread_pid = None
+
+    def mutated(self):
+        with self._cond:
+            self._dirty = True
+            self._ensure_refresher_thread()
+            self._cond.notify_all()
+
+    def wait_for_refresh(self):
+        with self._cond:
+            if not self._dirty and self._completed >= self._started:
+                return
+            # a refresh that starts from now on covers all previous writes,
+            # and so does one that has already started while not dirty
+            target = self._started + 1 if self._dirty else self._started
+            deadline = time.time() + self._wait_timeout
+            while self._completed < target:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            else:
+                return
+        # the refresher is late (or failing); refresh synchronously
+        self._refresh()
+
+    def _ensure_refresher_thread(self):
+        # threads do not survive a fork, hence the pid check
+        if self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._refresh_loop,
+                                        name='es-deferred-refresher')
+        self._thread.daemon = True
+        self._thread_pid = os.getpid()
+        self._thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            with self._cond:
+                while not self._dirty:
+                    self._cond.wait()
+            delay = self._last_refresh + self._interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            with self._cond:
+                self._dirty = False
+                self._started += 1
+                refresh_number = self._started
+            self._last_refresh = time.time()
+            try:
+                self._refresh()
+            except Exception:
+                logger.exception('Deferred storage refresh failed')
+                with self._cond:
+                    self._dirty = True
+                continue
+            with self._cond:
+                self._completed = max(self._completed, refresh_number)
+                self._cond.notify_all()
+
+
+def create_refresh_policy(name, refresh_func, interval_ms=None):
+    if name == REFRESH_IMMEDIATE:
+        return ImmediateRefreshPolicy()
+    if name == REFRESH_DEFERRED:
+        return DeferredRefreshPolicy(
+            refresh_func, interval_ms or DEFAULT_REFRESH_INTERVAL_MS)
+    if name == REFRESH_NONE:
+        return NoRefreshPolicy(refresh_func)
+    raise ValueError('Unknown refresh policy {0}; valid policies are: {1}'
+                     .format(name, REFRESH_POLICIES))
@@ -15,6 +15,8 @@
 #
 
 import os
+import json
+import hashlib
 import zipfile
 import urllib
 import shutil
@@ -25,9 +27,11 @@ from os import path
 from flask import (
     request,
     make_response,
+    stream_with_context,
+    Response,
     current_app as app
 )
-from flask.ext.restful import Resource, marshal, reqparse
+from flask.ext.restful import Resource, reqparse
 from flask_restful_swagger import swagger
 from flask.ext.restful.utils import unpack
 from flask_securest.rest_security import SECURED_MODE, SecuredResource
@@ -42,6 +46,7 @@ from manager_rest import manager_exceptions
 from manager_rest import utils
 from manager_rest import responses_v2
 from manager_rest.files import UploadedDataManager
+from manager_rest.marshallers import encode_list_response, get_marshaller
 from manager_rest.storage_manager import get_storage_manager
 from manager_rest.blueprints_manager import (DslParseException,
                                              get_blueprints_manager,
@@ -109,17 +114,87 @@ def skip_nested_marshalling():
     delattr(request, '__skip_marshalling')
 
 
+def _is_summary_parameter_in_request():
+    return verify_and_convert_bool('_summary',
+                                   request.args.get('_summary', False))
+
+
+def _get_versions_etag(representation, items, metadata):
+    """
+    :return: an ETag of the versions of the items, or None if there are no
+             items or any of them isn't versioned
+    """
+    versions = []
+    for item in items:
+        if isinstance(item, dict):
+            item_id, version = item.get('id'), item.get('version')
+        else:
+            item_id, version = item.id, getattr(item, 'version', None)
+        if version is None:
+            return None
+        versions.append([item_id, version])
+    if not versions:
+        return None
+    return hashlib.sha1(json.dumps([representation, versions, metadata],
+                                   sort_keys=True)).hexdigest()
+
+
+def _conditional_response(representation, items, metadata, marshal_data):
+    """
+    Responds to a GET request with a strong ETag, or with 304 Not Modified
+    if the request's If-None-Match header matches the ETag.
+
+    The ETag of versioned data, i.e. node instances, is computed from the
+    storage versions, so a 304 response doesn't require marshalling the
+    data. The ETag of other data is the hash of the encoded response.
+    :param representation: identifies the representation of the data, e.g.
+                           the response class and the included fields
+    :param marshal_data: a function returning the marshalled data
+    """
+    body = None
+    etag = _get_versions_etag(representation, items, metadata)
+    if etag is None:
+        body = json.dumps(marshal_data(), sort_keys=True)
+        etag = hashlib.sha1(body).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        if body is None:
+            body = json.dumps(marshal_data(), sort_keys=True)
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+
 class marshal_with(object):
-    def __init__(self, response_class):
+    def __init__(self, response_class, summary_excludes=None):
         """
         :param response_class: response class to marshal result with.
          class must have a "resource_fields" class variable
+        :param summary_excludes: fields to leave out of the response when
+         the request contains "_summary=true" and no "_include". the
+         excluded fields are then passed to the wrapped function as
+         "_exclude"
+
+        List responses whose items are an iterator rather than a list are
+        streamed, see `encode_list_response`. Other responses to GET
+        requests are conditional, see `_conditional_response`.
         """
         if not hasattr(response_class, 'resource_fields'):
             raise RuntimeError(
                 'Response class {0} does not contain a "resource_fields" '
                 'class variable'.format(type(response_class)))
         self.response_class = response_class
+        self.summary_excludes = summary_excludes
+        # the marshallers of the fields included by default are compiled
+        # in advance, others on the first request which includes them
+        get_marshaller(response_class)
+        if summary_excludes:
+            get_marshaller(response_class, self._summary_fields())
+
+    def _summary_fields(self):
+        return [field for field in self.response_class.resource_fields
+                if field not in self.summary_excludes]
 
     def __call__(self, f):
         @wraps(f)
@@ -127,41 +202,64 @@ class marshal_with(object):
             if hasattr(request, '__skip_marshalling'):
                 return f(*args, **kwargs)
 
-            fields_to_include = _get_fields_to_include(
-                self.response_class.resource_fields)
             if _is_include_parameter_in_request():
+                fields_to_include = _get_fields_to_include(
+                    self.response_class.resource_fields).keys()
                 # only pushing "_include" into kwargs when the request
                 # contained this parameter, to keep things cleaner (identical
                 # behavior for passing "_include" which contains all fields)
-                kwargs['_include'] = fields_to_include.keys()
+                kwargs['_include'] = fields_to_include
+            elif self.summary_excludes and \
+                    _is_summary_parameter_in_request():
+                fields_to_include = self._summary_fields()
+                kwargs['_exclude'] = list(self.summary_excludes)
+            else:
+                fields_to_include = None
+            marshaller = get_marshaller(self.response_class,
+                                        fields_to_include)
 
             response = f(*args, **kwargs)
 
-            if isinstance(response, responses_v2.ListResponse):
-                wrapped_items = self.wrap_with_response_object(response.items)
-                response.items = marshal(wrapped_items, fields_to_include)
-                return marshal(response,
-                               responses_v2.ListResponse.resource_fields)
             if isinstance(response, tuple):
                 data, code, headers = unpack(response)
-                data = self.wrap_with_response_object(data)
-                return marshal(data, fields_to_include), code, headers
+                return marshaller(data), code, headers
+            if isinstance(response, responses_v2.ListResponse):
+                if not isinstance(response.items, list):
+                    chunks = encode_list_response(
+                        response.items, response.metadata, marshaller)
+                    streamed = Response(stream_with_context(chunks),
+                                        mimetype='application/json')
+                    # the encoding only closes the items once it started,
+                    # while the response is closed in any case
+                    if hasattr(response.items, 'close'):
+                        streamed.call_on_close(response.items.close)
+                    return streamed
+                items, metadata = response.items, response.metadata
+
+                def marshal_data():
+                    return {'metadata': metadata, 'items': marshaller(items)}
+            else:
+                items, metadata = [response], None
+
+                def marshal_data():
+                    return marshaller(response)
+
+            if request.method != 'GET':
+                return marshal_data()
+            # node instances are the only data with storage versions (the
+            # version of other responses, e.g. /version, isn't one).
+            # marshal_data closes over items, so they're left as they are
+            if issubclass(self.response_class, responses.NodeInstance):
+                versioned_items = items
             else:
-                response = self.wrap_with_response_object(response)
-                return marshal(response, fields_to_include)
+                versioned_items = []
+            representation = [self.response_class.__name__,
+                              sorted(fields_to_include or [])]
+            return _conditional_response(representation, versioned_items,
+                                         metadata, marshal_data)
 
         return wrapper
 
-    def wrap_with_response_object(self, data):
-        if isinstance(data, dict):
-            return self.response_class(**data)
-        elif isinstance(data, list):
-            return map(self.wrap_with_response_object, data)
-        elif isinstance(data, models.SerializableObject):
-            return self.wrap_with_response_object(data.to_dict())
-        raise RuntimeError('Unexpected response data type {0}'.format(
-            type(data)))
-
 
 def verify_json_content_type():
     if request.content_type != 'application/json':
@@ -1003,8 +1101,9 @@ class NodeInstancesId(SecuredResource):
         notes="Update node instance. Expecting the request body to "
               "be a dictionary containing 'version' which is used for "
               "optimistic locking during the update, and optionally "
-              "'runtime_properties' (dictionary) and/or 'state' (string) "
-              "properties",
+              "'runtime_properties' (dictionary) or "
+              "'runtime_properties_patch' (dictionary) and/or 'state' "
+              "(string) properties",
         parameters=[{'name': 'node_instance_id',
                      'description': 'Node instance identifier',
                      'required': True,
@@ -1026,6 +1125,18 @@ class NodeInstancesId(SecuredResource):
                      'allowMultiple': False,
                      'dataType': 'dict',
                      'paramType': 'body'},
+                    {'name': 'runtime_properties_patch',
+                     'description': 'a dictionary with an optional `set` '
+                                    'dictionary of runtime properties to '
+                                    'set and an optional `delete` list of '
+                                    'runtime property keys to delete. The '
+                                    'other runtime properties are left '
+                                    'unchanged. Cannot be used along with '
+                                    'runtime_properties',
+                     'required': False,
+                     'allowMultiple': False,
+                     'dataType': 'dict',
+                     'paramType': 'body'},
                     {'name': 'state',
                      'description': "the new node's state. If omitted, "
                                     "the state wont be updated",
@@ -1060,6 +1171,7 @@ class NodeInstancesId(SecuredResource):
                                              .__class__.__name__)
             raise manager_exceptions.BadParametersError(message)
 
+        patch_kwargs = self._get_runtime_properties_patch_kwargs()
         node = models.DeploymentNodeInstance(
             id=node_instance_id,
             node_id=None,
@@ -1069,8 +1181,35 @@ class NodeInstancesId(SecuredResource):
             runtime_properties=request.json.get('runtime_properties'),
             state=request.json.get('state'),
             version=request.json['version'])
-        get_storage_manager().update_node_instance(node)
-        return get_storage_manager().get_node_instance(node_instance_id)
+        # runtime properties to set or delete are only passed when a patch
+        # is requested
+        return get_storage_manager().update_node_instance(node,
+                                                          **patch_kwargs)
+
+    @staticmethod
+    def _get_runtime_properties_patch_kwargs():
+        verify_parameter_in_request_body('runtime_properties_patch',
+                                         request.json,
+                                         param_type=dict,
+                                         optional=True)
+        patch = request.json.get('runtime_properties_patch')
+        if patch is None:
+            return {}
+        if 'runtime_properties' in request.json:
+            raise manager_exceptions.BadParametersError(
+                'runtime_properties and runtime_properties_patch cannot be '
+                'used together')
+        unknown_keys = set(patch) - {'set', 'delete'}
+        if unknown_keys:
+            raise manager_exceptions.BadParametersError(
+                'runtime_properties_patch may only contain `set` and '
+                '`delete`, got: {0}'.format(', '.join(unknown_keys)))
+        verify_parameter_in_request_body('set', patch, param_type=dict,
+                                         optional=True)
+        verify_parameter_in_request_body('delete', patch, param_type=list,
+                                         optional=True)
+        return {'set_runtime_properties': patch.get('set'),
+                'delete_runtime_properties': patch.get('delete')}
 
 
 class DeploymentsIdOutputs(SecuredResource):
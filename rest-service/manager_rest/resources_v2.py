@@ -14,14 +14,19 @@
 #  * limitations under the License.
 #
 import os
+import re
+import copy
 import json
+import time
+import zlib
+import base64
 import shutil
 import tarfile
 from collections import OrderedDict
 from uuid import uuid4
 
 from datetime import datetime
-from flask import request
+from flask import request, Response, stream_with_context
 from flask.ext.restful import marshal
 from flask_restful_swagger import swagger
 
@@ -33,7 +38,10 @@ from manager_rest import models
 from manager_rest import resources
 from manager_rest import responses_v2
 from manager_rest.blueprints_manager import get_blueprints_manager
-from manager_rest.manager_elasticsearch import ManagerElasticsearch
+from manager_rest.events_cache import get_events_cache
+from manager_rest.manager_elasticsearch import (ManagerElasticsearch,
+                                                DEFAULT_SEARCH_SIZE,
+                                                EVENTS_TEXT_NGRAM_SUBFIELD)
 from manager_rest.storage_manager import ListResult
 from manager_rest.storage_manager import get_storage_manager
 from manager_rest.resources import (marshal_with,
@@ -97,9 +105,37 @@ def sortable(func):
     return create_sort_params
 
 
+def summarizable(fields):
+    """
+    Decorator for extracting the fields to group a summary by, given as one
+    or more (possibly comma separated) `_target_field` parameters.
+    :param fields: a set of fields which may be summarized by.
+    """
+    def summarizable_dec(func):
+        def create_target_fields(*args, **kw):
+            target_fields = []
+            for target_field_arg in request.args.getlist('_target_field'):
+                target_fields.extend(
+                    [field for field in target_field_arg.split(',') if field])
+            if not target_fields:
+                raise manager_exceptions.BadParametersError(
+                    'At least one _target_field is required. Allowed target '
+                    'fields are: {0}'.format(sorted(fields)))
+            unknowns = [field for field in target_fields
+                        if field not in fields]
+            if unknowns:
+                raise manager_exceptions.BadParametersError(
+                    'Target fields \'{0}\' are not supported. Allowed target '
+                    'fields are: {1}'.format(unknowns, sorted(fields)))
+            return func(target_fields=target_fields, *args, **kw)
+        return create_target_fields
+    return summarizable_dec
+
+
 def marshal_events(func):
     """
-    Decorator for marshalling raw event responses
+    Decorator for marshalling raw list responses, such as events and
+    summaries
     """
     def marshal_response(*args, **kwargs):
         return marshal(func(*args, **kwargs),
@@ -199,7 +235,8 @@ class Snapshots(SecuredResource):
         return get_blueprints_manager().snapshots_list(include=_include,
                                                        filters=filters,
                                                        pagination=pagination,
-                                                       sort=sort)
+                                                       sort=sort,
+                                                       raw=True)
 
 
 class SnapshotsId(SecuredResource):
@@ -366,26 +403,30 @@ class Blueprints(resources.Blueprints):
         responseClass='List[{0}]'.format(responses_v2.BlueprintState.__name__),
         nickname="list",
         notes='Returns a list of submitted blueprints for the optionally '
-              'provided filter parameters {0}'
-        .format(models.BlueprintState.fields),
+              'provided filter parameters {0}. When `_summary` is set to '
+              'true and `_include` isn\'t specified, the {1} fields are left '
+              'out.'
+        .format(models.BlueprintState.fields,
+                models.BlueprintState.summary_excludes),
         parameters=create_filter_params_list_description(
             models.BlueprintState.fields,
             'blueprints'
         )
     )
     @exceptions_handled
-    @marshal_with(responses_v2.BlueprintState)
+    @marshal_with(responses_v2.BlueprintState,
+                  summary_excludes=models.BlueprintState.summary_excludes)
     @create_filters(models.BlueprintState.fields)
     @paginate
     @sortable
     def get(self, _include=None, filters=None, pagination=None, sort=None,
-            **kwargs):
+            _exclude=None, **kwargs):
         """
         List uploaded blueprints
         """
         return get_blueprints_manager().blueprints_list(
             include=_include, filters=filters,
-            pagination=pagination, sort=sort)
+            pagination=pagination, sort=sort, exclude=_exclude, raw=True)
 
 
 class BlueprintsId(resources.BlueprintsId):
@@ -467,12 +508,22 @@ class BlueprintsId(resources.BlueprintsId):
                 blueprint_id=blueprint_id, **kwargs)
 
 
+# pages which the storage reads in several batches are streamed, i.e.
+# encoded as their items are read, so their ETag isn't known when their
+# headers are sent. Other pages are conditional, like other responses.
+STREAMED_LIST_NOTES = ' Large pages, which are read from the storage in ' \
+                      'several batches, are streamed, so unlike other ' \
+                      'responses, they carry no ETag and are never ' \
+                      'conditional.'
+
+
 class Executions(resources.Executions):
     @swagger.operation(
         responseClass='List[{0}]'.format(responses_v2.Execution.__name__),
         nickname="list",
         notes='Returns a list of executions for the optionally provided filter'
-              ' parameters: {0}'.format(models.Execution.fields),
+              ' parameters: {0}.'.format(models.Execution.fields) +
+        STREAMED_LIST_NOTES,
         parameters=create_filter_params_list_description(
             models.Execution.fields, 'executions') + [
             {'name': '_include_system_workflows',
@@ -505,7 +556,7 @@ class Executions(resources.Executions):
         executions = get_blueprints_manager().executions_list(
             filters=filters, pagination=pagination, sort=sort,
             is_include_system_workflows=is_include_system_workflows,
-            include=_include)
+            include=_include, raw=True, stream=True)
         return executions
 
 
@@ -514,25 +565,28 @@ class Deployments(resources.Deployments):
         responseClass='List[{0}]'.format(responses_v2.Deployment.__name__),
         nickname="list",
         notes='Returns a list existing deployments for the optionally provided'
-              ' filter parameters: {0}'.format(models.Deployment.fields),
+              ' filter parameters: {0}. When `_summary` is set to true and '
+              '`_include` isn\'t specified, the {1} fields are left out.'
+        .format(models.Deployment.fields, models.Deployment.summary_excludes),
         parameters=create_filter_params_list_description(
             models.Deployment.fields,
             'deployments'
         )
     )
     @exceptions_handled
-    @marshal_with(responses_v2.Deployment)
+    @marshal_with(responses_v2.Deployment,
+                  summary_excludes=models.Deployment.summary_excludes)
     @create_filters(models.Deployment.fields)
     @paginate
     @sortable
     def get(self, _include=None, filters=None, pagination=None, sort=None,
-            **kwargs):
+            _exclude=None, **kwargs):
         """
         List deployments
         """
         deployments = get_blueprints_manager().deployments_list(
             include=_include, filters=filters, pagination=pagination,
-            sort=sort)
+            sort=sort, exclude=_exclude, raw=True)
         return deployments
 
 
@@ -561,7 +615,7 @@ class DeploymentModifications(resources.DeploymentModifications):
         """
         modifications = get_storage_manager().deployment_modifications_list(
             include=_include, filters=filters, pagination=pagination,
-            sort=sort)
+            sort=sort, raw=True)
         return modifications
 
 
@@ -570,7 +624,8 @@ class Nodes(resources.Nodes):
         responseClass='List[{0}]'.format(responses_v2.Node.__name__),
         nickname="listNodes",
         notes='Returns a nodes list for the optionally provided filter '
-              'parameters: {0}'.format(models.DeploymentNode.fields),
+              'parameters: {0}.'.format(models.DeploymentNode.fields) +
+        STREAMED_LIST_NOTES,
         parameters=create_filter_params_list_description(
             models.DeploymentNode.fields,
             'nodes'
@@ -589,7 +644,9 @@ class Nodes(resources.Nodes):
         nodes = get_storage_manager().get_nodes(include=_include,
                                                 pagination=pagination,
                                                 filters=filters,
-                                                sort=sort)
+                                                sort=sort,
+                                                raw=True,
+                                                stream=True)
         return nodes
 
 
@@ -598,8 +655,11 @@ class NodeInstances(resources.NodeInstances):
         responseClass='List[{0}]'.format(responses_v2.NodeInstance.__name__),
         nickname="listNodeInstances",
         notes='Returns a node instances list for the optionally provided '
-              'filter parameters: {0}'
-        .format(models.DeploymentNodeInstance.fields),
+              'filter parameters: {0}. Several node instances may be '
+              'requested by id using a comma separated list of ids, e.g. '
+              'id=a,b,c, in which case the ETag is computed from their '
+              'storage versions.'
+        .format(models.DeploymentNodeInstance.fields) + STREAMED_LIST_NOTES,
         parameters=create_filter_params_list_description(
             models.DeploymentNodeInstance.fields,
             'node instances'
@@ -615,9 +675,16 @@ class NodeInstances(resources.NodeInstances):
         """
         List node instances
         """
+        if filters and filters.keys() == ['id'] \
+                and not pagination and not sort:
+            # fetching by ids doesn't require a search
+            node_instance_ids = [node_instance_id for ids in filters['id']
+                                 for node_instance_id in ids.split(',')]
+            return get_storage_manager().get_node_instances_by_ids(
+                node_instance_ids, include=_include, raw=True)
         node_instances = get_storage_manager().get_node_instances(
             include=_include, filters=filters,
-            pagination=pagination, sort=sort)
+            pagination=pagination, sort=sort, raw=True, stream=True)
         return node_instances
 
 
@@ -645,7 +712,8 @@ class Plugins(SecuredResource):
         plugins = get_storage_manager().get_plugins(include=_include,
                                                     filters=filters,
                                                     pagination=pagination,
-                                                    sort=sort)
+                                                    sort=sort,
+                                                    raw=True)
         return plugins
 
     @swagger.operation(
@@ -846,25 +914,29 @@ class PluginsId(SecuredResource):
         return plugin
 
 
+# maximal number of event ids a cursor holds for its timestamp
+EVENTS_CURSOR_MAX_IDS = 1000
+
+
 class Events(resources.Events):
 
+    CONTEXT_FIELDS = [
+        'blueprint_id',
+        'deployment_id',
+        'execution_id',
+        'node_id',
+        'node_instance_id',
+        'workflow_id'
+    ]
+
     @staticmethod
     def _build_query(filters=None, pagination=None, sort=None,
                      range_filters=None):
 
-        ctx_fields = [
-            'blueprint_id',
-            'deployment_id',
-            'execution_id',
-            'node_id',
-            'node_instance_id',
-            'workflow_id'
-        ]
-
         # append 'context.' prefix to context fields in all constructs
         query_constructs = \
             [filters, pagination, sort, range_filters]
-        for ctx_field in ctx_fields:
+        for ctx_field in Events.CONTEXT_FIELDS:
             for construct in query_constructs:
                 if construct and ctx_field in construct:
                     construct['context.{0}'.format(ctx_field)] = \
@@ -874,27 +946,193 @@ class Events(resources.Events):
         wildcards = dict()
         if filters and 'message.text' in filters:
             wildcards['message.text'] = filters.pop('message.text')[0]
+        ngram_subfield = EVENTS_TEXT_NGRAM_SUBFIELD \
+            if config.instance().events_ngram_text_search else None
+        # nested fields are filtered by their raw subfields, where the
+        # events indices have them
+        raw_field_suffix = None
+        if any('.' in key for key in filters or {}):
+            raw_field_suffix = \
+                ManagerElasticsearch.get_events_raw_field_suffix()
 
         return ManagerElasticsearch.\
             build_request_body(filters=filters,
                                pagination=pagination,
                                sort=sort,
                                range_filters=range_filters,
-                               wildcards=wildcards)
+                               wildcards=wildcards,
+                               nested_field_suffix=raw_field_suffix,
+                               wildcards_ngram_subfield=ngram_subfield)
 
     @staticmethod
-    def list_events(query, include=None):
+    def _parse_date(value):
+        # both range values and creation times start with the date
+        try:
+            return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+        except ValueError:
+            return None
+
+    @classmethod
+    def _get_events_indices(cls, filters=None, range_filters=None):
+        """
+        Get the events indices which may hold the requested events, based on
+        timestamp ranges and on the creation time of a filtered execution.
+        """
+        start_dates = []
+        end_dates = []
+        for field in ('@timestamp', 'timestamp'):
+            range_filter = (range_filters or {}).get(field, {})
+            start_dates.append(cls._parse_date(range_filter.get('from')))
+            end_dates.append(cls._parse_date(range_filter.get('to')))
+        execution_ids = (filters or {}).get('execution_id', [])
+        if len(execution_ids) == 1:
+            try:
+                execution = get_storage_manager().get_execution(
+                    execution_ids[0], include=['created_at'])
+                start_dates.append(cls._parse_date(execution.created_at))
+            except manager_exceptions.NotFoundError:
+                pass
+        start_dates = filter(None, start_dates)
+        end_dates = filter(None, end_dates)
+        return ManagerElasticsearch.get_events_indices(
+            max(start_dates) if start_dates else None,
+            min(end_dates) if end_dates else None)
+
+    @staticmethod
+    def list_events(query, include=None, indices=None):
         result = ManagerElasticsearch.search_events(body=query,
-                                                    include=include)
+                                                    include=include,
+                                                    indices=indices)
         events = ManagerElasticsearch.extract_search_result_values(result)
         metadata = ManagerElasticsearch.build_list_result_metadata(query,
                                                                    result)
         return ListResult(events, metadata)
 
+    @staticmethod
+    def _encode_cursor(cursor):
+        if cursor is None:
+            return None
+        return base64.urlsafe_b64encode(json.dumps(cursor, sort_keys=True))
+
+    @staticmethod
+    def _decode_cursor(encoded_cursor):
+        if not encoded_cursor:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(
+                str(encoded_cursor)))
+            cursor = {'timestamp': int(cursor['timestamp']),
+                      'ids': list(cursor['ids'])}
+        except (TypeError, ValueError, KeyError):
+            raise manager_exceptions.BadParametersError(
+                'Invalid events cursor: {0}'.format(encoded_cursor))
+        if len(cursor['ids']) > EVENTS_CURSOR_MAX_IDS:
+            raise manager_exceptions.BadParametersError(
+                'Invalid events cursor: more than {0} ids'.format(
+                    EVENTS_CURSOR_MAX_IDS))
+        return cursor
+
+    @staticmethod
+    def _advance_cursor(cursor, hit):
+        """
+        Get the cursor which follows the given event hit.
+
+        Elasticsearch 1.x has no search_after, so a cursor holds the
+        timestamp (in epoch milliseconds) of the last event along with the
+        ids of all the events with that timestamp which were already
+        returned. Searching after a cursor is searching for events at or
+        after its timestamp, other than those ids.
+
+        A cursor holds at most EVENTS_CURSOR_MAX_IDS ids, so it never turns
+        into a huge ids filter. An event which would exceed that moves the
+        cursor on to the following millisecond, skipping any remaining
+        events with its timestamp.
+        """
+        timestamp = hit['sort'][0]
+        if cursor and cursor['timestamp'] == timestamp:
+            if len(cursor['ids']) >= EVENTS_CURSOR_MAX_IDS:
+                return {'timestamp': timestamp + 1, 'ids': []}
+            return {'timestamp': timestamp,
+                    'ids': cursor['ids'] + [hit['_id']]}
+        return {'timestamp': timestamp, 'ids': [hit['_id']]}
+
+    @staticmethod
+    def _search_after(query, cursor=None, indices=None, include=None):
+        """
+        Search the events following a cursor, in timestamp order.
+        :param query: a query built by `_build_query`, which is not modified
+        :return: the search result
+        """
+        query = copy.deepcopy(query)
+        query['sort'] = [{'@timestamp': {'order': 'asc',
+                                         'ignore_unmapped': True}}]
+        if cursor:
+            conditions = query.setdefault('query', {}) \
+                .setdefault('filtered', {}) \
+                .setdefault('filter', {}) \
+                .setdefault('bool', {}) \
+                .setdefault('must', [])
+            conditions.append(
+                {'range': {'@timestamp': {'gte': cursor['timestamp']}}})
+            conditions.append({'not': {'ids': {'values': cursor['ids']}}})
+            # the daily indices before the cursor can't hold new events
+            indices = ManagerElasticsearch.get_events_indices(
+                datetime.utcfromtimestamp(cursor['timestamp'] / 1000).date()
+            ) or indices
+        return ManagerElasticsearch.search_events(body=query,
+                                                  include=include,
+                                                  indices=indices)
+
+    @staticmethod
+    def _list_cached(list_events, query, **kwargs):
+        """
+        List events using the given listing function, through the events
+        cache when it is enabled.
+        """
+        cache = get_events_cache()
+        if cache is None:
+            return list_events(query, **kwargs)
+        return cache.list_events(query, list_events,
+                                 get_storage_manager().get_execution,
+                                 **kwargs)
+
+    @staticmethod
+    def _is_cursor_sort(sort):
+        return not sort or sort.items() == [('@timestamp', 'asc')]
+
+    @classmethod
+    def list_events_after(cls, query, cursor=None, include=None,
+                          indices=None):
+        """
+        List a page of events following a cursor, in timestamp order. The
+        cursor of the next page is returned as `next_cursor` in the
+        pagination metadata, and is None once the last page is returned.
+        """
+        result = cls._search_after(query, cursor, indices, include)
+        hits = result['hits']['hits']
+        next_cursor = None
+        if hits and len(hits) >= query['size']:
+            next_cursor = cursor
+            for hit in hits:
+                next_cursor = cls._advance_cursor(next_cursor, hit)
+        metadata = ManagerElasticsearch.build_list_result_metadata(query,
+                                                                   result)
+        metadata['pagination']['next_cursor'] = cls._encode_cursor(
+            next_cursor)
+        return ListResult([hit['_source'] for hit in hits], metadata)
+
     @swagger.operation(
         responseclass='List[Event]',
         nickname="list events",
-        notes='Returns a list of events for optionally provided filters'
+        notes='Returns a list of events for optionally provided filters. '
+              'When the `_cursor` parameter is passed, events are returned '
+              'in timestamp order, along with a `next_cursor` in the '
+              'pagination metadata. Pass an empty `_cursor` to get the '
+              'first page, and the `next_cursor` to get the next one, which '
+              'is faster than paging with `_offset`. With a cursor, `total` '
+              'counts the events from the cursor on, and `_offset` and '
+              'sorting by fields other than an ascending `@timestamp` are '
+              'not allowed.'
     )
     @exceptions_handled
     @marshal_events
@@ -908,18 +1146,353 @@ class Events(resources.Events):
         """
         List events
         """
+        indices = self._get_events_indices(filters=filters,
+                                           range_filters=range_filters)
+        if '_cursor' not in request.args:
+            query = self._build_query(filters=filters,
+                                      pagination=pagination,
+                                      sort=sort,
+                                      range_filters=range_filters)
+            return self._list_cached(self.list_events, query,
+                                     include=_include, indices=indices)
+        # an empty cursor requests the first page
+        cursor = self._decode_cursor(request.args['_cursor'])
+        if 'offset' in pagination or not self._is_cursor_sort(sort):
+            raise manager_exceptions.BadParametersError(
+                '_cursor can not be used along with _offset, or with sorting '
+                'by fields other than an ascending @timestamp')
         query = self._build_query(filters=filters,
                                   pagination=pagination,
-                                  sort=sort,
                                   range_filters=range_filters)
-        return self.list_events(query, include=_include)
+        return self._list_cached(self.list_events_after, query,
+                                 cursor=cursor, include=_include,
+                                 indices=indices)
 
     @exceptions_handled
     def post(self):
         raise manager_exceptions.MethodNotAllowedError()
 
 
+# tail requests wait for events in a worker of their own, so they can't
+# wait long
+EVENTS_TAIL_DEFAULT_TIMEOUT = 10
+EVENTS_TAIL_MAX_TIMEOUT = 30
+EVENTS_TAIL_DEFAULT_SIZE = 1000
+EVENTS_TAIL_POLL_INTERVAL = 1
+
+
+class EventsTail(SecuredResource):
+
+    @staticmethod
+    def _get_int_arg(name, default, maximum):
+        try:
+            value = int(request.args.get(name, default))
+        except ValueError:
+            raise manager_exceptions.BadParametersError(
+                '{0} must be an integer'.format(name))
+        if not 0 <= value <= maximum:
+            raise manager_exceptions.BadParametersError(
+                '{0} must be between 0 and {1}'.format(name, maximum))
+        return value
+
+    @staticmethod
+    def _poll(query, cursor, indices, deadline):
+        """
+        Yields (event hits, cursor) pairs for every search which returned
+        new events, until the deadline passes.
+        """
+        while True:
+            hits = Events._search_after(query, cursor, indices)['hits'][
+                'hits']
+            if hits:
+                for hit in hits:
+                    cursor = Events._advance_cursor(cursor, hit)
+                yield hits, cursor
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            if not hits:
+                time.sleep(min(EVENTS_TAIL_POLL_INTERVAL, remaining))
+
+    @swagger.operation(
+        responseclass='List[Event]',
+        nickname="tail events",
+        notes='Returns the events which follow the `_cursor` parameter, '
+              'in timestamp order, for optionally provided filters. Without '
+              'a cursor, events are returned from the first one. Waits up '
+              'to `_timeout` seconds (10 by default, and at most 30) for '
+              'events to arrive, and returns '
+              'with the cursor to pass on the next call in '
+              '`metadata.cursor`. With `_stream=true`, events keep being '
+              'streamed until the timeout passes, as newline delimited '
+              'JSON objects of the form {"event": ..., "cursor": ...}.'
+    )
+    @exceptions_handled
+    @create_filters()
+    def get(self, filters=None, **kwargs):
+        """
+        Tail events
+        """
+        cursor = Events._decode_cursor(request.args.get('_cursor'))
+        size = self._get_int_arg('_size', EVENTS_TAIL_DEFAULT_SIZE,
+                                 DEFAULT_SEARCH_SIZE)
+        timeout = self._get_int_arg('_timeout', EVENTS_TAIL_DEFAULT_TIMEOUT,
+                                    EVENTS_TAIL_MAX_TIMEOUT)
+        stream = verify_and_convert_bool(
+            '_stream', request.args.get('_stream', False))
+
+        indices = Events._get_events_indices(filters=filters)
+        query = Events._build_query(filters=filters,
+                                    pagination={'size': size})
+        deadline = time.time() + timeout
+
+        if stream:
+            def generate():
+                next_cursor = cursor
+                for hits, _ in self._poll(query, cursor, indices, deadline):
+                    for hit in hits:
+                        next_cursor = Events._advance_cursor(next_cursor,
+                                                             hit)
+                        yield json.dumps({
+                            'event': hit['_source'],
+                            'cursor': Events._encode_cursor(next_cursor)
+                        }) + '\n'
+            return Response(stream_with_context(generate()),
+                            mimetype='application/x-ndjson')
+
+        events = []
+        for hits, cursor in self._poll(query, cursor, indices, deadline):
+            events = [hit['_source'] for hit in hits]
+            break
+        return marshal(
+            ListResult(events, {'cursor': Events._encode_cursor(cursor)}),
+            responses_v2.ListResponse.resource_fields)
+
+
+def _gzip_stream(chunks):
+    """
+    Compresses the given string chunks into a gzip stream, yielding the
+    compressed data as it becomes available.
+    """
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED,
+                                  16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class EventsExport(SecuredResource):
+
+    @swagger.operation(
+        responseclass='file',
+        nickname="export events",
+        notes='Streams all the events and logs of an execution, or of a '
+              'deployment (optionally within a `_range` of @timestamp), in '
+              'timestamp order, as a gzip compressed file of newline '
+              'delimited JSON events. Either an `execution_id` or a '
+              '`deployment_id` filter is required.'
+    )
+    @exceptions_handled
+    @create_filters()
+    @rangeable
+    def get(self, filters=None, range_filters=None, **kwargs):
+        """
+        Export events
+        """
+        if 'execution_id' in filters:
+            name = filters['execution_id'][0]
+        elif 'deployment_id' in filters:
+            name = filters['deployment_id'][0]
+        else:
+            raise manager_exceptions.BadParametersError(
+                'An execution_id or a deployment_id filter is required '
+                'for exporting events')
+        indices = Events._get_events_indices(filters=filters,
+                                             range_filters=range_filters)
+        query = Events._build_query(filters=filters,
+                                    sort={'@timestamp': 'asc'},
+                                    range_filters=range_filters)
+
+        def generate():
+            for event in ManagerElasticsearch.scroll_events(
+                    query, indices=indices):
+                yield json.dumps(event) + '\n'
+
+        response = Response(stream_with_context(_gzip_stream(generate())),
+                            mimetype='application/gzip')
+        response.headers['Content-Disposition'] = \
+            'attachment; filename=events-{0}.ndjson.gz'.format(name)
+        return response
+
+
 def _get_plugin_archive_path(plugin_id, archive_name):
     return os.path.join(config.instance().file_server_uploaded_plugins_folder,
                         plugin_id,
                         archive_name)
+
+
+NODE_INSTANCES_SUMMARY_FIELDS = {'deployment_id', 'node_id', 'state',
+                                 'host_id'}
+EXECUTIONS_SUMMARY_FIELDS = {'deployment_id', 'blueprint_id', 'workflow_id',
+                             'status'}
+DEPLOYMENTS_SUMMARY_FIELDS = {'blueprint_id'}
+EVENTS_SUMMARY_FIELDS = {'type', 'event_type', 'level', 'blueprint_id',
+                         'deployment_id', 'execution_id', 'workflow_id',
+                         'node_id', 'node_instance_id', 'timestamp'}
+EVENTS_SUMMARY_DEFAULT_INTERVAL = '1m'
+# a number of time units, or a calendar unit
+EVENTS_SUMMARY_INTERVAL_REGEX = re.compile(
+    r'^(\d+(\.\d+)?[smhdw]|minute|hour|day|week|month|quarter|year)$')
+
+
+def _create_summary_params_description(target_fields, list_type):
+    return [{'name': '_target_field',
+             'description': 'Field to group the {type} counts by, one of: '
+                            '{fields}. May be passed several times for '
+                            'nested groups'.format(type=list_type,
+                                                   fields=sorted(
+                                                       target_fields)),
+             'required': True,
+             'allowMultiple': True,
+             'dataType': 'string',
+             'defaultValue': None,
+             'paramType': 'query'}]
+
+
+class SummarizeNodeInstances(SecuredResource):
+    @swagger.operation(
+        responseclass='List[Summary]',
+        nickname="summarizeNodeInstances",
+        notes='Returns node instance counts grouped by the requested target '
+              'fields, for the optionally provided filter parameters: {0}'
+        .format(models.DeploymentNodeInstance.fields),
+        parameters=_create_summary_params_description(
+            NODE_INSTANCES_SUMMARY_FIELDS, 'node instances') +
+        create_filter_params_list_description(
+            models.DeploymentNodeInstance.fields, 'node instances')
+    )
+    @exceptions_handled
+    @marshal_events
+    @create_filters(models.DeploymentNodeInstance.fields)
+    @summarizable(NODE_INSTANCES_SUMMARY_FIELDS)
+    def get(self, target_fields, filters=None, **kwargs):
+        """
+        Summarize node instances
+        """
+        return get_storage_manager().summarize_node_instances(
+            target_fields, filters=filters)
+
+
+class SummarizeExecutions(SecuredResource):
+    @swagger.operation(
+        responseclass='List[Summary]',
+        nickname="summarizeExecutions",
+        notes='Returns execution counts grouped by the requested target '
+              'fields, for the optionally provided filter parameters: {0}'
+        .format(models.Execution.fields),
+        parameters=_create_summary_params_description(
+            EXECUTIONS_SUMMARY_FIELDS, 'executions') +
+        create_filter_params_list_description(
+            models.Execution.fields, 'executions')
+    )
+    @exceptions_handled
+    @marshal_events
+    @create_filters(models.Execution.fields)
+    @summarizable(EXECUTIONS_SUMMARY_FIELDS)
+    def get(self, target_fields, filters=None, **kwargs):
+        """
+        Summarize executions
+        """
+        return get_storage_manager().summarize_executions(
+            target_fields, filters=filters)
+
+
+class SummarizeDeployments(SecuredResource):
+    @swagger.operation(
+        responseclass='List[Summary]',
+        nickname="summarizeDeployments",
+        notes='Returns deployment counts grouped by the requested target '
+              'fields, for the optionally provided filter parameters: {0}'
+        .format(models.Deployment.fields),
+        parameters=_create_summary_params_description(
+            DEPLOYMENTS_SUMMARY_FIELDS, 'deployments') +
+        create_filter_params_list_description(
+            models.Deployment.fields, 'deployments')
+    )
+    @exceptions_handled
+    @marshal_events
+    @create_filters(models.Deployment.fields)
+    @summarizable(DEPLOYMENTS_SUMMARY_FIELDS)
+    def get(self, target_fields, filters=None, **kwargs):
+        """
+        Summarize deployments
+        """
+        return get_storage_manager().summarize_deployments(
+            target_fields, filters=filters)
+
+
+class SummarizeEvents(SecuredResource):
+
+    @staticmethod
+    def _build_aggregation(field, interval):
+        if field == 'timestamp':
+            return {'date_histogram': {'field': '@timestamp',
+                                       'interval': interval}}
+        if field in Events.CONTEXT_FIELDS:
+            field = 'context.{0}'.format(field)
+        # terms of analyzed fields are tokens rather than values
+        raw_field_suffix = ManagerElasticsearch.get_events_raw_field_suffix()
+        if not raw_field_suffix:
+            raise manager_exceptions.IllegalActionError(
+                'Events can only be summarized by {0} when the events '
+                'indices map string fields with raw subfields, as the '
+                'logstash index template does'.format(field))
+        # a size of 0 returns all the buckets
+        return {'terms': {'field': field + raw_field_suffix, 'size': 0}}
+
+    @swagger.operation(
+        responseclass='List[Summary]',
+        nickname="summarizeEvents",
+        notes='Returns event and log counts grouped by the requested target '
+              'fields, for optionally provided filters. Events grouped by '
+              '`timestamp` are counted per `_interval` (e.g. 30s, 5m, 1h or '
+              'day, defaults to {0}) of their @timestamp.'
+        .format(EVENTS_SUMMARY_DEFAULT_INTERVAL),
+        parameters=_create_summary_params_description(
+            EVENTS_SUMMARY_FIELDS, 'events')
+    )
+    @exceptions_handled
+    @marshal_events
+    @create_filters()
+    @rangeable
+    @summarizable(EVENTS_SUMMARY_FIELDS)
+    def get(self, target_fields, filters=None, range_filters=None,
+            **kwargs):
+        """
+        Summarize events
+        """
+        interval = request.args.get('_interval',
+                                    EVENTS_SUMMARY_DEFAULT_INTERVAL)
+        if not EVENTS_SUMMARY_INTERVAL_REGEX.match(interval):
+            raise manager_exceptions.BadParametersError(
+                'Invalid interval: {0}'.format(interval))
+        indices = Events._get_events_indices(filters=filters,
+                                             range_filters=range_filters)
+        query = Events._build_query(filters=filters,
+                                    range_filters=range_filters)
+        query['size'] = 0
+        parent = query
+        for field in target_fields:
+            parent['aggs'] = {field: self._build_aggregation(field, interval)}
+            parent = parent['aggs'][field]
+        result = ManagerElasticsearch.search_events(body=query,
+                                                    indices=indices)
+        # there are no aggregations when there are no events indices
+        aggregations = result.get('aggregations')
+        items = ManagerElasticsearch.extract_aggregation_items(
+            aggregations, target_fields) if aggregations else []
+        return ListResult(items, {'pagination': {'total': len(items),
+                                                 'size': len(items),
+                                                 'offset': 0}})
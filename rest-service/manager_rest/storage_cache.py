@@ -0,0 +1,104 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import json
+import time
+import threading
+from collections import OrderedDict
+
+
+class DocumentCache(object):
+    """
+    A thread safe LRU cache of storage documents, bounded by the total size
+    of the cached documents.
+
+    Documents are kept serialized, so each lookup returns a fresh copy
+    which callers are free to modify. Every entry is stored along with a
+    stamp identifying the stored revision of the document, which the
+    caller validates on lookup, and the time it was last validated.
+    """
+
+    def __init__(self, max_size_bytes):
+        self._max_size = max_size_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+
+    def get(self, key, is_current):
+        """
+        Get a cached document.
+        :param key: cache key
+        :param is_current: a function accepting the stamp of the cached
+                           entry and the number of seconds since the entry
+                           was last found to be up to date, returning
+                           whether the entry is up to date
+        :return: a copy of the cached document or None if there is no up to
+                 date entry for the key
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+        if entry is not None:
+            now = time.time()
+            if is_current(entry[0], now - entry[2][0]):
+                with self._lock:
+                    entry[2][0] = now
+                    self._stats['hits'] += 1
+                return json.loads(entry[1])
+        with self._lock:
+            self._stats['misses'] += 1
+            if entry is not None and self._entries.get(key) is entry:
+                self._remove(key)
+                self._stats['invalidations'] += 1
+        return None
+
+    def put(self, key, stamp, document):
+        data = json.dumps(document)
+        if len(data) > self._max_size:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            # the validation time is the only mutable part of an entry
+            self._entries[key] = (stamp, data, [time.time()])
+            self._size += len(data)
+            while self._size > self._max_size:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['size_bytes'] = self._size
+            stats['max_size_bytes'] = self._max_size
+        return stats
+
+    def _remove(self, key):
+        _, data, _ = self._entries.pop(key)
+        self._size -= len(data)
@@ -0,0 +1,314 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Management of the storage index schema.
+
+The storage index is a versioned index (e.g. cloudify_storage_v1), created
+from an index template of the same name, which is accessed through the
+`cloudify_storage` alias. Changing the mappings below requires bumping
+SCHEMA_VERSION; `migrate_storage_index` then reindexes the data into a new
+index and swaps the alias to it.
+
+Usage:
+
+    python -m manager_rest.storage_schema [--host H] [--port P] migrate
+"""
+
+import sys
+import logging
+import argparse
+
+import elasticsearch.helpers
+
+from manager_rest.manager_elasticsearch import get_es_client
+from manager_rest.models import (BlueprintState,
+                                 Deployment,
+                                 DeploymentModification,
+                                 DeploymentNode,
+                                 DeploymentNodeInstance,
+                                 DeploymentUpdate,
+                                 Execution,
+                                 Plugin,
+                                 ProviderContext,
+                                 Snapshot)
+from manager_rest.es_storage_manager import (STORAGE_INDEX_NAME,
+                                             BLUEPRINT_TYPE,
+                                             DEPLOYMENT_TYPE,
+                                             DEPLOYMENT_MODIFICATION_TYPE,
+                                             DEPLOYMENT_UPDATE_TYPE,
+                                             EXECUTION_TYPE,
+                                             NODE_TYPE,
+                                             NODE_INSTANCE_TYPE,
+                                             PLUGIN_TYPE,
+                                             PROVIDER_CONTEXT_TYPE,
+                                             SNAPSHOT_TYPE)
+
+SCHEMA_VERSION = 1
+
+REINDEX_CHUNK_SIZE = 500
+
+# longer values of unmapped string fields are not indexed, as lucene terms
+# are limited to 32kb
+MAX_KEYWORD_LENGTH = 8191
+
+# filterable and sortable fields are matched as a whole, and read from
+# doc values rather than from the field data cache
+KEYWORD = {'type': 'string', 'index': 'not_analyzed', 'doc_values': True}
+INTEGER = {'type': 'integer', 'doc_values': True}
+BOOLEAN = {'type': 'boolean'}
+# stored in _source only
+NOT_INDEXED = {'type': 'string', 'index': 'no'}
+OPAQUE = {'type': 'object', 'enabled': False}
+
+DOC_TYPE_MODELS = {
+    BLUEPRINT_TYPE: BlueprintState,
+    DEPLOYMENT_TYPE: Deployment,
+    DEPLOYMENT_MODIFICATION_TYPE: DeploymentModification,
+    DEPLOYMENT_UPDATE_TYPE: DeploymentUpdate,
+    EXECUTION_TYPE: Execution,
+    NODE_TYPE: DeploymentNode,
+    NODE_INSTANCE_TYPE: DeploymentNodeInstance,
+    PLUGIN_TYPE: Plugin,
+    PROVIDER_CONTEXT_TYPE: ProviderContext,
+    SNAPSHOT_TYPE: Snapshot
+}
+
+# model fields which are not keywords. node instance versions are the
+# elasticsearch document versions, which are not part of the document.
+FIELD_MAPPINGS = {
+    BLUEPRINT_TYPE: {
+        'plan': OPAQUE,
+        'description': NOT_INDEXED
+    },
+    DEPLOYMENT_TYPE: {
+        'workflows': OPAQUE,
+        'inputs': OPAQUE,
+        'outputs': OPAQUE,
+        'policy_types': OPAQUE,
+        'policy_triggers': OPAQUE,
+        'groups': OPAQUE
+    },
+    DEPLOYMENT_MODIFICATION_TYPE: {
+        'modified_nodes': OPAQUE,
+        'node_instances': OPAQUE,
+        'context': OPAQUE
+    },
+    DEPLOYMENT_UPDATE_TYPE: {
+        'steps': OPAQUE,
+        'blueprint': OPAQUE,
+        'deployment_update_nodes': OPAQUE,
+        'deployment_update_node_instances': OPAQUE,
+        'modified_entity_ids': OPAQUE
+    },
+    EXECUTION_TYPE: {
+        'error': NOT_INDEXED,
+        'parameters': OPAQUE,
+        'is_system_workflow': BOOLEAN
+    },
+    NODE_TYPE: {
+        'number_of_instances': INTEGER,
+        'planned_number_of_instances': INTEGER,
+        'deploy_number_of_instances': INTEGER,
+        'properties': OPAQUE,
+        'operations': OPAQUE,
+        'plugins': OPAQUE,
+        'plugins_to_install': OPAQUE,
+        'relationships': OPAQUE
+    },
+    NODE_INSTANCE_TYPE: {
+        'version': None,
+        'runtime_properties': OPAQUE,
+        'relationships': OPAQUE
+    },
+    PROVIDER_CONTEXT_TYPE: {
+        'context': OPAQUE
+    },
+    SNAPSHOT_TYPE: {
+        'error': NOT_INDEXED
+    }
+}
+
+SETTINGS = {
+    'analysis': {
+        'analyzer': {
+            'default': {
+                'tokenizer': 'whitespace'
+            }
+        }
+    }
+}
+
+logger = logging.getLogger(__name__)
+
+
+def get_index_name(version=None):
+    return '{0}_v{1}'.format(STORAGE_INDEX_NAME, version or SCHEMA_VERSION)
+
+
+def get_mappings():
+    mappings = {}
+    for doc_type, model_class in DOC_TYPE_MODELS.iteritems():
+        field_mappings = FIELD_MAPPINGS.get(doc_type, {})
+        properties = {}
+        for field in model_class.fields:
+            mapping = field_mappings.get(field, KEYWORD)
+            if mapping:
+                properties[field] = mapping
+        mappings[doc_type] = {
+            # fields which are not part of the model are keywords as well
+            'dynamic_templates': [
+                {'strings': {'match_mapping_type': 'string',
+                             'mapping': dict(KEYWORD,
+                                             ignore_above=MAX_KEYWORD_LENGTH)}}
+            ],
+            'properties': properties
+        }
+    return mappings
+
+
+def get_index_template(version=None):
+    return {
+        'template': get_index_name(version),
+        'settings': SETTINGS,
+        'mappings': get_mappings()
+    }
+
+
+def get_schema_version(es):
+    """
+    :return: the schema version of the index behind the storage alias, 0 if
+             the storage index is a plain index which predates the versioned
+             schema, or None if there is no storage index at all.
+    """
+    if not es.indices.exists(index=STORAGE_INDEX_NAME):
+        return None
+    if not es.indices.exists_alias(name=STORAGE_INDEX_NAME):
+        return 0
+    index = es.indices.get_alias(name=STORAGE_INDEX_NAME).keys()[0]
+    return int(index.rsplit('_v', 1)[1])
+
+
+def create_storage_index(es):
+    index = get_index_name()
+    es.indices.put_template(name=index, body=get_index_template())
+    es.indices.create(index=index)
+    es.indices.put_alias(index=index, name=STORAGE_INDEX_NAME)
+
+
+def _reindex_actions(es, source_index, target_index):
+    # documents keep their versions, as node instance versions are used
+    # for optimistic locking
+    for hit in elasticsearch.helpers.scan(es, index=source_index,
+                                          version=True):
+        yield {
+            '_index': target_index,
+            '_type': hit['_type'],
+            '_id': hit['_id'],
+            '_version': hit['_version'],
+            '_version_type': 'external',
+            '_source': hit['_source']
+        }
+
+
+def migrate_storage_index(es, delete_source=False):
+    """
+    Brings the storage index to SCHEMA_VERSION, creating it if there is no
+    storage index yet. The data of an older index is reindexed into a new
+    index, after which the storage alias is moved to the new index.
+
+    The storage must not be written to while migrating (e.g. the manager
+    should be in maintenance mode).
+    :param delete_source: whether to delete the old index once migrated.
+                          an index which predates the versioned schema is
+                          always deleted, as it holds the alias name.
+    :return: the schema version the storage index was migrated from, or
+             None if the storage index was created
+    """
+    version = get_schema_version(es)
+    if version is None:
+        logger.info('Creating storage index {0}'.format(get_index_name()))
+        create_storage_index(es)
+        return None
+    if version == SCHEMA_VERSION:
+        logger.info('Storage index is up to date (schema version {0})'
+                    .format(version))
+        return version
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            'Storage schema version {0} is newer than the supported schema '
+            'version {1}'.format(version, SCHEMA_VERSION))
+
+    source_index = STORAGE_INDEX_NAME if version == 0 \
+        else get_index_name(version)
+    target_index = get_index_name()
+    logger.info('Migrating storage index {0} to {1}'.format(
+        source_index, target_index))
+    if es.indices.exists(index=target_index):
+        # left over by a migration which did not complete
+        es.indices.delete(index=target_index)
+    es.indices.put_template(name=target_index, body=get_index_template())
+    es.indices.create(index=target_index)
+    elasticsearch.helpers.bulk(
+        es, _reindex_actions(es, source_index, target_index),
+        chunk_size=REINDEX_CHUNK_SIZE)
+    es.indices.refresh(index=target_index)
+
+    source_count = es.count(index=source_index)['count']
+    target_count = es.count(index=target_index)['count']
+    if source_count != target_count:
+        raise RuntimeError(
+            'Reindexed {0} out of {1} documents of {2} into {3}'.format(
+                target_count, source_count, source_index, target_index))
+
+    if version == 0:
+        # an alias can't be created while an index of the same name exists
+        es.indices.delete(index=source_index)
+        es.indices.put_alias(index=target_index, name=STORAGE_INDEX_NAME)
+    else:
+        es.indices.update_aliases(body={'actions': [
+            {'remove': {'index': source_index, 'alias': STORAGE_INDEX_NAME}},
+            {'add': {'index': target_index, 'alias': STORAGE_INDEX_NAME}}
+        ]})
+        if delete_source:
+            es.indices.delete(index=source_index)
+            es.indices.delete_template(name=source_index, ignore=404)
+    logger.info('Migrated {0} documents to {1}'.format(target_count,
+                                                       target_index))
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the storage index '
+                                                 'schema')
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('version', help='print the storage schema version')
+    migrate_parser = subparsers.add_parser(
+        'migrate', help='create or migrate the storage index')
+    migrate_parser.add_argument('--delete-source', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    es = get_es_client(args.host, args.port)
+    if args.command == 'version':
+        sys.stdout.write('{0}\n'.format(get_schema_version(es)))
+    else:
+        migrate_storage_index(es, delete_source=args.delete_source)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,6 +14,7 @@
 #  * limitations under the License.
 
 import errno
+import json
 import os
 import uuid
 
@@ -88,6 +89,41 @@ class DeploymentsTestCase(base_test.BaseServerTestCase):
         self.assertEquals(deployment_response['created_at'],
                           single_deployment['updated_at'])
 
+    def test_get_conditionally(self):
+        self.put_deployment(self.DEPLOYMENT_ID)
+        for resource_path in ['/deployments',
+                              '/deployments/{0}'.format(self.DEPLOYMENT_ID)]:
+            url = self._version_url(resource_path)
+            response = self.get(resource_path)
+            etag = response.headers['ETag']
+            self.assertEqual(etag, self.get(resource_path).headers['ETag'])
+
+            response = self.app.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(304, response.status_code)
+            self.assertEqual('', response.data)
+            response = self.app.get(url,
+                                    headers={'If-None-Match': '"other"'})
+            self.assertEqual(200, response.status_code)
+            body = json.loads(response.data)
+            self.assertEqual(self.get(resource_path).json, body)
+
+        # v1 lists are not paginated
+        deployments = body['items'] if isinstance(body, dict) else body
+        self.assertEqual([self.DEPLOYMENT_ID],
+                         [deployment['id'] for deployment in deployments])
+        body = json.loads(self.app.get(
+            self._version_url('/deployments/{0}'.format(self.DEPLOYMENT_ID)),
+            headers={'If-None-Match': '"other"'}).data)
+        self.assertEqual(self.DEPLOYMENT_ID, body['id'])
+
+        etag = self.get('/deployments').headers['ETag']
+        self.put_deployment('other_deployment',
+                            blueprint_id='other_blueprint')
+        response = self.app.get(self._version_url('/deployments'),
+                                headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers['ETag'])
+
     def test_get(self):
         (blueprint_id, deployment_id, blueprint_response,
          deployment_response) = self.put_deployment(self.DEPLOYMENT_ID)
@@ -105,6 +141,26 @@ class DeploymentsTestCase(base_test.BaseServerTestCase):
         self.assertEquals(deployment_response['created_at'],
                           single_deployment['updated_at'])
 
+    @attr(client_min_version=2,
+          client_max_version=base_test.LATEST_API_VERSION)
+    def test_list_summary(self):
+        self.put_deployment(self.DEPLOYMENT_ID)
+        summary = self.client.deployments.list(_summary=True)[0]
+        for field in ('workflows', 'policy_types', 'policy_triggers',
+                      'groups'):
+            self.assertNotIn(field, summary)
+        self.assertIn('inputs', summary)
+        self.assertIn('outputs', summary)
+
+        full = self.client.deployments.list()[0]
+        self.assertEqual(self.client.deployments.get(self.DEPLOYMENT_ID),
+                         full)
+        self.assertDictContainsSubset(summary, full)
+
+        deployment = self.client.deployments.list(
+            _include=['id', 'workflows'], _summary=True)[0]
+        self.assertEqual({'id', 'workflows'}, set(deployment.keys()))
+
     def test_get_executions_of_deployment(self):
         (blueprint_id, deployment_id, blueprint_response,
          deployment_response) = self.put_deployment(self.DEPLOYMENT_ID)
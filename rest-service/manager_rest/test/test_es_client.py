@@ -0,0 +1,206 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import unittest
+from datetime import date, datetime, timedelta
+
+from mock import MagicMock, patch
+from nose.plugins.attrib import attr
+
+from manager_rest import manager_elasticsearch
+from manager_rest.manager_elasticsearch import (ManagerElasticsearch,
+                                                get_es_client,
+                                                get_es_client_stats)
+from manager_rest.test import base_test
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class ElasticsearchClientTest(unittest.TestCase):
+
+    def setUp(self):
+        manager_elasticsearch._clients.clear()
+
+    def test_client_is_shared(self):
+        before = get_es_client_stats()
+        client = get_es_client('localhost', 9200)
+        self.assertIs(client, get_es_client('localhost', 9200))
+        self.assertIs(client, get_es_client('localhost', '9200'))
+        after = get_es_client_stats()
+        self.assertEqual(1, after['clients_created'] -
+                         before['clients_created'])
+        self.assertEqual(2, after['clients_reused'] -
+                         before['clients_reused'])
+
+    def test_client_per_host(self):
+        self.assertIsNot(get_es_client('localhost', 9200),
+                         get_es_client('otherhost', 9200))
+
+    def test_client_recreated_after_fork(self):
+        client = get_es_client('localhost', 9200)
+        with patch('os.getpid', return_value=-1):
+            self.assertIsNot(client, get_es_client('localhost', 9200))
+
+    def test_pool_size_from_config(self):
+        with patch.object(manager_elasticsearch.config.instance(),
+                          '_db_connection_pool_size', 3):
+            client = get_es_client('localhost', 9200)
+        connection = client.transport.connection_pool.connections[0]
+        self.assertEqual(3, connection.pool.pool.maxsize)
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class EventsIndicesTest(unittest.TestCase):
+
+    def test_events_indices(self):
+        self.assertEqual(
+            ['logstash-2015.12.31', 'logstash-2016.01.01',
+             'logstash-2016.01.02'],
+            ManagerElasticsearch.get_events_indices(date(2016, 1, 1),
+                                                    date(2016, 1, 1)))
+
+    def test_events_indices_until_today(self):
+        indices = ManagerElasticsearch.get_events_indices(
+            datetime.utcnow().date() - timedelta(days=2))
+        self.assertEqual(5, len(indices))
+        self.assertEqual(
+            (datetime.utcnow().date() + timedelta(days=1)).strftime(
+                'logstash-%Y.%m.%d'),
+            indices[-1])
+
+    def test_unbounded_events_indices(self):
+        self.assertIsNone(ManagerElasticsearch.get_events_indices(None))
+        self.assertIsNone(ManagerElasticsearch.get_events_indices(
+            date(2016, 1, 1), date(2016, 6, 1)))
+        self.assertIsNone(ManagerElasticsearch.get_events_indices(
+            date(2016, 1, 5), date(2016, 1, 1)))
+
+    def test_search_events_indices(self):
+        with patch.object(ManagerElasticsearch, 'search') as search:
+            ManagerElasticsearch.search_events(
+                body={}, indices=['logstash-2016.01.01',
+                                  'logstash-2016.01.02'])
+            self.assertEqual('logstash-2016.01.01,logstash-2016.01.02',
+                             search.call_args[1]['index'])
+            ManagerElasticsearch.search_events(body={})
+            self.assertEqual('logstash-*', search.call_args[1]['index'])
+
+
+def _scroll_page(scroll_id, events):
+    return {'_scroll_id': scroll_id,
+            '_shards': {'total': 5, 'successful': 5, 'failed': 0},
+            'hits': {'total': 3, 'hits': [{'_source': event}
+                                          for event in events]}}
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class EventsScrollTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = MagicMock()
+        patcher = patch.object(ManagerElasticsearch, 'get_connection',
+                               return_value=self.connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_scroll_events(self):
+        self.connection.search.return_value = _scroll_page(
+            's0', [{'id': 'e1'}, {'id': 'e2'}])
+        self.connection.scroll.side_effect = [
+            _scroll_page('s1', [{'id': 'e3'}]),
+            _scroll_page('s2', [])
+        ]
+        events = ManagerElasticsearch.scroll_events(
+            {'size': 10, 'from': 20, 'sort': [{'@timestamp': 'asc'}]},
+            indices=['logstash-2016.01.01'])
+        self.assertEqual(['e1', 'e2', 'e3'],
+                         [event['id'] for event in events])
+        search_kwargs = self.connection.search.call_args[1]
+        self.assertEqual('logstash-2016.01.01', search_kwargs['index'])
+        self.assertEqual({'size': manager_elasticsearch.EVENTS_SCROLL_SIZE,
+                          'sort': [{'@timestamp': 'asc'}]},
+                         search_kwargs['body'])
+        self.assertEqual(['s0', 's1'],
+                         [call[1]['scroll_id'] for call in
+                          self.connection.scroll.call_args_list])
+        self.connection.clear_scroll.assert_called_once_with(
+            scroll_id='s2', ignore=404)
+
+    def test_scroll_events_closed_early(self):
+        self.connection.search.return_value = _scroll_page(
+            's0', [{'id': 'e1'}, {'id': 'e2'}])
+        events = ManagerElasticsearch.scroll_events({})
+        self.assertEqual('e1', next(events)['id'])
+        events.close()
+        self.assertFalse(self.connection.scroll.called)
+        self.connection.clear_scroll.assert_called_once_with(
+            scroll_id='s0', ignore=404)
+
+
+def _field_mappings(*indices_fields):
+    mappings = {}
+    for i, fields in enumerate(indices_fields):
+        mappings['logstash-2016.01.0{0}'.format(i)] = {'mappings': {
+            'cloudify_event': dict((field, {'full_name': field})
+                                   for field in fields)}}
+    return mappings
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class EventsRawFieldsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = MagicMock()
+        patcher = patch.object(ManagerElasticsearch, 'get_connection',
+                               return_value=self.connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        manager_elasticsearch._events_raw_fields['checked_at'] = None
+
+    def _set_mappings(self, *indices_fields):
+        self.connection.indices.get_field_mapping.return_value = \
+            _field_mappings(*indices_fields)
+
+    def test_raw_fields(self):
+        self._set_mappings(
+            ['context.execution_id', 'context.execution_id.raw'],
+            ['context.execution_id', 'context.execution_id.raw'])
+        self.assertEqual(
+            '.raw', ManagerElasticsearch.get_events_raw_field_suffix())
+
+    def test_dynamic_mappings(self):
+        self._set_mappings(
+            ['context.execution_id', 'context.execution_id.raw'],
+            ['context.execution_id'])
+        self.assertIsNone(ManagerElasticsearch.get_events_raw_field_suffix())
+
+    def test_no_events(self):
+        self._set_mappings([])
+        self.assertIsNone(ManagerElasticsearch.get_events_raw_field_suffix())
+
+    def test_mappings_are_rechecked(self):
+        self._set_mappings(['context.execution_id'])
+        with patch('time.time', return_value=1000):
+            self.assertIsNone(
+                ManagerElasticsearch.get_events_raw_field_suffix())
+        self._set_mappings(
+            ['context.execution_id', 'context.execution_id.raw'])
+        with patch('time.time', return_value=1010):
+            self.assertIsNone(
+                ManagerElasticsearch.get_events_raw_field_suffix())
+        with patch('time.time', return_value=1100):
+            self.assertEqual(
+                '.raw', ManagerElasticsearch.get_events_raw_field_suffix())
+        self.assertEqual(
+            2, self.connection.indices.get_field_mapping.call_count)
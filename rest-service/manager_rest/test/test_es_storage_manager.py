@@ -0,0 +1,439 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import unittest
+
+import elasticsearch.exceptions
+from mock import MagicMock, PropertyMock, patch
+from nose.plugins.attrib import attr
+
+from manager_rest import manager_exceptions
+from manager_rest.models import DeploymentNodeInstance
+from manager_rest.es_storage_manager import ESStorageManager
+from manager_rest.test import base_test
+
+
+def _scroll_page(scroll_id, docs, total=3):
+    return {
+        '_scroll_id': scroll_id,
+        '_shards': {'total': 5, 'successful': 5, 'failed': 0},
+        'hits': {'total': total, 'hits': [{'_source': doc} for doc in docs]}
+    }
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class ESStorageManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = MagicMock()
+        patcher = patch.object(ESStorageManager, '_connection',
+                               new_callable=PropertyMock,
+                               return_value=self.connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sm = ESStorageManager('localhost', 9200)
+
+    def test_iter_node_instances_scrolls(self):
+        self.connection.search.return_value = _scroll_page('s0', [])
+        self.connection.scroll.side_effect = [
+            _scroll_page('s1', [{'id': 'ni1', 'state': 'started'},
+                                {'id': 'ni2', 'state': 'started'}]),
+            _scroll_page('s2', [{'id': 'ni3', 'state': 'deleted'}]),
+            _scroll_page('s3', [])
+        ]
+        instances = list(self.sm.iter_node_instances(
+            filters={'deployment_id': 'd1'}, include=['id', 'state']))
+
+        self.assertEqual(['ni1', 'ni2', 'ni3'],
+                         [instance.id for instance in instances])
+        self.assertIsNone(instances[0].version)
+        self.assertIsNone(instances[0].runtime_properties)
+        search_kwargs = self.connection.search.call_args[1]
+        self.assertEqual('scan', search_kwargs['search_type'])
+        self.assertEqual(['id', 'state'], search_kwargs['_source'])
+        self.assertEqual(
+            [{'term': {'deployment_id': 'd1'}}],
+            search_kwargs['body']['query']['filtered']['filter']['bool'][
+                'must'])
+        self.assertEqual(['s0', 's1', 's2'],
+                         [call[1]['scroll_id'] for call in
+                          self.connection.scroll.call_args_list])
+        self.connection.clear_scroll.assert_called_once_with(
+            scroll_id='s3', ignore=404)
+
+    def test_iter_clears_scroll_when_closed_early(self):
+        self.connection.search.return_value = _scroll_page('s0', [])
+        self.connection.scroll.return_value = _scroll_page(
+            's1', [{'id': 'e1'}, {'id': 'e2'}])
+        executions = self.sm.iter_executions()
+        self.assertEqual('e1', next(executions).id)
+        executions.close()
+        self.connection.clear_scroll.assert_called_once_with(
+            scroll_id='s1', ignore=404)
+
+    def test_iter_fails_on_shard_failures(self):
+        self.connection.search.return_value = _scroll_page('s0', [])
+        page = _scroll_page('s1', [{'id': 'n1'}])
+        page['_shards']['failed'] = 1
+        self.connection.scroll.return_value = page
+        self.assertRaises(RuntimeError, list, self.sm.iter_nodes())
+
+    @patch('manager_rest.storage_cache.time')
+    def test_cached_blueprint(self, mock_time):
+        mock_time.time.return_value = 100
+        sm = ESStorageManager('localhost', 9200, cache_size_mb=1)
+        source = {'id': 'bp', 'created_at': 'now', 'updated_at': 'now',
+                  'description': None, 'main_file_name': 'bp.yaml',
+                  'plan': {'nodes': []}}
+        stored = {'version': 1}
+
+        def get(index, doc_type, id, _source=None):
+            if _source is False:
+                return {'_version': stored['version']}
+            if _source:
+                return {'_version': stored['version'],
+                        '_source': {'created_at': source['created_at']}}
+            return {'_version': stored['version'], '_source': dict(source)}
+        self.connection.get.side_effect = get
+
+        self.assertEqual(source, sm.get_blueprint('bp').to_dict())
+        self.assertEqual(source, sm.get_blueprint('bp').to_dict())
+        # recently validated entries are validated by their version alone
+        self.assertIs(False,
+                      self.connection.get.call_args_list[-1][1]['_source'])
+        self.assertEqual(1, sm.get_cache_stats()['hits'])
+
+        # the blueprint was deleted and uploaded again by another process,
+        # long enough ago for its version to start over
+        source['created_at'] = 'later'
+        mock_time.time.return_value = 200
+        self.assertEqual('later', sm.get_blueprint('bp').created_at)
+        self.assertEqual(
+            ['created_at'],
+            self.connection.get.call_args_list[-2][1]['_source'])
+        stats = sm.get_cache_stats()
+        self.assertEqual(2, stats['misses'])
+        self.assertEqual(1, stats['invalidations'])
+
+        # updated by another process
+        source['main_file_name'] = 'other.yaml'
+        stored['version'] = 2
+        self.assertEqual('other.yaml', sm.get_blueprint('bp').main_file_name)
+        self.assertEqual(2, sm.get_cache_stats()['invalidations'])
+
+        sm.delete_blueprint('bp')
+        self.assertEqual(0, sm.get_cache_stats()['entries'])
+
+    def test_cache_disabled_by_default(self):
+        self.connection.get.return_value = {
+            '_version': 1,
+            '_source': {'id': 'bp', 'created_at': 'now', 'updated_at': 'now',
+                        'description': None, 'main_file_name': 'bp.yaml',
+                        'plan': {}}}
+        self.sm.get_blueprint('bp')
+        self.sm.get_blueprint('bp')
+        self.assertEqual(2, self.connection.get.call_count)
+        self.assertEqual({}, self.sm.get_cache_stats())
+
+    def test_update_node_instance_single_request(self):
+        source = {'id': 'ni1', 'node_id': 'n1', 'deployment_id': 'd1',
+                  'host_id': 'ni1', 'relationships': [], 'state': 'started',
+                  'runtime_properties': {'ip': '10.0.0.1'}}
+        self.connection.update.return_value = {'_version': 3,
+                                               'get': {'_source': source}}
+        updated = self.sm.update_node_instance(DeploymentNodeInstance(
+            id='ni1', node_id=None, deployment_id=None, host_id=None,
+            relationships=None, state='started',
+            runtime_properties={'ip': '10.0.0.1'}, version=2))
+
+        self.assertEqual(3, updated.version)
+        self.assertEqual('n1', updated.node_id)
+        self.assertFalse(self.connection.get.called)
+        update_kwargs = self.connection.update.call_args[1]
+        self.assertEqual(2, update_kwargs['version'])
+        self.assertEqual('_source', update_kwargs['fields'])
+        self.assertEqual('update_node_instance',
+                         update_kwargs['body']['script_file'])
+        self.assertNotIn('script', update_kwargs['body'])
+        self.assertEqual({'state': 'started',
+                          'runtime_properties': {'ip': '10.0.0.1'},
+                          'relationships': None,
+                          'runtime_properties_set': None,
+                          'runtime_properties_delete': None},
+                         update_kwargs['body']['params'])
+
+    def test_update_node_instance_conflict(self):
+        self.connection.update.side_effect = \
+            elasticsearch.exceptions.ConflictError(
+                409, 'VersionConflictEngineException[[node_instance][ni1]: '
+                     'version conflict, current [5], provided [2]]')
+        with self.assertRaises(manager_exceptions.ConflictError) as cm:
+            self.sm.update_node_instance(DeploymentNodeInstance(
+                id='ni1', node_id=None, deployment_id=None, host_id=None,
+                relationships=None, state='started', runtime_properties=None,
+                version=2))
+        self.assertIn('current_version=5', str(cm.exception))
+
+    def test_update_node_instance_runtime_properties_patch(self):
+        source = {'id': 'ni1', 'node_id': 'n1', 'deployment_id': 'd1',
+                  'host_id': 'ni1', 'relationships': [], 'state': 'started',
+                  'runtime_properties': {'ip': '10.0.0.2'}}
+        self.connection.update.return_value = {'_version': 2,
+                                               'get': {'_source': source}}
+        self.sm.update_node_instance(
+            DeploymentNodeInstance(
+                id='ni1', node_id=None, deployment_id=None, host_id=None,
+                relationships=None, state=None, runtime_properties=None,
+                version=1),
+            set_runtime_properties={'ip': '10.0.0.2'},
+            delete_runtime_properties=['port'])
+        params = self.connection.update.call_args[1]['body']['params']
+        self.assertIsNone(params['runtime_properties'])
+        self.assertEqual({'ip': '10.0.0.2'}, params['runtime_properties_set'])
+        self.assertEqual(['port'], params['runtime_properties_delete'])
+
+    def test_update_node_instance_script_error(self):
+        self.connection.update.side_effect = \
+            elasticsearch.exceptions.RequestError(
+                400, 'ElasticsearchIllegalArgumentException[failed to execute '
+                     'script]; nested: GroovyScriptExecutionException['
+                     'NullPointerException[Cannot invoke method keySet() on '
+                     'null object]]; ')
+        node_instance = DeploymentNodeInstance(
+            id='ni1', node_id=None, deployment_id=None, host_id=None,
+            relationships=None, state=None, runtime_properties=None,
+            version=1)
+        self.assertRaises(elasticsearch.exceptions.RequestError,
+                          self.sm.update_node_instance, node_instance)
+        self.assertFalse(self.sm._update_node_instance_script_missing)
+        self.assertFalse(self.connection.get.called)
+
+    def test_update_node_instance_without_script(self):
+        source = {'id': 'ni1', 'node_id': 'n1', 'deployment_id': 'd1',
+                  'host_id': 'ni1', 'relationships': [], 'state': 'started',
+                  'runtime_properties': {'ip': '10.0.0.1', 'port': 22}}
+        self.connection.update.side_effect = \
+            elasticsearch.exceptions.RequestError(
+                400, 'ElasticsearchIllegalArgumentException[failed to execute '
+                     'script]; nested: ElasticsearchIllegalArgumentException['
+                     'Unable to find on disk script update_node_instance]; ')
+        self.connection.get.return_value = {'_version': 1,
+                                            '_source': dict(source)}
+        self.connection.index.return_value = {'_version': 2}
+        node_instance = DeploymentNodeInstance(
+            id='ni1', node_id=None, deployment_id=None, host_id=None,
+            relationships=None, state=None, runtime_properties=None,
+            version=1)
+        updated = self.sm.update_node_instance(
+            node_instance, set_runtime_properties={'ip': '10.0.0.2'},
+            delete_runtime_properties=['port'])
+
+        self.assertEqual(2, updated.version)
+        self.assertEqual({'ip': '10.0.0.2'}, updated.runtime_properties)
+        index_kwargs = self.connection.index.call_args[1]
+        self.assertEqual(1, index_kwargs['version'])
+        self.assertEqual({'ip': '10.0.0.2'},
+                         index_kwargs['body']['runtime_properties'])
+        self.assertNotIn('version', index_kwargs['body'])
+
+        # the missing script isn't looked for again
+        self.connection.get.return_value = {'_version': 2,
+                                            '_source': dict(source)}
+        self.connection.index.side_effect = \
+            elasticsearch.exceptions.ConflictError(
+                409, 'VersionConflictEngineException[[node_instance][ni1]: '
+                     'version conflict, current [3], provided [2]]')
+        node_instance.version = 2
+        self.assertRaises(manager_exceptions.ConflictError,
+                          self.sm.update_node_instance, node_instance)
+        self.assertEqual(1, self.connection.update.call_count)
+
+    def test_get_node_instances_by_ids(self):
+        self.connection.mget.return_value = {'docs': [
+            {'_id': 'ni1', 'found': True, '_version': 4,
+             '_source': {'id': 'ni1', 'state': 'started'}},
+            {'_id': 'ni2', 'found': False}
+        ]}
+        result = self.sm.get_node_instances_by_ids(['ni1', 'ni2'],
+                                                   include=['id', 'state'])
+        self.assertEqual(['ni1'], [instance.id for instance in result.items])
+        self.assertEqual(4, result.items[0].version)
+        self.assertEqual(1, result.metadata['pagination']['total'])
+        mget_kwargs = self.connection.mget.call_args[1]
+        self.assertEqual({'ids': ['ni1', 'ni2']}, mget_kwargs['body'])
+        self.assertEqual(['id', 'state'], mget_kwargs['_source'])
+
+    def test_get_nodes_by_ids(self):
+        self.connection.mget.return_value = {'docs': [
+            {'_id': 'd1_n1', 'found': True, '_source': {'id': 'n1'}}]}
+        result = self.sm.get_nodes_by_ids('d1', ['n1'])
+        self.assertEqual('n1', result.items[0].id)
+        self.assertEqual({'ids': ['d1_n1']},
+                         self.connection.mget.call_args[1]['body'])
+        self.assertEqual([], self.sm.get_nodes_by_ids('d1', []).items)
+
+    def test_list_excludes_source_fields(self):
+        self.connection.search.return_value = {'hits': {'total': 1, 'hits': [
+            {'_source': {'id': 'bp', 'created_at': 'now',
+                         'updated_at': 'now', 'description': None,
+                         'main_file_name': 'bp.yaml'}}]}}
+        result = self.sm.blueprints_list(exclude=['plan'])
+        self.assertIsNone(result.items[0].plan)
+        search_kwargs = self.connection.search.call_args[1]
+        self.assertNotIn('_source', search_kwargs)
+        self.assertEqual({'exclude': ['plan']},
+                         search_kwargs['body']['_source'])
+
+        self.sm.blueprints_list(include=['id', 'plan'], exclude=['plan'])
+        search_kwargs = self.connection.search.call_args[1]
+        self.assertEqual(['id', 'plan'], search_kwargs['_source'])
+        self.assertNotIn('_source', search_kwargs['body'])
+
+    def test_list_raw_documents(self):
+        source = {'id': 'ni1', 'state': 'started'}
+        self.connection.search.return_value = {'hits': {'total': 1, 'hits': [
+            {'_source': source}]}}
+        result = self.sm.get_node_instances(include=['id', 'state'],
+                                            raw=True)
+        self.assertEqual([{'id': 'ni1', 'state': 'started',
+                           'version': None}], result.items)
+        self.assertIs(source, result.items[0])
+        self.assertEqual(1, result.metadata['pagination']['total'])
+
+        self.connection.mget.return_value = {'docs': [
+            {'_id': 'ni1', 'found': True, '_version': 4,
+             '_source': {'id': 'ni1'}}]}
+        result = self.sm.get_node_instances_by_ids(['ni1'], raw=True)
+        self.assertEqual([{'id': 'ni1', 'version': 4}], result.items)
+
+    @patch('manager_rest.es_storage_manager.SCROLL_SIZE', 2)
+    def test_stream_node_instances(self):
+        self.connection.search.return_value = _scroll_page(
+            's0', [{'id': 'ni1'}, {'id': 'ni2'}], total=5)
+        self.connection.scroll.side_effect = [
+            _scroll_page('s1', [{'id': 'ni3'}, {'id': 'ni4'}], total=5),
+            _scroll_page('s2', [{'id': 'ni5'}], total=5)
+        ]
+        result = self.sm.get_node_instances(
+            include=['id'], pagination={'size': 10}, sort={'id': 'asc'},
+            stream=True)
+
+        self.assertEqual({'total': 5, 'offset': 0, 'size': 10},
+                         result.metadata['pagination'])
+        search_kwargs = self.connection.search.call_args[1]
+        self.assertEqual('1m', search_kwargs['scroll'])
+        self.assertEqual(['id'], search_kwargs['_source'])
+        self.assertEqual(2, search_kwargs['body']['size'])
+        self.assertEqual(
+            [{'id': {'order': 'asc', 'ignore_unmapped': True}}],
+            search_kwargs['body']['sort'])
+        self.assertFalse(self.connection.scroll.called)
+        self.assertNotIsInstance(result.items, list)
+
+        self.assertEqual(['ni1', 'ni2', 'ni3', 'ni4', 'ni5'],
+                         [doc['id'] for doc in result.items])
+        # the short batch is the last one
+        self.assertEqual(2, self.connection.scroll.call_count)
+        self.connection.clear_scroll.assert_called_once_with(
+            scroll_id='s2', ignore=404)
+
+    @patch('manager_rest.es_storage_manager.SCROLL_SIZE', 2)
+    def test_stream_single_batch(self):
+        self.connection.search.return_value = _scroll_page(
+            's0', [{'id': 'ni1'}, {'id': 'ni2'}], total=2)
+        result = self.sm.get_node_instances(pagination={'size': 10},
+                                            stream=True)
+        # the scroll is cleared, and the page isn't streamed
+        self.connection.clear_scroll.assert_called_once_with(
+            scroll_id='s0', ignore=404)
+        self.assertEqual(['ni1', 'ni2'], [doc['id'] for doc in result.items])
+        self.assertIsInstance(result.items, list)
+        self.assertFalse(self.connection.scroll.called)
+
+    @patch('manager_rest.es_storage_manager.SCROLL_SIZE', 2)
+    def test_stream_closed_before_iterating(self):
+        self.connection.search.return_value = _scroll_page(
+            's0', [{'id': 'ni1'}, {'id': 'ni2'}], total=5)
+        result = self.sm.get_node_instances(pagination={'size': 10},
+                                            stream=True)
+        self.assertFalse(self.connection.clear_scroll.called)
+        result.items.close()
+        self.connection.clear_scroll.assert_called_once_with(
+            scroll_id='s0', ignore=404)
+        self.assertEqual([], list(result.items))
+
+    def test_stream_page_with_offset(self):
+        self.connection.search.return_value = {'hits': {'total': 3, 'hits': [
+            {'_source': {'id': 'ni2'}}, {'_source': {'id': 'ni3'}}]}}
+        result = self.sm.get_node_instances(
+            pagination={'offset': 1, 'size': 2}, stream=True)
+        self.assertEqual({'total': 3, 'offset': 1, 'size': 2},
+                         result.metadata['pagination'])
+        search_kwargs = self.connection.search.call_args[1]
+        self.assertNotIn('scroll', search_kwargs)
+        self.assertEqual(1, search_kwargs['body']['from'])
+        self.assertEqual(['ni2', 'ni3'], [doc['id'] for doc in result.items])
+        self.assertIsInstance(result.items, list)
+        self.assertFalse(self.connection.scroll.called)
+
+    def _set_schema_version(self, version):
+        self.connection.indices.exists.return_value = True
+        self.connection.indices.exists_alias.return_value = bool(version)
+        self.connection.indices.get_alias.return_value = {
+            'cloudify_storage_v{0}'.format(version): {}}
+
+    def test_summarize_node_instances(self):
+        self._set_schema_version(1)
+        self.connection.search.return_value = {
+            'hits': {'total': 3, 'hits': []},
+            'aggregations': {'deployment_id': {'buckets': [
+                {'key': 'd1', 'doc_count': 2, 'state': {'buckets': [
+                    {'key': 'started', 'doc_count': 2}]}},
+                {'key': 'd2', 'doc_count': 1, 'state': {'buckets': [
+                    {'key': 'deleted', 'doc_count': 1}]}}]}}}
+        result = self.sm.summarize_node_instances(
+            ['deployment_id', 'state'], filters={'node_id': ['n1']})
+        self.assertEqual(
+            [{'deployment_id': 'd1', 'count': 2,
+              'by': [{'state': 'started', 'count': 2}]},
+             {'deployment_id': 'd2', 'count': 1,
+              'by': [{'state': 'deleted', 'count': 1}]}],
+            result.items)
+        self.assertEqual(2, result.metadata['pagination']['total'])
+        body = self.connection.search.call_args[1]['body']
+        self.assertEqual(0, body['size'])
+        self.assertEqual(
+            {'deployment_id': {
+                'terms': {'field': 'deployment_id', 'size': 0},
+                'aggs': {'state': {'terms': {'field': 'state', 'size': 0}}}}},
+            body['aggs'])
+        self.assertEqual(
+            [{'terms': {'node_id': ['n1']}}],
+            body['query']['filtered']['filter']['bool']['must'])
+
+    def test_summarize_requires_migrated_storage(self):
+        # a plain storage index, which predates the versioned schema
+        self._set_schema_version(0)
+        self.assertRaises(manager_exceptions.StorageMigrationRequiredError,
+                          self.sm.summarize_deployments, ['blueprint_id'])
+        self.assertFalse(self.connection.search.called)
+
+        self._set_schema_version(1)
+        self.connection.search.return_value = {
+            'aggregations': {'blueprint_id': {'buckets': []}}}
+        self.sm.summarize_deployments(['blueprint_id'])
+        self.sm.summarize_deployments(['blueprint_id'])
+        # the schema version is only looked up until it's current
+        self.assertEqual(1, self.connection.indices.get_alias.call_count)
@@ -0,0 +1,116 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import unittest
+
+from mock import MagicMock, patch
+from nose.plugins.attrib import attr
+
+from manager_rest import events_cache
+from manager_rest import manager_exceptions
+from manager_rest.events_cache import EventsCache, get_execution_ids
+from manager_rest.models import Execution
+from manager_rest.storage_manager import ListResult
+from manager_rest.test import base_test
+
+
+def _query(*conditions):
+    return {'size': 100,
+            'query': {'filtered': {'filter': {'bool': {
+                'must': list(conditions)}}}}}
+
+
+def _execution_filter(*execution_ids):
+    return {'terms': {'context.execution_id.raw': list(execution_ids)}}
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class EventsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.statuses = {'ex1': Execution.TERMINATED,
+                         'ex2': Execution.FAILED,
+                         'ex3': Execution.STARTED}
+        self.list_events = MagicMock(side_effect=lambda query, **kwargs:
+                                     ListResult([{'id': 'e1'}],
+                                                {'pagination': {'total': 1}}))
+        self.cache = EventsCache(1024 * 1024, settle_seconds=0)
+
+    def _get_execution(self, execution_id, include=None):
+        if execution_id not in self.statuses:
+            raise manager_exceptions.NotFoundError(execution_id)
+        return MagicMock(status=self.statuses[execution_id])
+
+    def _list(self, query, **kwargs):
+        return self.cache.list_events(query, self.list_events,
+                                      self._get_execution, **kwargs)
+
+    def test_get_execution_ids(self):
+        self.assertEqual(['ex1', 'ex2'], get_execution_ids(_query(
+            {'terms': {'context.deployment_id.raw': ['d1']}},
+            _execution_filter('ex1', 'ex2'))))
+        self.assertIsNone(get_execution_ids(_query(
+            {'terms': {'context.deployment_id.raw': ['d1']}})))
+        self.assertIsNone(get_execution_ids({'size': 100}))
+        # without raw subfields, execution ids are matched inexactly
+        self.assertIsNone(get_execution_ids(_query(
+            {'query': {'match': {'context.execution_id': {
+                'query': 'ex1', 'operator': 'and'}}}})))
+
+    def test_ended_executions_are_cached(self):
+        query = _query(_execution_filter('ex1', 'ex2'))
+        first = self._list(query, include=None)
+        second = self._list(query, include=None)
+        self.assertEqual(first.items, second.items)
+        self.assertEqual(first.metadata, second.metadata)
+        self.assertEqual(1, self.list_events.call_count)
+        # a different page is a different query
+        self._list(query, cursor={'timestamp': 1, 'ids': ['e1']})
+        self.assertEqual(2, self.list_events.call_count)
+        stats = self.cache.stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(2, stats['misses'])
+        self.assertEqual(2, stats['entries'])
+        self.assertEqual(2, stats['ended_executions'])
+
+    def test_active_executions_are_not_cached(self):
+        for query in (_query(_execution_filter('ex1', 'ex3')),
+                      _query(_execution_filter('no-such-execution')),
+                      _query()):
+            self._list(query)
+            self._list(query)
+        self.assertEqual(6, self.list_events.call_count)
+        stats = self.cache.stats()
+        self.assertEqual(0, stats['entries'])
+        self.assertEqual(6, stats['bypasses'])
+
+    def test_executions_settle_before_caching(self):
+        cache = EventsCache(1024 * 1024, settle_seconds=30)
+        query = _query(_execution_filter('ex1'))
+        with patch.object(events_cache.time, 'time', return_value=1000):
+            cache.list_events(query, self.list_events, self._get_execution)
+            cache.list_events(query, self.list_events, self._get_execution)
+        self.assertEqual(2, self.list_events.call_count)
+        with patch.object(events_cache.time, 'time', return_value=1030):
+            cache.list_events(query, self.list_events, self._get_execution)
+            cache.list_events(query, self.list_events, self._get_execution)
+        self.assertEqual(3, self.list_events.call_count)
+
+    def test_ended_executions_are_not_read_again(self):
+        get_execution = MagicMock(wraps=self._get_execution)
+        query = _query(_execution_filter('ex1'))
+        for _ in range(3):
+            self.cache.list_events(query, self.list_events, get_execution)
+        self.assertEqual(1, get_execution.call_count)
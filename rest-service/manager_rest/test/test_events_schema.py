@@ -0,0 +1,58 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import unittest
+
+from mock import MagicMock
+from nose.plugins.attrib import attr
+
+from manager_rest import events_schema
+from manager_rest.manager_elasticsearch import ManagerElasticsearch
+from manager_rest.test import base_test
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class EventsSchemaTest(unittest.TestCase):
+
+    def test_install_template(self):
+        es = MagicMock()
+        events_schema.install_events_template(es)
+        template = es.indices.put_template.call_args[1]
+        self.assertEqual('cloudify_events', template['name'])
+        self.assertEqual('logstash-*', template['body']['template'])
+        text_fields = template['body']['mappings']['_default_'][
+            'properties']['message']['properties']['text']['fields']
+        self.assertEqual('event_text_ngram', text_fields['ngram']['analyzer'])
+        self.assertIn('raw', text_fields)
+
+    def test_ngram_text_query(self):
+        body = ManagerElasticsearch.build_request_body(
+            wildcards={'message.text': 'Started  op ab-cd'},
+            wildcards_ngram_subfield='ngram')
+        conditions = body['query']['filtered']['filter']['bool']['must']
+        self.assertEqual([
+            {'query': {'match_phrase': {'message.text.ngram': 'Started'}}},
+            {'query': {'match_phrase': {'message.text.ngram': 'ab-cd'}}},
+            {'query': {'query_string': {'query': 'message.text:*op*'}}}
+        ], conditions)
+
+    def test_wildcard_text_query(self):
+        body = ManagerElasticsearch.build_request_body(
+            wildcards={'message.text': 'Started op'})
+        conditions = body['query']['filtered']['filter']['bool']['must']
+        self.assertEqual(
+            [{'query': {'query_string': {
+                'query': 'message.text:*Started* AND message.text:*op*'}}}],
+            conditions)
@@ -12,6 +12,11 @@
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
 
+import gzip
+import json
+from StringIO import StringIO
+
+from mock import patch
 from nose.plugins.attrib import attr
 
 from manager_rest.test import base_test
@@ -22,10 +27,198 @@ from manager_rest.manager_elasticsearch import ManagerElasticsearch
 @attr(client_min_version=2, client_max_version=base_test.LATEST_API_VERSION)
 class EventsTest(base_test.BaseServerTestCase):
 
+    def setUp(self):
+        super(EventsTest, self).setUp()
+        # the events indices are assumed to have the logstash template's
+        # raw subfields, unless a test says otherwise
+        patcher = patch.object(ManagerElasticsearch,
+                               'get_events_raw_field_suffix',
+                               return_value='.raw')
+        self.get_raw_field_suffix = patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_obsolete_post_request(self):
         response = self.post('/events', {})
         self.assertEqual(405, response.status_code)
 
+    def test_events_indices(self):
+        self.assertEqual(
+            ['logstash-2016.01.31', 'logstash-2016.02.01',
+             'logstash-2016.02.02', 'logstash-2016.02.03'],
+            Events._get_events_indices(range_filters={
+                '@timestamp': {'from': '2016-02-01T10:00:00',
+                               'to': '2016-02-02T01:00:00'}}))
+        self.assertIsNone(Events._get_events_indices(range_filters={
+            '@timestamp': {'to': '2016-02-02T01:00:00'}}))
+        # the execution is looked up in the app's storage manager
+        with self.app.application.app_context():
+            self.assertIsNone(Events._get_events_indices(
+                filters={'execution_id': ['no-such-execution']}))
+
+    def test_events_indices_of_execution(self):
+        (blueprint_id, deployment_id, _, _) = self.put_deployment()
+        execution = self.client.executions.start(deployment_id, 'install')
+        with self.app.application.app_context():
+            indices = Events._get_events_indices(
+                filters={'execution_id': [execution.id]})
+        created_at = Events._parse_date(execution.created_at)
+        self.assertIn(created_at.strftime('logstash-%Y.%m.%d'), indices)
+
+    @staticmethod
+    def _event_hits(*events):
+        return {'hits': {'total': len(events), 'hits': [
+            {'_id': event_id, 'sort': [timestamp],
+             '_source': {'id': event_id, '@timestamp': timestamp}}
+            for event_id, timestamp in events]}}
+
+    def test_tail_events(self):
+        with patch.object(ManagerElasticsearch, 'search_events') as search:
+            search.return_value = self._event_hits(('e1', 1000),
+                                                   ('e2', 2000),
+                                                   ('e3', 2000))
+            response = self.get('/events/tail', {'_timeout': 0,
+                                                 'deployment_id': 'd1'})
+            self.assertEqual(['e1', 'e2', 'e3'],
+                             [event['id'] for event in response.json['items']])
+            cursor = response.json['metadata']['cursor']
+            self.assertEqual({'timestamp': 2000, 'ids': ['e2', 'e3']},
+                             Events._decode_cursor(cursor))
+            query = search.call_args[1]['body']
+            self.assertEqual('asc', query['sort'][0]['@timestamp']['order'])
+
+            search.return_value = self._event_hits()
+            response = self.get('/events/tail', {'_timeout': 0,
+                                                 '_cursor': cursor,
+                                                 'deployment_id': 'd1'})
+            self.assertEqual([], response.json['items'])
+            self.assertEqual(cursor, response.json['metadata']['cursor'])
+            conditions = search.call_args[1]['body']['query']['filtered'][
+                'filter']['bool']['must']
+            self.assertIn({'range': {'@timestamp': {'gte': 2000}}},
+                          conditions)
+            self.assertIn({'not': {'ids': {'values': ['e2', 'e3']}}},
+                          conditions)
+            self.assertIn({'terms': {'context.deployment_id.raw': ['d1']}},
+                          conditions)
+
+    def test_tail_events_stream(self):
+        with patch.object(ManagerElasticsearch, 'search_events') as search:
+            search.side_effect = [self._event_hits(('e1', 1000),
+                                                   ('e2', 1000)),
+                                  self._event_hits()]
+            response = self.app.get(self._version_url('/events/tail'),
+                                    query_string={'_stream': 'true',
+                                                  '_timeout': 0})
+            lines = [json.loads(line) for line in response.data.splitlines()]
+        self.assertEqual(['e1', 'e2'],
+                         [line['event']['id'] for line in lines])
+        self.assertEqual({'timestamp': 1000, 'ids': ['e1']},
+                         Events._decode_cursor(lines[0]['cursor']))
+        self.assertEqual({'timestamp': 1000, 'ids': ['e1', 'e2']},
+                         Events._decode_cursor(lines[1]['cursor']))
+
+    def test_tail_events_invalid_cursor(self):
+        response = self.get('/events/tail', {'_cursor': 'nonsense'})
+        self.assertEqual(400, response.status_code)
+
+    def test_tail_events_invalid_timeout(self):
+        response = self.get('/events/tail', {'_timeout': 31})
+        self.assertEqual(400, response.status_code)
+
+    @patch('manager_rest.resources_v2.EVENTS_CURSOR_MAX_IDS', 2)
+    def test_cursor_max_ids(self):
+        cursor = None
+        for event_id in ('e1', 'e2', 'e3'):
+            cursor = Events._advance_cursor(
+                cursor, {'_id': event_id, 'sort': [1000]})
+        self.assertEqual({'timestamp': 1001, 'ids': []}, cursor)
+        self.assertEqual(
+            {'timestamp': 1001, 'ids': ['e4']},
+            Events._advance_cursor(cursor, {'_id': 'e4', 'sort': [1001]}))
+
+        response = self.get('/events/tail', {
+            '_cursor': Events._encode_cursor(
+                {'timestamp': 1000, 'ids': ['e1', 'e2', 'e3']})})
+        self.assertEqual(400, response.status_code)
+
+    def test_list_events_cursor(self):
+        with patch.object(ManagerElasticsearch, 'search_events') as search:
+            search.return_value = self._event_hits(('e1', 1000),
+                                                   ('e2', 2000))
+            response = self.get('/events', {'_size': 2,
+                                            '_cursor': '',
+                                            'deployment_id': 'd1'})
+            self.assertEqual(['e1', 'e2'],
+                             [event['id'] for event in response.json['items']])
+            pagination = response.json['metadata']['pagination']
+            self.assertEqual({'timestamp': 2000, 'ids': ['e2']},
+                             Events._decode_cursor(pagination['next_cursor']))
+            query = search.call_args[1]['body']
+            self.assertEqual('asc', query['sort'][0]['@timestamp']['order'])
+            self.assertNotIn('from', query)
+
+            search.return_value = self._event_hits(('e3', 3000))
+            response = self.get('/events', {
+                '_size': 2,
+                '_cursor': pagination['next_cursor'],
+                'deployment_id': 'd1'})
+            self.assertEqual(['e3'],
+                             [event['id'] for event in response.json['items']])
+            # the last page
+            self.assertIsNone(
+                response.json['metadata']['pagination']['next_cursor'])
+            conditions = search.call_args[1]['body']['query']['filtered'][
+                'filter']['bool']['must']
+            self.assertIn({'range': {'@timestamp': {'gte': 2000}}},
+                          conditions)
+            self.assertIn({'not': {'ids': {'values': ['e2']}}}, conditions)
+
+    def test_list_events_offset(self):
+        with patch.object(ManagerElasticsearch, 'search_events') as search:
+            search.return_value = self._event_hits(('e1', 1000))
+            response = self.get('/events', {'_offset': 1,
+                                            '_sort': '-@timestamp'})
+            self.assertNotIn('next_cursor',
+                             response.json['metadata']['pagination'])
+            self.assertEqual(1, search.call_args[1]['body']['from'])
+
+    def test_list_events_without_cursor(self):
+        with patch.object(ManagerElasticsearch, 'search_events') as search:
+            search.return_value = self._event_hits(('e1', 1000))
+            response = self.get('/events', {'_size': 1})
+            self.assertNotIn('next_cursor',
+                             response.json['metadata']['pagination'])
+            # events aren't sorted by timestamp for a cursor
+            self.assertNotIn('sort', search.call_args[1]['body'])
+
+    def test_list_events_cursor_with_offset(self):
+        cursor = Events._encode_cursor({'timestamp': 1000, 'ids': ['e1']})
+        response = self.get('/events', {'_cursor': cursor, '_offset': 10})
+        self.assertEqual(400, response.status_code)
+
+    def test_export_events(self):
+        events = [{'id': 'e{0}'.format(i)} for i in range(3)]
+        with patch.object(ManagerElasticsearch, 'scroll_events',
+                          return_value=iter(events)) as scroll:
+            response = self.app.get(self._version_url('/events/export'),
+                                    query_string={'execution_id': 'ex1'})
+            # the export is streamed, so events are only scrolled once the
+            # response body is read
+            data = response.data
+            query = scroll.call_args[0][0]
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('attachment; filename=events-ex1.ndjson.gz',
+                         response.headers['Content-Disposition'])
+        lines = gzip.GzipFile(fileobj=StringIO(data)).readlines()
+        self.assertEqual(events, [json.loads(line) for line in lines])
+        self.assertEqual('asc', query['sort'][0]['@timestamp']['order'])
+        self.assertIn({'terms': {'context.execution_id.raw': ['ex1']}},
+                      query['query']['filtered']['filter']['bool']['must'])
+
+    def test_export_events_requires_filter(self):
+        response = self.get('/events/export', {'blueprint_id': 'bp'})
+        self.assertEqual(400, response.status_code)
+
     def test_build_query_no_args(self):
         # make sure nothing crashes...
         Events._build_query()
@@ -53,6 +246,27 @@ class EventsTest(base_test.BaseServerTestCase):
 
         self.assertDictEqual(expected_query, query)
 
+    def test_build_query_without_raw_fields(self):
+        self.get_raw_field_suffix.return_value = None
+        query = Events._build_query(filters={
+            'deployment_id': ['d1'],
+            'execution_id': ['ex1', 'ex2'],
+            'type': ['cloudify_event']})
+        conditions = query['query']['filtered']['filter']['bool']['must']
+        self.assertIn({'query': {'match': {'context.deployment_id': {
+            'query': 'd1', 'operator': 'and'}}}}, conditions)
+        self.assertIn({'or': {'filters': [
+            {'query': {'match': {'context.execution_id': {
+                'query': 'ex1', 'operator': 'and'}}}},
+            {'query': {'match': {'context.execution_id': {
+                'query': 'ex2', 'operator': 'and'}}}}]}}, conditions)
+        self.assertIn({'terms': {'type': ['cloudify_event']}}, conditions)
+
+    def test_build_query_without_nested_filters(self):
+        Events._build_query(filters={'type': ['cloudify_event']})
+        # the mappings are only checked for nested fields
+        self.assertFalse(self.get_raw_field_suffix.called)
+
     def _get_build_query_args(self):
 
         filters = {
@@ -91,23 +305,13 @@ class EventsTest(base_test.BaseServerTestCase):
     def _get_expected_query(self):
         conditions = [
             {
-                'query': {
-                    'match': {
-                        'context.blueprint_id': {
-                            'query': 'some_blueprint',
-                            'operator': 'and'
-                        }
-                    }
+                'terms': {
+                    'context.blueprint_id.raw': ['some_blueprint']
                 }
             },
             {
-                'query': {
-                    'match': {
-                        'context.deployment_id': {
-                            'query': 'some_deployment',
-                            'operator': 'and'
-                        }
-                    }
+                'terms': {
+                    'context.deployment_id.raw': ['some_deployment']
                 }
             },
             {
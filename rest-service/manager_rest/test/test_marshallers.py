@@ -0,0 +1,146 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import json
+import unittest
+
+from flask.ext.restful import marshal
+from mock import patch
+from nose.plugins.attrib import attr
+
+from manager_rest import models
+from manager_rest import responses
+from manager_rest.marshallers import encode_list_response, get_marshaller
+from manager_rest.test import base_test
+
+NODE_INSTANCE = {
+    'id': 'vm_1', 'node_id': 'vm', 'deployment_id': 'd1', 'host_id': 'vm_1',
+    'state': 'started', 'version': 2, 'relationships': [],
+    'runtime_properties': {'ip': '10.0.0.1'}
+}
+
+EXECUTION = {
+    'id': 'ex1', 'status': 'terminated', 'deployment_id': 'd1',
+    'workflow_id': 'install', 'blueprint_id': 'bp', 'created_at': 'now',
+    'error': None, 'parameters': {}, 'is_system_workflow': 0
+}
+
+DEPLOYMENT = {
+    'id': 'd1', 'created_at': 'now', 'updated_at': 'now',
+    'blueprint_id': 'bp', 'permalink': None, 'inputs': {'image': 'centos'},
+    'policy_types': {}, 'policy_triggers': {}, 'groups': {}, 'outputs': {},
+    'workflows': {'install': {'operation': 'install', 'parameters': {
+        'nodes': {'default': []}}}, 'uninstall': {}}
+}
+
+
+def _marshal_response_object(response_class, data, field_names=None):
+    resource_fields = response_class.resource_fields
+    if field_names is not None:
+        resource_fields = {key: resource_fields[key] for key in field_names}
+    return marshal(response_class(**data), resource_fields)
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class MarshallerTest(unittest.TestCase):
+
+    def assert_marshalled_as_response_object(self, response_class, data,
+                                             field_names=None):
+        expected = _marshal_response_object(response_class, data,
+                                            field_names)
+        marshalled = get_marshaller(response_class, field_names)(data)
+        self.assertEqual(json.dumps(expected, sort_keys=True),
+                         json.dumps(marshalled, sort_keys=True))
+
+    def test_marshal_like_response_objects(self):
+        self.assert_marshalled_as_response_object(responses.NodeInstance,
+                                                  NODE_INSTANCE)
+        self.assert_marshalled_as_response_object(responses.Execution,
+                                                  EXECUTION)
+        self.assert_marshalled_as_response_object(responses.Deployment,
+                                                  DEPLOYMENT)
+        self.assert_marshalled_as_response_object(
+            responses.BlueprintValidationStatus,
+            {'blueprint_id': 'bp', 'status': 'valid'})
+
+    def test_marshal_included_fields(self):
+        self.assert_marshalled_as_response_object(
+            responses.NodeInstance, NODE_INSTANCE, ['id', 'state'])
+        self.assert_marshalled_as_response_object(
+            responses.Deployment, DEPLOYMENT, ['id', 'workflows'])
+        self.assertEqual(
+            {'id': u'vm_1', 'version': 2},
+            get_marshaller(responses.NodeInstance, ['id', 'version'])(
+                NODE_INSTANCE))
+
+    def test_marshal_models_and_lists(self):
+        node_instance = models.DeploymentNodeInstance(**NODE_INSTANCE)
+        marshaller = get_marshaller(responses.NodeInstance)
+        self.assertEqual(marshaller(NODE_INSTANCE),
+                         marshaller(node_instance))
+        self.assertEqual([marshaller(NODE_INSTANCE)] * 2,
+                         marshaller([node_instance, NODE_INSTANCE]))
+        self.assertRaises(RuntimeError, marshaller, 'vm_1')
+
+    def test_marshal_raw_documents(self):
+        # raw storage documents may lack fields, which are output as None
+        node_instance = models.DeploymentNodeInstance(
+            id='vm_1', state='started', node_id=None, deployment_id=None,
+            host_id=None, version=None, relationships=None,
+            runtime_properties=None)
+        marshaller = get_marshaller(responses.NodeInstance)
+        self.assertEqual(marshaller(node_instance),
+                         marshaller({'id': 'vm_1', 'state': 'started'}))
+
+    def test_marshallers_are_cached(self):
+        self.assertIs(
+            get_marshaller(responses.Execution, ['id', 'status']),
+            get_marshaller(responses.Execution, ['status', 'id']))
+        self.assertIs(get_marshaller(responses.Execution),
+                      get_marshaller(responses.Execution,
+                                     responses.Execution.resource_fields))
+
+    @patch('manager_rest.marshallers.LIST_STREAM_CHUNK_SIZE', 2)
+    def test_encode_list_response(self):
+        marshaller = get_marshaller(responses.NodeInstance, ['id', 'state'])
+        metadata = {'pagination': {'total': 3, 'size': 3, 'offset': 0}}
+        sources = [{'id': 'vm_{0}'.format(i), 'state': 'started'}
+                   for i in range(3)]
+        chunks = list(encode_list_response(iter(sources), metadata,
+                                           marshaller))
+        # the opening, two chunks of items and the metadata
+        self.assertEqual(4, len(chunks))
+        self.assertEqual({'items': marshaller(sources), 'metadata': metadata},
+                         json.loads(''.join(chunks)))
+        self.assertEqual(
+            {'items': [], 'metadata': metadata},
+            json.loads(''.join(encode_list_response(iter([]), metadata,
+                                                    marshaller))))
+
+    def test_encode_list_response_closes_items(self):
+        closed = []
+
+        def items():
+            try:
+                yield NODE_INSTANCE
+                yield NODE_INSTANCE
+            finally:
+                closed.append(True)
+        chunks = encode_list_response(items(), {},
+                                      get_marshaller(responses.NodeInstance))
+        next(chunks)
+        next(chunks)
+        chunks.close()
+        self.assertEqual([True], closed)
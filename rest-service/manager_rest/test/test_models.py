@@ -0,0 +1,91 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import copy
+import json
+import unittest
+from collections import OrderedDict
+
+import jsonpickle
+from nose.plugins.attrib import attr
+
+from manager_rest.models import (DeploymentNodeInstance,
+                                 DeploymentUpdate,
+                                 Execution)
+from manager_rest.test import base_test
+
+
+def _jsonpickle_dict(model):
+    return json.loads(jsonpickle.encode(model, unpicklable=False))
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True)
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class SerializableObjectTest(unittest.TestCase):
+
+    def test_to_dict_matches_jsonpickle(self):
+        node_instance = DeploymentNodeInstance(
+            id='vm_1a2b3c', node_id='vm', deployment_id='d1',
+            host_id='vm_1a2b3c', state='started', version=3,
+            relationships=[{'target_id': 'net_4d5e6f',
+                            'target_name': 'net',
+                            'type': 'cloudify.relationships.connected_to'}],
+            runtime_properties={
+                'ip': '10.0.0.1',
+                'ports': (22, 80),
+                'tags': {'role'},
+                'name': u'\u05e9\u05dd',
+                'bytes': 'caf\xc3\xa9',
+                'nested': {'count': 2, 'ratio': 0.5, 'enabled': True,
+                           'empty': None, 3: 'three', None: 'none'},
+                'ordered': OrderedDict([('a', 1)])
+            })
+        self.assertEqual(_dumps(_jsonpickle_dict(node_instance)),
+                         _dumps(node_instance.to_dict()))
+
+    def test_to_dict_nested_models(self):
+        update = DeploymentUpdate('d1', {'nodes': []}, steps=[
+            {'operation': 'add', 'entity_type': 'node',
+             'entity_id': 'nodes:vm', 'id': 'step1'}])
+        self.assertEqual(_dumps(_jsonpickle_dict(update)),
+                         _dumps(update.to_dict()))
+        self.assertEqual('step1', update.to_dict()['steps'][0]['id'])
+
+    def test_to_dict_copies_values(self):
+        execution = Execution(id='e1', status='started', deployment_id='d1',
+                              workflow_id='install', blueprint_id='bp',
+                              created_at='now', error='',
+                              parameters={'nodes': ['vm']},
+                              is_system_workflow=False)
+        execution.to_dict()['parameters']['nodes'].append('db')
+        self.assertEqual({'nodes': ['vm']}, execution.parameters)
+        self.assertEqual(execution.to_dict(),
+                         json.loads(execution.to_json()))
+
+    def test_models_have_slots(self):
+        node_instance = DeploymentNodeInstance(
+            id='vm_1', node_id='vm', deployment_id='d1', host_id='vm_1',
+            state='started', version=1, relationships=[],
+            runtime_properties={'ip': '10.0.0.1'})
+        self.assertFalse(hasattr(node_instance, '__dict__'))
+        self.assertRaises(AttributeError, setattr, node_instance,
+                          'no_such_field', None)
+        node_instance_copy = copy.deepcopy(node_instance)
+        node_instance_copy.runtime_properties['ip'] = '10.0.0.2'
+        self.assertEqual('10.0.0.1', node_instance.runtime_properties['ip'])
+        self.assertEqual(1, node_instance_copy.version)
@@ -13,6 +13,8 @@
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
 
+import json
+
 from nose.plugins.attrib import attr
 
 from manager_rest import storage_manager
@@ -172,6 +174,34 @@ class NodesTest(base_test.BaseServerTestCase):
         self.assertEqual('ddd', response.json['runtime_properties']['ccc'])
         self.assertEqual('b-state', response.json['state'])
 
+    def test_patch_node_runtime_properties_patch(self):
+        self.put_node_instance(
+            instance_id='1234',
+            deployment_id='111',
+            runtime_properties={
+                'key': 'value',
+                'other_key': 'other_value'
+            }
+        )
+        response = self.patch('/node-instances/1234', {
+            'runtime_properties_patch': {'set': {'new_key': 'new_value'},
+                                         'delete': ['other_key']},
+            'version': 2})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({'key': 'value', 'new_key': 'new_value'},
+                         response.json['runtime_properties'])
+
+        response = self.patch('/node-instances/1234', {
+            'runtime_properties': {},
+            'runtime_properties_patch': {'delete': ['key']},
+            'version': 3})
+        self.assertEqual(400, response.status_code)
+
+        response = self.patch('/node-instances/1234', {
+            'runtime_properties_patch': {'update': {'key': 'value'}},
+            'version': 3})
+        self.assertEqual(400, response.status_code)
+
     def test_patch_node_conflict(self):
         sm = storage_manager._get_instance()
         from manager_rest import manager_exceptions
@@ -222,6 +252,23 @@ class NodesTest(base_test.BaseServerTestCase):
         self.assertEqual(8, len(all_instances))
         self.assertEquals(4, len(dep1_node_instances))
 
+    @attr(client_min_version=2,
+          client_max_version=base_test.LATEST_API_VERSION)
+    def test_list_node_instances_by_ids(self):
+        self.put_node_instance(node_id='1', instance_id='11',
+                               deployment_id='111')
+        self.put_node_instance(node_id='1', instance_id='12',
+                               deployment_id='111')
+        self.put_node_instance(node_id='2', instance_id='21',
+                               deployment_id='111')
+
+        response = self.get('/node-instances',
+                            query_params={'id': '11,21,missing'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['11', '21'],
+                         [item['id'] for item in response.json['items']])
+        self.assertEqual(2, response.json['metadata']['pagination']['total'])
+
     def test_list_node_instances(self):
         self.put_node_instance(node_id='1', instance_id='11',
                                deployment_id='111')
@@ -269,6 +316,66 @@ class NodesTest(base_test.BaseServerTestCase):
         assert_dep_and_node(2, '222', '3', dep2_n3_instances)
         assert_dep_and_node(2, '222', '4', dep2_n4_instances)
 
+    def test_get_node_instance_conditionally(self):
+        self.put_node_instance(instance_id='1234', deployment_id='111',
+                               runtime_properties={'key': 'value'})
+        url = self._version_url('/node-instances/1234')
+        etag = self.get('/node-instances/1234').headers['ETag']
+
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual('', response.data)
+        self.assertEqual(etag, response.headers['ETag'])
+
+        self.patch('/node-instances/1234',
+                   {'runtime_properties': {'key': 'new_value'},
+                    'version': 2})
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers['ETag'])
+
+    def test_list_node_instances_conditionally(self):
+        self.put_node_instance(instance_id='1234', deployment_id='111',
+                               runtime_properties={'key': 'value'})
+        url = self._version_url('/node-instances')
+        etag = self.get('/node-instances').headers['ETag']
+
+        # a page which fits in a single storage batch isn't streamed
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+
+        self.patch('/node-instances/1234',
+                   {'runtime_properties': {'key': 'new_value'},
+                    'version': 2})
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers['ETag'])
+
+    def test_node_instance_etag_of_version(self):
+        from manager_rest.models import DeploymentNodeInstance
+        sm = storage_manager._get_instance()
+        sm.put_node_instance(DeploymentNodeInstance(
+            id='1234', node_id=None, deployment_id='111', state='started',
+            runtime_properties={}, version=3, relationships=None,
+            host_id=None))
+        etag = self.get('/node-instances/1234').headers['ETag']
+        self.assertNotEqual(
+            etag, self.get('/node-instances/1234',
+                           query_params={'_include': 'id'}).headers['ETag'])
+
+        # updates bump the version, and so the ETag
+        sm.update_node_instance(DeploymentNodeInstance(
+            id='1234', node_id=None, deployment_id=None, state='deleted',
+            runtime_properties=None, version=3, relationships=None,
+            host_id=None))
+        response = self.app.get(self._version_url('/node-instances/1234'),
+                                headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers['ETag'])
+        node_instance = json.loads(response.data)
+        self.assertEqual('deleted', node_instance['state'])
+        self.assertEqual(4, node_instance['version'])
+
     def test_patch_before_put(self):
         response = self.patch('/node-instances/1234',
                               {'runtime_properties': {'key': 'value'},
@@ -0,0 +1,109 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import threading
+import unittest
+
+from mock import MagicMock, PropertyMock, patch
+from nose.plugins.attrib import attr
+
+from manager_rest import refresh_policies
+from manager_rest.es_storage_manager import ESStorageManager
+from manager_rest.test import base_test
+
+
+class CountingRefresh(object):
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.count += 1
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class RefreshPoliciesTest(unittest.TestCase):
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, refresh_policies.create_refresh_policy,
+                          'sometimes', CountingRefresh())
+
+    def test_immediate_policy(self):
+        policy = refresh_policies.create_refresh_policy(
+            refresh_policies.REFRESH_IMMEDIATE, CountingRefresh())
+        self.assertEqual({'refresh': True}, policy.mutate_params)
+
+    def test_none_policy_refreshes_once(self):
+        refresh = CountingRefresh()
+        policy = refresh_policies.create_refresh_policy(
+            refresh_policies.REFRESH_NONE, refresh)
+        self.assertEqual({}, policy.mutate_params)
+        policy.wait_for_refresh()
+        self.assertEqual(0, refresh.count)
+        for _ in range(10):
+            policy.mutated()
+        policy.wait_for_refresh()
+        policy.wait_for_refresh()
+        self.assertEqual(1, refresh.count)
+
+    def test_deferred_policy_coalesces_refreshes(self):
+        refresh = CountingRefresh()
+        policy = refresh_policies.create_refresh_policy(
+            refresh_policies.REFRESH_DEFERRED, refresh, interval_ms=50)
+        self.assertEqual({}, policy.mutate_params)
+        for _ in range(100):
+            policy.mutated()
+        policy.wait_for_refresh()
+        self.assertGreaterEqual(refresh.count, 1)
+        self.assertLessEqual(refresh.count, 2)
+        # nothing was written since the last refresh
+        count = refresh.count
+        policy.wait_for_refresh()
+        self.assertEqual(count, refresh.count)
+
+    def test_deferred_policy_falls_back_to_sync_refresh(self):
+        calls = []
+
+        def failing_refresh():
+            calls.append(threading.current_thread())
+            if len(calls) == 1:
+                raise RuntimeError('refresh failed')
+
+        policy = refresh_policies.DeferredRefreshPolicy(
+            failing_refresh, interval_ms=10, wait_timeout=0.05)
+        policy.mutated()
+        policy.wait_for_refresh()
+        self.assertGreaterEqual(len(calls), 2)
+
+    def test_storage_manager_policy_override(self):
+        connection = MagicMock()
+        sm = ESStorageManager('localhost', 9200)
+        with patch.object(ESStorageManager, '_connection',
+                          new_callable=PropertyMock,
+                          return_value=connection):
+            sm._put_doc_if_not_exists('blueprint', 'bp', {})
+            self.assertTrue(connection.create.call_args[1]['refresh'])
+
+            with sm.refresh_policy(refresh_policies.REFRESH_NONE):
+                sm._put_doc_if_not_exists('blueprint', 'bp1', {})
+                sm._put_doc_if_not_exists('blueprint', 'bp2', {})
+                self.assertNotIn('refresh', connection.create.call_args[1])
+                self.assertEqual(0, connection.indices.refresh.call_count)
+            self.assertEqual(1, connection.indices.refresh.call_count)
+
+            sm._put_doc_if_not_exists('blueprint', 'bp3', {})
+            self.assertTrue(connection.create.call_args[1]['refresh'])
@@ -0,0 +1,97 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import json
+import unittest
+
+from mock import patch
+from nose.plugins.attrib import attr
+
+from manager_rest.storage_cache import DocumentCache
+from manager_rest.test import base_test
+
+
+def _always_current(stamp, age):
+    return True
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class DocumentCacheTest(unittest.TestCase):
+
+    def test_get_returns_copies(self):
+        cache = DocumentCache(1024)
+        cache.put('key', 1, {'plan': {'nodes': []}})
+        doc = cache.get('key', _always_current)
+        doc['plan']['nodes'].append('node')
+        self.assertEqual({'plan': {'nodes': []}},
+                         cache.get('key', _always_current))
+        self.assertEqual(2, cache.stats()['hits'])
+
+    def test_stale_entry_is_dropped(self):
+        cache = DocumentCache(1024)
+        cache.put('key', 1, {'a': 1})
+        self.assertIsNone(cache.get('key', lambda stamp, age: stamp == 2))
+        self.assertIsNone(cache.get('key', _always_current))
+        stats = cache.stats()
+        self.assertEqual(2, stats['misses'])
+        self.assertEqual(1, stats['invalidations'])
+        self.assertEqual(0, stats['entries'])
+        self.assertEqual(0, stats['size_bytes'])
+
+    def test_least_recently_used_is_evicted(self):
+        doc = {'data': 'x' * 100}
+        doc_size = len(json.dumps(doc))
+        cache = DocumentCache(doc_size * 2)
+        cache.put('a', 1, doc)
+        cache.put('b', 1, doc)
+        cache.get('a', _always_current)
+        cache.put('c', 1, doc)
+        self.assertIsNone(cache.get('b', _always_current))
+        self.assertIsNotNone(cache.get('a', _always_current))
+        self.assertIsNotNone(cache.get('c', _always_current))
+        stats = cache.stats()
+        self.assertEqual(1, stats['evictions'])
+        self.assertEqual(doc_size * 2, stats['size_bytes'])
+
+    def test_oversized_document_is_not_cached(self):
+        cache = DocumentCache(10)
+        cache.put('key', 1, {'data': 'x' * 100})
+        self.assertIsNone(cache.get('key', _always_current))
+        self.assertEqual(0, cache.stats()['entries'])
+
+    def test_invalidate(self):
+        cache = DocumentCache(1024)
+        cache.put('key', 1, {'a': 1})
+        cache.invalidate('key')
+        cache.invalidate('missing')
+        self.assertIsNone(cache.get('key', _always_current))
+        self.assertEqual(1, cache.stats()['invalidations'])
+
+    @patch('manager_rest.storage_cache.time')
+    def test_validation_age(self, mock_time):
+        cache = DocumentCache(1024)
+        ages = []
+
+        def is_current(stamp, age):
+            ages.append(age)
+            return stamp == 1
+        mock_time.time.return_value = 100
+        cache.put('key', 1, {'a': 1})
+        mock_time.time.return_value = 130
+        cache.get('key', is_current)
+        mock_time.time.return_value = 140
+        cache.get('key', is_current)
+        # the age is of the last successful validation
+        self.assertEqual([30, 10], ages)
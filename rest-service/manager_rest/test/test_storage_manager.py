@@ -17,7 +17,7 @@ from datetime import datetime
 
 from nose.plugins.attrib import attr
 
-from manager_rest import storage_manager, models
+from manager_rest import storage_manager, models, manager_exceptions
 from manager_rest.test import base_test
 
 
@@ -161,3 +161,32 @@ class StorageManagerTests(base_test.BaseServerTestCase):
         self.assertEquals(None, blueprint_restored.updated_at)
         self.assertEquals(None, blueprint_restored.plan)
         self.assertEquals(None, blueprint_restored.main_file_name)
+
+    def test_put_node_instances_bulk(self):
+        sm = storage_manager._get_instance()
+
+        def node_instance(instance_id):
+            return models.DeploymentNodeInstance(id=instance_id,
+                                                 node_id='node',
+                                                 deployment_id='dep',
+                                                 host_id=None,
+                                                 relationships=[],
+                                                 runtime_properties={},
+                                                 state='uninitialized',
+                                                 version=None)
+
+        sm.put_node_instances_bulk([node_instance('ni1'),
+                                    node_instance('ni2')])
+        self.assertEquals(
+            {'ni1', 'ni2'},
+            {ni.id for ni in sm.get_node_instances().items})
+
+        with self.assertRaises(manager_exceptions.ConflictError) as cm:
+            sm.put_node_instances_bulk([node_instance('ni2'),
+                                        node_instance('ni3')])
+        self.assertIn('ni2', str(cm.exception))
+        self.assertNotIn('ni3', str(cm.exception))
+        # non conflicting node instances are stored regardless
+        self.assertEquals(
+            {'ni1', 'ni2', 'ni3'},
+            {ni.id for ni in sm.get_node_instances().items})
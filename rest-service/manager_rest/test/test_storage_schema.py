@@ -0,0 +1,122 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import unittest
+
+from mock import MagicMock, patch
+from nose.plugins.attrib import attr
+
+from manager_rest import storage_schema
+from manager_rest.test import base_test
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class StorageSchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.es = MagicMock()
+        self.es.count.return_value = {'count': 2}
+
+    def test_mappings(self):
+        mappings = storage_schema.get_mappings()
+        node_instance = mappings['node_instance']['properties']
+        self.assertEqual(storage_schema.KEYWORD, node_instance['state'])
+        self.assertEqual(storage_schema.KEYWORD,
+                         node_instance['deployment_id'])
+        self.assertEqual(storage_schema.OPAQUE,
+                         node_instance['runtime_properties'])
+        self.assertNotIn('version', node_instance)
+        self.assertEqual(storage_schema.OPAQUE,
+                         mappings['blueprint']['properties']['plan'])
+        self.assertEqual(
+            storage_schema.BOOLEAN,
+            mappings['execution']['properties']['is_system_workflow'])
+
+    def test_create_storage_index(self):
+        self.es.indices.exists.return_value = False
+        self.assertIsNone(storage_schema.migrate_storage_index(self.es))
+        self.es.indices.create.assert_called_once_with(
+            index='cloudify_storage_v1')
+        self.es.indices.put_alias.assert_called_once_with(
+            index='cloudify_storage_v1', name='cloudify_storage')
+        template = self.es.indices.put_template.call_args[1]
+        self.assertEqual('cloudify_storage_v1', template['name'])
+        self.assertEqual('cloudify_storage_v1', template['body']['template'])
+
+    def test_up_to_date(self):
+        self.es.indices.exists_alias.return_value = True
+        self.es.indices.get_alias.return_value = {
+            'cloudify_storage_v1': {'aliases': {'cloudify_storage': {}}}}
+        self.assertEqual(1, storage_schema.migrate_storage_index(self.es))
+        self.assertFalse(self.es.indices.create.called)
+
+    def test_migrate_unversioned_index(self):
+        self.es.indices.exists.side_effect = \
+            lambda index: index == 'cloudify_storage'
+        self.es.indices.exists_alias.return_value = False
+        with patch('elasticsearch.helpers.scan') as scan, \
+                patch('elasticsearch.helpers.bulk') as bulk:
+            scan.side_effect = lambda es, **_: iter([
+                {'_index': 'cloudify_storage', '_type': 'node_instance',
+                 '_id': 'ni1', '_version': 7, '_source': {'id': 'ni1'}}])
+            bulk.side_effect = lambda es, actions, **_: list(actions)
+            self.assertEqual(0, storage_schema.migrate_storage_index(self.es))
+            actions = list(storage_schema._reindex_actions(
+                self.es, 'cloudify_storage', 'cloudify_storage_v1'))
+
+        self.assertEqual('cloudify_storage', scan.call_args[1]['index'])
+        self.assertEqual({'_index': 'cloudify_storage_v1',
+                          '_type': 'node_instance',
+                          '_id': 'ni1',
+                          '_version': 7,
+                          '_version_type': 'external',
+                          '_source': {'id': 'ni1'}}, actions[0])
+        self.es.indices.delete.assert_called_once_with(
+            index='cloudify_storage')
+        self.es.indices.put_alias.assert_called_once_with(
+            index='cloudify_storage_v1', name='cloudify_storage')
+
+    @patch.object(storage_schema, 'SCHEMA_VERSION', 2)
+    def test_migrate_versioned_index(self):
+        self.es.indices.exists.side_effect = \
+            lambda index: index != 'cloudify_storage_v2'
+        self.es.indices.exists_alias.return_value = True
+        self.es.indices.get_alias.return_value = {
+            'cloudify_storage_v1': {'aliases': {'cloudify_storage': {}}}}
+        with patch('elasticsearch.helpers.bulk'):
+            self.assertEqual(1, storage_schema.migrate_storage_index(
+                self.es, delete_source=True))
+        self.es.indices.create.assert_called_once_with(
+            index='cloudify_storage_v2')
+        actions = self.es.indices.update_aliases.call_args[1]['body'][
+            'actions']
+        self.assertEqual(
+            [{'remove': {'index': 'cloudify_storage_v1',
+                         'alias': 'cloudify_storage'}},
+             {'add': {'index': 'cloudify_storage_v2',
+                      'alias': 'cloudify_storage'}}],
+            actions)
+        self.es.indices.delete.assert_called_once_with(
+            index='cloudify_storage_v1')
+
+    def test_migration_fails_on_missing_documents(self):
+        self.es.indices.exists.side_effect = \
+            lambda index: index == 'cloudify_storage'
+        self.es.indices.exists_alias.return_value = False
+        self.es.count.side_effect = [{'count': 2}, {'count': 1}]
+        with patch('elasticsearch.helpers.bulk'):
+            self.assertRaises(RuntimeError,
+                              storage_schema.migrate_storage_index, self.es)
+        self.assertFalse(self.es.indices.delete.called)
@@ -0,0 +1,136 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+from mock import patch
+from nose.plugins.attrib import attr
+
+from base_list_test import BaseListTest
+from base_test import LATEST_API_VERSION
+from manager_rest.manager_elasticsearch import ManagerElasticsearch
+
+
+@attr(client_min_version=2,
+      client_max_version=LATEST_API_VERSION)
+class SummaryTestCase(BaseListTest):
+
+    def setUp(self):
+        super(SummaryTestCase, self).setUp()
+        self._put_n_deployments(id_prefix='test', number_of_deployments=2)
+        self.first_deployment_id = 'test0_deployment'
+
+    def test_summarize_node_instances(self):
+        node_instances = self.client.node_instances.list()
+        response = self.get('/summary/node-instances',
+                            query_params={'_target_field': 'deployment_id'})
+        self.assertEqual(200, response.status_code)
+        items = response.json['items']
+        self.assertEqual(2, len(items))
+        self.assertEqual(len(node_instances), sum(item['count']
+                                                  for item in items))
+        for item in items:
+            self.assertEqual(
+                len([instance for instance in node_instances
+                     if instance.deployment_id == item['deployment_id']]),
+                item['count'])
+
+    def test_summarize_node_instances_nested(self):
+        response = self.get('/summary/node-instances', query_params={
+            '_target_field': ['deployment_id', 'state'],
+            'deployment_id': self.first_deployment_id})
+        items = response.json['items']
+        self.assertEqual(1, len(items))
+        self.assertEqual(self.first_deployment_id, items[0]['deployment_id'])
+        states = items[0]['by']
+        self.assertEqual(items[0]['count'],
+                         sum(state['count'] for state in states))
+        for state in states:
+            self.assertNotIn('by', state)
+            self.assertEqual(
+                state['count'],
+                len(self.client.node_instances.list(
+                    deployment_id=self.first_deployment_id,
+                    state=state['state'])))
+
+    def test_summarize_deployments(self):
+        response = self.get('/summary/deployments',
+                            query_params={'_target_field': 'blueprint_id'})
+        self.assertEqual(
+            [{'blueprint_id': 'test0_blueprint', 'count': 1},
+             {'blueprint_id': 'test1_blueprint', 'count': 1}],
+            sorted(response.json['items'], key=lambda item: item[
+                'blueprint_id']))
+
+    def test_summarize_executions(self):
+        self.client.executions.start(self.first_deployment_id, 'install')
+        response = self.get('/summary/executions', query_params={
+            '_target_field': 'workflow_id,deployment_id',
+            'workflow_id': 'install'})
+        self.assertEqual(
+            [{'workflow_id': 'install', 'count': 1,
+              'by': [{'deployment_id': self.first_deployment_id,
+                      'count': 1}]}],
+            response.json['items'])
+
+    def test_summary_requires_valid_target_field(self):
+        response = self.get('/summary/deployments')
+        self.assertEqual(400, response.status_code)
+        response = self.get('/summary/deployments',
+                            query_params={'_target_field': 'workflows'})
+        self.assertEqual(400, response.status_code)
+        self.assertIn('workflows', response.json['message'])
+
+    @patch.object(ManagerElasticsearch, 'get_events_raw_field_suffix',
+                  return_value='.raw')
+    def test_summarize_events(self, _):
+        with patch.object(ManagerElasticsearch, 'search_events') as search:
+            search.return_value = {
+                'hits': {'total': 3, 'hits': []},
+                'aggregations': {'node_id': {'buckets': [
+                    {'key': 'vm', 'doc_count': 3, 'timestamp': {'buckets': [
+                        {'key': 1456000000000, 'doc_count': 3,
+                         'key_as_string': '2016-02-20T20:26:40.000Z'}]}}]}}}
+            response = self.get('/summary/events', query_params={
+                '_target_field': 'node_id,timestamp',
+                '_interval': '1h',
+                'execution_id': 'ex1'})
+            body = search.call_args[1]['body']
+        self.assertEqual(
+            [{'node_id': 'vm', 'count': 3, 'by': [
+                {'timestamp': '2016-02-20T20:26:40.000Z', 'count': 3}]}],
+            response.json['items'])
+        self.assertEqual(0, body['size'])
+        self.assertEqual(
+            {'node_id': {
+                'terms': {'field': 'context.node_id.raw', 'size': 0},
+                'aggs': {'timestamp': {'date_histogram': {
+                    'field': '@timestamp', 'interval': '1h'}}}}},
+            body['aggs'])
+        self.assertIn({'terms': {'context.execution_id.raw': ['ex1']}},
+                      body['query']['filtered']['filter']['bool']['must'])
+
+    @patch.object(ManagerElasticsearch, 'get_events_raw_field_suffix',
+                  return_value=None)
+    def test_summarize_events_without_raw_fields(self, _):
+        with patch.object(ManagerElasticsearch, 'search_events') as search:
+            response = self.get('/summary/events', query_params={
+                '_target_field': 'node_id'})
+        self.assertEqual(400, response.status_code)
+        self.assertIn('raw subfields', response.json['message'])
+        self.assertFalse(search.called)
+
+    def test_summarize_events_invalid_interval(self):
+        response = self.get('/summary/events', query_params={
+            '_target_field': 'timestamp', '_interval': 'often'})
+        self.assertEqual(400, response.status_code)
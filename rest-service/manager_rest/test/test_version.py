@@ -13,6 +13,9 @@
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
 
+import json
+
+from mock import patch
 from nose.plugins.attrib import attr
 
 from manager_rest import get_version_data
@@ -25,3 +28,19 @@ class VersionTestCase(base_test.BaseServerTestCase):
     def test_get_version(self):
         self.assertDictEqual(self.client.manager.get_version(),
                              get_version_data())
+
+    def test_get_version_conditionally(self):
+        version_data = get_version_data()
+        url = self._version_url('/version')
+        etag = self.get('/version').headers['ETag']
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+
+        # the ETag covers the build info too, not only the version
+        version_data['build'] = 'other_build'
+        with patch('manager_rest.resources.get_version_data',
+                   return_value=version_data):
+            response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers['ETag'])
+        self.assertEqual('other_build', json.loads(response.data)['build'])
@@ -24,7 +24,7 @@ setup(
     author_email='dank@gigaspaces.com',
     packages=['manager_rest',
               'manager_rest.deployment_update'],
-    package_data={'manager_rest': ['VERSION']},
+    package_data={'manager_rest': ['VERSION', 'es_scripts/*.groovy']},
     license='LICENSE',
     description='Cloudify manager rest service',
     zip_safe=False,
@@ -105,7 +105,7 @@ class ElasticSearchProcess(object):
         command = 'elasticsearch'
         logger.info('Starting elasticsearch service with command {0}'
                     .format(command))
-        self._add_append_script()
+        self._add_scripts()
         self._process = subprocess.Popen(shlex.split(command))
         self._verify_service_started()
         self._verify_service_responsiveness()
@@ -182,10 +182,11 @@ class ElasticSearchProcess(object):
         logger.info("Elasticsearch schema created successfully")
 
     @staticmethod
-    def _add_append_script():
+    def _add_scripts():
         """
-        write the 'append to list' ES script to a file and store it at
-        ES scripts path (<ES>/config/scripts)
+        write the ES scripts used by the storage manager ('append to list'
+        and the 'update node instance' script shipped with the rest service)
+        to files and store them at ES scripts path (<ES>/config/scripts)
         """
 
         # get elasticsearch base dir and resolve script file destination
@@ -194,23 +195,33 @@ class ElasticSearchProcess(object):
                 subprocess.check_output('which elasticsearch',
                                         shell=True).rstrip('\r\n')))
         es_scripts_path = os.path.join(es_path, 'config/scripts')
-        script_path = os.path.join(es_scripts_path, 'append.groovy')
-
-        if os.path.exists(script_path):
-            return
 
         use_sudo = os.environ.get('CI') == 'true'
-        script = ('if (ctx._source.containsKey(key))'
-                  ' {ctx._source[key] += value;}'
-                  ' else {ctx._source[key] = [value]}').replace('"', r'\"')
+        scripts = {
+            'append.groovy':
+                'if (ctx._source.containsKey(key))'
+                ' {ctx._source[key] += value;}'
+                ' else {ctx._source[key] = [value]}'
+        }
+        rest_scripts_path = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(
+                os.path.dirname(os.path.abspath(__file__))))),
+            'rest-service', 'manager_rest', 'es_scripts')
+        with open(os.path.join(rest_scripts_path,
+                               'update_node_instance.groovy')) as f:
+            scripts['update_node_instance.groovy'] = f.read()
 
         if not os.path.exists(es_scripts_path):
             os.system('{0} mkdir -p {1}'.format(
                 'sudo' if use_sudo else '',
                 es_scripts_path))
 
-        os.system('echo "{0}" | {1} tee {2}'.format(
-            script,
-            'sudo' if use_sudo else '',
-            script_path
-        ))
+        for script_name, script in scripts.iteritems():
+            script_path = os.path.join(es_scripts_path, script_name)
+            if os.path.exists(script_path):
+                continue
+            os.system('echo "{0}" | {1} tee {2}'.format(
+                script.replace('"', r'\"'),
+                'sudo' if use_sudo else '',
+                script_path
+            ))
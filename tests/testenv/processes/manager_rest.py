@@ -101,7 +101,9 @@ class ManagerRestProcess(object):
             self.file_server_deployments_folder,
             'amqp_username': self.amqp_username,
             'amqp_password': self.amqp_password,
-            'maintenance_folder': self.maintenance_folder
+            'maintenance_folder': self.maintenance_folder,
+            # tests switch the events indices' mappings
+            'events_raw_fields_check_seconds': 0
         }
 
         config_path = os.path.join(self.tempdir, 'manager_config.json')
@@ -16,6 +16,8 @@
 from datetime import datetime
 import re
 
+from elasticsearch import Elasticsearch
+
 from testenv.utils import get_resource as resource
 from testenv.utils import deploy_application as deploy
 from testenv import TestCase
@@ -84,6 +86,18 @@ class EventsTest(TestCase):
                           .format(expected_deployment_ids,
                                   deployments_with_events))
 
+    def test_execution_filtered_events(self):
+        deployment_id = self._create_deployment()
+        execution_ids = [execution.id for execution in
+                         self.client.executions.list(
+                             deployment_id=deployment_id)]
+        events = self.client.events.list(execution_id=execution_ids[-1])
+
+        self.assertGreater(len(events), 0, 'No events')
+        self.assertEquals({execution_ids[-1]},
+                          {event['context']['execution_id']
+                           for event in events})
+
     def test_paginated_events(self):
         size = 5
         offset = 3
@@ -152,3 +166,36 @@ class EventsTest(TestCase):
                      'basic_event_and_log.yaml')
         test_deployment, _ = deploy(dsl_path)
         return test_deployment.id
+
+
+class EventsRawFieldsTest(EventsTest):
+    """
+    The events tests, against events indices which map string fields with
+    raw subfields, as the manager's logstash index template does. The
+    events indices of the other tests are mapped dynamically, so their
+    nested fields are filtered by match queries instead.
+    """
+
+    TEMPLATE_NAME = 'test_events_raw_fields'
+
+    def setUp(self):
+        Elasticsearch().indices.put_template(
+            name=self.TEMPLATE_NAME,
+            body={
+                'template': '{0}*'.format(LOG_INDICES_PREFIX),
+                'mappings': {'_default_': {'dynamic_templates': [{
+                    'string_fields': {
+                        'match': '*',
+                        'match_mapping_type': 'string',
+                        'mapping': {
+                            'type': 'string',
+                            'index': 'analyzed',
+                            'fields': {'raw': {
+                                'type': 'string',
+                                'index': 'not_analyzed'}}}}}]}}})
+        super(EventsRawFieldsTest, self).setUp()
+
+    def tearDown(self):
+        super(EventsRawFieldsTest, self).tearDown()
+        Elasticsearch().indices.delete_template(name=self.TEMPLATE_NAME,
+                                                ignore=404)
@@ -19,7 +19,10 @@ from testenv import TestCase
 from testenv.utils import get_resource as resource
 from testenv.utils import deploy_application as deploy
 from testenv.utils import create_rest_client
+from testenv.utils import create_es_db_client
 from cloudify_rest_client.exceptions import CloudifyClientError
+from manager_rest import manager_exceptions
+from manager_rest.models import DeploymentNodeInstance
 
 
 class TestStorage(TestCase):
@@ -45,6 +48,49 @@ class TestStorage(TestCase):
             CloudifyClientError, client.node_instances.update,
             instance.id, version=1)
 
+    def test_update_node_instance_runtime_properties_patch(self):
+        self._test_update_node_instance(create_es_db_client())
+
+    def test_update_node_instance_without_script(self):
+        storage_manager = create_es_db_client()
+        # as on an elasticsearch lacking update_node_instance.groovy, the
+        # missing script is detected by the first update
+        storage_manager._update_node_instance_script = 'no_such_script'
+        self._test_update_node_instance(storage_manager)
+        self.assertTrue(storage_manager._update_node_instance_script_missing)
+
+    def _test_update_node_instance(self, storage_manager):
+        deploy(resource("dsl/basic.yaml"))
+        instance = create_rest_client().node_instances.list()[0]
+        instance = storage_manager.get_node_instance(instance.id)
+        storage_manager.update_node_instance(DeploymentNodeInstance(
+            id=instance.id, node_id=None, deployment_id=None, host_id=None,
+            relationships=None, state=None, version=instance.version,
+            runtime_properties={'a': 1, 'b': 2}))
+        updated = storage_manager.update_node_instance(
+            DeploymentNodeInstance(
+                id=instance.id, node_id=None, deployment_id=None,
+                host_id=None, relationships=None, state='started',
+                version=instance.version + 1, runtime_properties=None),
+            set_runtime_properties={'b': 3, 'c': 4},
+            delete_runtime_properties=['a'])
+
+        self.assertEquals(instance.version + 2, updated.version)
+        self.assertEquals('started', updated.state)
+        self.assertEquals({'b': 3, 'c': 4}, updated.runtime_properties)
+        self.assertEquals(instance.relationships, updated.relationships)
+        stored = storage_manager.get_node_instance(instance.id)
+        self.assertEquals(updated.to_dict(), stored.to_dict())
+
+        # the version that was just updated is no longer current
+        self.assertRaises(
+            manager_exceptions.ConflictError,
+            storage_manager.update_node_instance,
+            DeploymentNodeInstance(
+                id=instance.id, node_id=None, deployment_id=None,
+                host_id=None, relationships=None, state='deleted',
+                version=instance.version + 1, runtime_properties=None))
+
     def test_deployment_inputs(self):
         blueprint_id = str(uuid.uuid4())
         blueprint = self.client.blueprints.upload(resource("dsl/basic.yaml"),
@@ -59,6 +59,10 @@ _INFLUXDB_RESTORE_CMD = ('cat {0} | while read -r line; do curl -X POST '
 _STORAGE_INDEX_NAME = 'cloudify_storage'
 _EVENTS_INDEX_NAME = 'cloudify_events'
 
+# Elasticsearch clients shared by all snapshot operations of this process,
+# keyed by (pid, host, port) so that forked workers open their own sockets
+_es_clients = {}
+
 
 class _DictToAttributes(object):
     def __init__(self, dic):
@@ -67,6 +71,9 @@ class _DictToAttributes(object):
     def __getattr__(self, name):
         return self._dict[name]
 
+    def get(self, name, default=None):
+        return self._dict.get(name, default)
+
 
 def _get_json_objects(f):
     def chunks(g):
@@ -156,8 +163,15 @@ def _copy_data(archive_root, config, to_archive=True):
 
 
 def _create_es_client(config):
-    return elasticsearch.Elasticsearch(hosts=[{'host': config.db_address,
-                                               'port': int(config.db_port)}])
+    key = (os.getpid(), config.db_address, int(config.db_port))
+    if key not in _es_clients:
+        _es_clients[key] = elasticsearch.Elasticsearch(
+            hosts=[{'host': config.db_address, 'port': int(config.db_port)}],
+            maxsize=config.get('db_connection_pool_size', 10),
+            timeout=config.get('db_timeout', 10),
+            max_retries=config.get('db_max_retries', 3),
+            retry_on_timeout=True)
+    return _es_clients[key]
 
 
 def _except_types(s, *args):
@@ -240,6 +254,15 @@ def create(snapshot_id, config, **kwargs):
         raise
 
 
+def _with_storage_index_name(storage_data):
+    # the storage index is accessed through an alias of a versioned index
+    # (e.g. cloudify_storage_v1), documents are restored through the alias
+    for elem in storage_data:
+        if elem['_index'].startswith(_STORAGE_INDEX_NAME):
+            elem['_index'] = _STORAGE_INDEX_NAME
+        yield elem
+
+
 def _dump_elasticsearch(tempdir, es, has_cloudify_events):
     ctx.send_event('Dumping elasticsearch data')
     storage_scan = elasticsearch.helpers.scan(es, index=_STORAGE_INDEX_NAME)
@@ -247,6 +270,7 @@ def _dump_elasticsearch(tempdir, es, has_cloudify_events):
                                  'provider_context',
                                  'snapshot')
     storage_scan = (e for e in storage_scan if e['_id'] != ctx.execution_id)
+    storage_scan = _with_storage_index_name(storage_scan)
 
     event_scan = elasticsearch.helpers.scan(
         es,